@@ -0,0 +1,70 @@
+import argparse
+import time
+import pandas as pd
+from benchmarks.bench_insert_data import read_sample, SAMPLE_FILE
+from src.analytics import AnalyticsEngine
+from src.cache import ResultCache, ANALYTICS_QUERIES
+from src.db_manager import create_table, drop_table, insert_data, get_snapshot_version
+
+def per_call_ms(function, iterations):
+    """
+    Average milliseconds per call of a function.
+    Args:
+        function (callable): Function to time.
+        iterations (int): Number of calls.
+    Returns:
+        float: Milliseconds per call.
+    """
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations * 1000
+
+def bench_analytics(df, iterations):
+    """
+    Time the analytics queries on one ingested snapshot through Postgres, the result
+    cache and the in-memory engine, and the time taken to build the engine.
+    Args:
+        df (pd.DataFrame): Cleaned flight data of the snapshot.
+        iterations (int): Calls per query and path.
+    Returns:
+        tuple: Engine build time in ms, and one result per query with the ms per call of each path.
+    """
+    drop_table()
+    create_table()
+    insert_data(df)
+    version = get_snapshot_version()
+
+    engine = AnalyticsEngine()
+    start = time.perf_counter()
+    engine.build(df, version)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    cache = ResultCache(get_snapshot_version, version_ttl=60)
+    results = []
+    for name, query in ANALYTICS_QUERIES.items():
+        cache.get(name, query)
+        results.append({
+            "query": name,
+            "postgres_ms": per_call_ms(query, iterations),
+            "cache_ms": per_call_ms(lambda: cache.get(name, query), iterations),
+            "memory_ms": per_call_ms(lambda: engine.get(name, version), iterations),
+        })
+    return build_ms, results
+
+def main():
+    parser = argparse.ArgumentParser(description = "Compare read latency of the analytics queries from Postgres, the result cache and the in-memory engine.")
+    parser.add_argument("--file", default = SAMPLE_FILE, help = "cleaned flight data CSV of the snapshot")
+    parser.add_argument("--scale", type = int, default = 1, help = "repeat the sample to enlarge the snapshot")
+    parser.add_argument("--iterations", type = int, default = 200, help = "calls per query and path")
+    args = parser.parse_args()
+
+    df = pd.concat([read_sample(args.file)] * args.scale, ignore_index = True)
+    build_ms, results = bench_analytics(df, args.iterations)
+    print(f"{len(df)} rows, in-memory engine built in {build_ms:.2f} ms")
+    print(f"{'query':<58} {'postgres ms':>12} {'cache ms':>10} {'memory ms':>10}")
+    for result in results:
+        print(f"{result['query']:<58} {result['postgres_ms']:>12.3f} {result['cache_ms']:>10.4f} {result['memory_ms']:>10.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import argparse
+import asyncio
+import itertools
+import os
+import subprocess
+import sys
+import time
+import httpx
+import numpy as np
+from benchmarks.bench_insert_data import read_sample, SAMPLE_FILE
+from src.cache import ANALYTICS_QUERIES
+from src.db_manager import create_table, drop_table, insert_data
+
+def start_server(driver, port, cached):
+    """
+    Start the API with uvicorn in a subprocess and wait until it answers.
+    Args:
+        driver (str): API_DB_DRIVER of the server, psycopg2 or asyncpg.
+        port (int): Port to listen on.
+        cached (bool): Keep the result cache; otherwise every request queries Postgres.
+    Returns:
+        subprocess.Popen: The server process.
+    """
+    env = dict(os.environ, API_DB_DRIVER=driver)
+    if not cached:
+        env.update(RESULT_CACHE_MAX_ENTRIES="0", RESULT_CACHE_VERSION_TTL="0")
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port),
+                               "--log-level", "warning"], env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/healthcheck").status_code == 200:
+                return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"API did not start on port {port}.")
+
+async def get(reader, writer, path):
+    """
+    Send a keep-alive HTTP/1.1 GET request and read the response. A minimal client
+    keeps the load generator from competing with the API for CPU.
+    Args:
+        reader (asyncio.StreamReader): Reader of the connection.
+        writer (asyncio.StreamWriter): Writer of the connection.
+        path (str): Path requested.
+    Returns:
+        int: The response status code.
+    """
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    head = await reader.readuntil(b"\r\n\r\n")
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    headers = dict(line.split(": ", 1) for line in header_lines if line)
+    headers = {name.lower(): value for name, value in headers.items()}
+    await reader.readexactly(int(headers.get("content-length", 0)))
+    return int(status_line.split(" ")[1])
+
+async def load(port, endpoints, concurrency, duration):
+    """
+    Send requests over concurrency connections in a closed loop for duration seconds.
+    Args:
+        port (int): Port of the API on localhost.
+        endpoints (list): Paths requested in turn.
+        concurrency (int): Requests in flight at once.
+        duration (float): Seconds to run.
+    Returns:
+        tuple: Latency of each successful request in seconds, and the number of errors.
+    """
+    latencies, errors = [], 0
+    paths = itertools.cycle(endpoints)
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                if await get(reader, writer, next(paths)) == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+        finally:
+            writer.close()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors
+
+def bench_api_load(drivers, concurrency, duration, cached, port):
+    """
+    Load the analytics endpoints of the API served with each database driver.
+    Args:
+        drivers (list): API_DB_DRIVER values to compare.
+        concurrency (int): Requests in flight at once.
+        duration (float): Seconds of load per driver.
+        cached (bool): Keep the result cache between requests.
+        port (int): Port of the API.
+    Returns:
+        list: One result per driver with requests/sec, p50 and p99 latency in ms, and errors.
+    """
+    endpoints = [f"/{name}" for name in ANALYTICS_QUERIES]
+    results = []
+    for driver in drivers:
+        server = start_server(driver, port, cached)
+        try:
+            # Warm up connections on both sides before measuring
+            asyncio.run(load(port, endpoints, concurrency, 1))
+            latencies, errors = asyncio.run(load(port, endpoints, concurrency, duration))
+        finally:
+            server.terminate()
+            server.wait()
+        latencies_ms = np.array(latencies) * 1000
+        results.append({
+            "driver": driver,
+            "requests_per_second": len(latencies) / duration,
+            "p50_ms": float(np.percentile(latencies_ms, 50)),
+            "p99_ms": float(np.percentile(latencies_ms, 99)),
+            "errors": errors,
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description = "Load test the analytics endpoints with the psycopg2 (threadpool) and asyncpg database drivers.")
+    parser.add_argument("--file", default = SAMPLE_FILE, help = "cleaned flight data CSV ingested as the snapshot")
+    parser.add_argument("--drivers", nargs = "+", default = ["psycopg2", "asyncpg"], help = "API_DB_DRIVER values to compare")
+    parser.add_argument("--concurrency", type = int, default = 64, help = "requests in flight at once")
+    parser.add_argument("--duration", type = float, default = 10, help = "seconds of load per driver")
+    parser.add_argument("--cached", action = "store_true", help = "keep the result cache; by default every request queries Postgres")
+    parser.add_argument("--port", type = int, default = 8765, help = "port of the API under test")
+    args = parser.parse_args()
+
+    drop_table()
+    create_table()
+    insert_data(read_sample(args.file))
+    results = bench_api_load(args.drivers, args.concurrency, args.duration, args.cached, args.port)
+    print(f"{args.concurrency} concurrent requests for {args.duration:g} s, "
+          f"pool max size {os.getenv('PG_POOL_MAX_SIZE', '10')}, result cache {'on' if args.cached else 'off'}")
+    print(f"{'driver':<10} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for result in results:
+        print(f"{result['driver']:<10} {result['requests_per_second']:>8.1f} {result['p50_ms']:>8.2f} "
+              f"{result['p99_ms']:>8.2f} {result['errors']:>7}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import gc
+import json
+import os
+import time
+import tracemalloc
+import pandas as pd
+from src.transform import clean_data
+
+SAMPLE_FILE = os.path.join("data", "raw_flight_data.json")
+
+def legacy_clean_data(raw_data, timestamp):
+    """
+    The clean_data implementation before the filter-first rewrite, kept as the baseline.
+    Args:
+        raw_data (dict): Raw flight data from OpenSky API.
+        timestamp (str): UTC timestamp of the data retrieval.
+    Returns:
+        tuple: A tuple containing the cleaned flight data as a DataFrame
+        and the UTC timestamp.
+    """
+    flight_data = raw_data.get("states", [])
+    columns = ["icao24", "callsign", "origin_country", "time_position",
+                "last_contact", "longitude", "latitude", "baro_altitude",
+                "on_ground", "velocity", "true_track", "vertical_rate",
+                "sensors", "geo_altitude", "squawk", "spi", "position_source"]
+    df = pd.DataFrame(flight_data, columns = columns)
+    df["callsign"] = df["callsign"].fillna("").astype(str).str.strip()
+    df["callsign"] = df["callsign"].replace({"nan": "UNKNOWN", "": "UNKNOWN"})
+    df["squawk"] = df["squawk"].where(pd.notna(df["squawk"]), None)
+    df = df.dropna(subset = ["longitude", "latitude"])
+    df["velocity"] = pd.to_numeric(df["velocity"], errors="coerce").where(pd.notna(df["velocity"]), None)
+    df["baro_altitude"] = pd.to_numeric(df["baro_altitude"], errors="coerce").where(pd.notna(df["baro_altitude"]), None)
+    df["geo_altitude"] = pd.to_numeric(df["geo_altitude"], errors="coerce").where(pd.notna(df["geo_altitude"]), None)
+    df["time_position"] = pd.to_datetime(df["time_position"], unit="s")
+    df["last_contact"] = pd.to_datetime(df["last_contact"], unit="s")
+    df["velocity"] = (df["velocity"] * 1.944).round(4)
+    df["vertical_rate"] = (df["vertical_rate"] * 196.8504).round(4)
+    df["baro_altitude"] = (df["baro_altitude"] * 3.281).round(4)
+    df["geo_altitude"] = (df["geo_altitude"] * 3.281).round(4)
+    df = df[df["on_ground"] == False]
+    df = df[df["velocity"] > 16]
+    df = df[df["callsign"] != "UNKNOWN"]
+    return (df, timestamp)
+
+def bench_clean(func, raw_data, repeat):
+    """
+    Time a clean function and measure its peak Python memory allocation.
+    Args:
+        func (callable): clean_data-compatible function.
+        raw_data (dict): Raw flight data from OpenSky API.
+        repeat (int): Number of timed runs; the fastest one is reported.
+    Returns:
+        dict: Row counts, best time in seconds and peak traced memory in bytes.
+    """
+    timings = []
+    # Like timeit, keep the garbage collector from adding noise to the timings
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            df, _ = func(raw_data, None)
+            timings.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+
+    tracemalloc.start()
+    func(raw_data, None)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"rows_in": len(raw_data["states"]), "rows_out": len(df), "seconds": min(timings), "peak_bytes": peak}
+
+def main():
+    parser = argparse.ArgumentParser(description = "Compare clean_data against the previous implementation.")
+    parser.add_argument("--file", default = SAMPLE_FILE, help = "raw OpenSky JSON payload")
+    parser.add_argument("--repeat", type = int, default = 10, help = "timed runs per implementation, best is reported")
+    parser.add_argument("--scale", type = int, default = 1, help = "repeat the states this many times")
+    args = parser.parse_args()
+
+    with open(args.file, encoding = "utf-8") as json_file:
+        raw_data = json.load(json_file)
+    raw_data["states"] = raw_data["states"] * args.scale
+
+    print(f"{'implementation':<16} {'rows in':>8} {'rows out':>9} {'ms':>9} {'peak MiB':>9}")
+    for name, func in (("legacy", legacy_clean_data), ("clean_data", clean_data)):
+        result = bench_clean(func, raw_data, args.repeat)
+        print(f"{name:<16} {result['rows_in']:>8} {result['rows_out']:>9} "
+              f"{result['seconds'] * 1000:>9.1f} {result['peak_bytes'] / 2**20:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.suite import scale_raw, local_s3, working_directory, SNAPSHOT_TIME
+from src.transform import clean_data, SCHEMA_MODES
+from src.load import load_data
+from src.db_manager import create_table, drop_table, insert_data
+
+RAW_FILE = "data/raw_flight_data.json"
+
+def peak_rss_bytes():
+    """Peak resident set size of this process; Linux reports ru_maxrss in KiB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def rss_status():
+    """Current and peak (since the last reset_peak_rss) resident bytes, from /proc/self/status."""
+    with open("/proc/self/status") as status:
+        fields = dict(line.split(":", 1) for line in status)
+    return int(fields["VmRSS"].split()[0]) * 1024, int(fields["VmHWM"].split()[0]) * 1024
+
+def reset_peak_rss():
+    """Reset the peak resident set size of this process to its current size (Linux)."""
+    with open("/proc/self/clear_refs", "w") as clear_refs:
+        clear_refs.write("5")
+
+def measure_stage(run):
+    """
+    Run a stage and measure its time and how far it raised the resident set above
+    its size when the stage started.
+    Args:
+        run (callable): Runs the stage and returns its output.
+    Returns:
+        tuple: The output, the seconds and the peak bytes added by the stage.
+    """
+    reset_peak_rss()
+    rss_start, _ = rss_status()
+    start = time.perf_counter()
+    output = run()
+    seconds = time.perf_counter() - start
+    _, peak = rss_status()
+    return output, seconds, peak - rss_start
+
+def run_pipeline(schema, scale, formats):
+    """
+    Clean, load and insert the raw payload scaled up scale times with one schema,
+    in the current process.
+    Args:
+        schema (str): One of SCHEMA_MODES.
+        scale (int): Number of copies of the states, see suite.scale_raw.
+        formats (list): Output formats of load_data.
+    Returns:
+        dict: Rows, DataFrame bytes, the seconds and peak bytes added by each stage, and
+              the peak RSS of the process.
+    """
+    with open(RAW_FILE, encoding="utf-8") as json_file:
+        scaled = scale_raw(json.load(json_file), scale)
+    stages = {}
+
+    (df, _), *stages["clean"] = measure_stage(lambda: clean_data(scaled, SNAPSHOT_TIME, schema))
+    del scaled
+    with local_s3(), tempfile.TemporaryDirectory() as tmp, working_directory(tmp):
+        df, *stages["load"] = measure_stage(lambda: load_data(df, SNAPSHOT_TIME, formats))
+    drop_table()
+    create_table()
+    _, *stages["insert"] = measure_stage(lambda: insert_data(df, snapshot_time=SNAPSHOT_TIME))
+    return {"schema": schema, "scale": scale, "rows": len(df), "frame_bytes": int(df.memory_usage(deep=True).sum()),
+            "stages": stages, "rss_peak": peak_rss_bytes()}
+
+def main():
+    parser = argparse.ArgumentParser(description = "Compare the memory and time of the standard and compact DataFrame schemas through clean, load and insert.")
+    parser.add_argument("--scales", default = "1,50", help = "comma-separated snapshot sizes, in copies of the bundled snapshot")
+    parser.add_argument("--formats", default = "csv,jsonl,parquet", help = "output formats of load_data")
+    parser.add_argument("--child", nargs = 2, metavar = ("SCHEMA", "SCALE"), help = argparse.SUPPRESS)
+    args = parser.parse_args()
+    formats = args.formats.split(",")
+
+    if args.child:
+        print(json.dumps(run_pipeline(args.child[0], int(args.child[1]), formats)))
+        return
+
+    print(f"{'':>24} {'frame':>6} {'peak':>6} {'added by stage, MiB':>22} {'stage ms':>24}")
+    print(f"{'scale':>5} {'schema':<9} {'rows':>8} {'MiB':>6} {'RSS':>6} {'clean':>7} {'load':>7} {'insert':>7} "
+          f"{'clean':>7} {'load':>8} {'insert':>8}")
+    for scale in (int(value) for value in args.scales.split(",")):
+        for schema in SCHEMA_MODES:
+            # A fresh process per run, as the peak RSS of a process never goes down
+            output = subprocess.run([sys.executable, "-m", "benchmarks.bench_compact", "--formats", args.formats,
+                                     "--child", schema, str(scale)], capture_output=True, text=True, check=True)
+            result = json.loads(output.stdout.splitlines()[-1])
+            stages = result["stages"]
+            added = " ".join(f"{stages[stage][1] / 2**20:>7.1f}" for stage in ("clean", "load", "insert"))
+            print(f"{scale:>5} {schema:<9} {result['rows']:>8} {result['frame_bytes'] / 2**20:>6.1f} "
+                  f"{result['rss_peak'] / 2**20:>6.0f} {added} {stages['clean'][0] * 1000:>7.0f} "
+                  f"{stages['load'][0] * 1000:>8.0f} {stages['insert'][0] * 1000:>8.0f}")
+
+if __name__ == "__main__":
+    main()
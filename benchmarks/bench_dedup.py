@@ -0,0 +1,66 @@
+import argparse
+import datetime
+import sys
+import time
+import numpy as np
+import pandas as pd
+from benchmarks.bench_insert_data import read_sample, SAMPLE_FILE
+from src.dedup import StateDeduplicator
+
+def simulate_polls(df, polls, updated_fraction, interval, seed=0):
+    """
+    Build a series of polls from one sample: in each poll a fraction of the aircraft
+    report a new position, the others repeat their previous state.
+    Args:
+        df (pd.DataFrame): Cleaned flight data of the first poll.
+        polls (int): Number of polls.
+        updated_fraction (float): Share of aircraft with a new time_position per poll.
+        interval (int): Seconds between polls.
+        seed (int): Random seed.
+    Returns:
+        list: (snapshot time, DataFrame) pairs.
+    """
+    rng = np.random.default_rng(seed)
+    start = datetime.datetime(2025, 5, 18, 12, 0, 0)
+    current = df.copy()
+    snapshots = []
+    for poll in range(polls):
+        if poll:
+            current = current.copy()
+            moved = rng.random(len(current)) < updated_fraction
+            current.loc[moved, "time_position"] += pd.Timedelta(seconds=interval)
+        snapshots.append((start + datetime.timedelta(seconds=interval * poll), current))
+    return snapshots
+
+def set_bytes(keys):
+    """Bytes of a Python set of (icao24, time_position) tuples holding the same keys."""
+    return sys.getsizeof(keys) + sum(sys.getsizeof(key) + sys.getsizeof(key[1]) for key in keys)
+
+def main():
+    parser = argparse.ArgumentParser(description = "Measure the rows and bytes saved by deduplicating repeated aircraft states across polls.")
+    parser.add_argument("--file", default = SAMPLE_FILE, help = "cleaned flight data CSV of the first poll")
+    parser.add_argument("--polls", type = int, default = 30, help = "polls to simulate")
+    parser.add_argument("--updated", type = float, default = 0.6, help = "share of aircraft with a new position per poll")
+    parser.add_argument("--interval", type = int, default = 10, help = "seconds between polls")
+    parser.add_argument("--ttl", type = int, default = 900, help = "seconds a state key is remembered, as DEDUP_TTL_SECONDS")
+    args = parser.parse_args()
+
+    snapshots = simulate_polls(read_sample(args.file), args.polls, args.updated, args.interval)
+    deduplicator = StateDeduplicator(ttl_seconds=args.ttl)
+    timings = []
+    for snapshot_time, df in snapshots:
+        start = time.perf_counter()
+        deduplicator.filter(df, snapshot_time)
+        timings.append(time.perf_counter() - start)
+
+    stats = deduplicator.stats()
+    keys = {key for _, df in snapshots for key in df[["icao24", "time_position"]].itertuples(index=False, name=None)}
+    print(f"{args.polls} polls of {len(snapshots[0][1])} aircraft, {args.updated:.0%} updated per poll")
+    print(f"rows dropped: {stats['rows_dropped']} of {stats['rows_in']} ({stats['rows_dropped'] / stats['rows_in']:.1%}), "
+          f"{stats['bytes_saved'] / 2**20:.1f} MiB of CSV saved")
+    print(f"filter per poll: median {np.median(timings) * 1000:.2f} ms, max {max(timings) * 1000:.2f} ms")
+    print(f"{stats['keys']} keys held in {stats['array_bytes'] / 2**20:.2f} MiB "
+          f"(a set of tuples: {set_bytes(keys) / 2**20:.2f} MiB)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import argparse
+import datetime
+import time
+import numpy as np
+import pandas as pd
+from benchmarks.bench_insert_data import read_sample, SAMPLE_FILE
+from src.transform import diff_snapshots
+from src.db_manager import (create_table, drop_table, insert_data,
+                            get_current_states, apply_delta)
+from utils.db_utils import db_cursor
+
+def simulate_cycles(df, cycles, changed_fraction, removed_fraction, seed=0):
+    """
+    Build a series of snapshots from one sample: in each cycle a fraction of the
+    aircraft report a new position and a fraction disappear until the next cycle.
+    Args:
+        df (pd.DataFrame): Cleaned flight data of the first snapshot.
+        cycles (int): Number of snapshots after the first one.
+        changed_fraction (float): Share of aircraft with a new last_contact per cycle.
+        removed_fraction (float): Share of aircraft missing from each cycle.
+        seed (int): Random seed.
+    Returns:
+        list: (snapshot time, DataFrame) pairs, the first one being df itself.
+    """
+    rng = np.random.default_rng(seed)
+    start = datetime.datetime(2025, 5, 18, 12, 0, 0)
+    snapshots = [(start, df)]
+    current = df.copy()
+    for cycle in range(1, cycles + 1):
+        current = current.copy()
+        moved = rng.random(len(current)) < changed_fraction
+        current.loc[moved, "last_contact"] += pd.Timedelta(seconds=60)
+        current.loc[moved, "latitude"] += 0.05
+        present = rng.random(len(current)) >= removed_fraction
+        snapshots.append((start + datetime.timedelta(minutes=cycle), current[present]))
+    return snapshots
+
+def wal_bytes(cur, start_lsn):
+    """
+    Bytes of WAL generated since start_lsn.
+    Args:
+        cur: psycopg2 cursor.
+        start_lsn (str): WAL position returned by pg_current_wal_lsn().
+    Returns:
+        int: Bytes of WAL.
+    """
+    cur.execute("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s);", (start_lsn,))
+    return int(cur.fetchone()[0])
+
+def bench_mode(snapshots, mode):
+    """
+    Ingest the snapshots in one mode on freshly created tables and measure the
+    rows written, WAL generated and time taken after the first snapshot.
+    Args:
+        snapshots (list): (snapshot time, DataFrame) pairs, see simulate_cycles.
+        mode (str): "full" or "incremental".
+    Returns:
+        dict: Mode, cycles, rows written, WAL bytes and seconds, per cycle on average.
+    """
+    drop_table()
+    create_table()
+
+    def ingest(snapshot_time, df):
+        if mode == "incremental":
+            changed, removed = diff_snapshots(get_current_states(), df)
+            delta = apply_delta(changed, removed, snapshot_time=snapshot_time, record_count=len(df))
+            return delta["upserted"] + delta["removed"]
+        insert_data(df, snapshot_time=snapshot_time)
+        return len(df)
+
+    ingest(*snapshots[0])
+    with db_cursor() as cur:
+        cur.execute("SELECT pg_current_wal_lsn();")
+        start_lsn = cur.fetchone()[0]
+        cur.connection.commit()
+    rows = 0
+    start = time.perf_counter()
+    for snapshot_time, df in snapshots[1:]:
+        rows += ingest(snapshot_time, df)
+    seconds = time.perf_counter() - start
+    with db_cursor() as cur:
+        wal = wal_bytes(cur, start_lsn)
+
+    cycles = len(snapshots) - 1
+    return {"mode": mode, "cycles": cycles, "rows": rows / cycles,
+            "wal_bytes": wal / cycles, "seconds": seconds / cycles}
+
+def main():
+    parser = argparse.ArgumentParser(description = "Compare rows written and WAL generated per cycle by full and incremental ingest.")
+    parser.add_argument("--file", default = SAMPLE_FILE, help = "cleaned flight data CSV of the first snapshot")
+    parser.add_argument("--cycles", type = int, default = 10, help = "snapshots ingested after the first one")
+    parser.add_argument("--changed", type = float, default = 0.3, help = "share of aircraft changing per cycle")
+    parser.add_argument("--removed", type = float, default = 0.02, help = "share of aircraft disappearing per cycle")
+    args = parser.parse_args()
+
+    snapshots = simulate_cycles(read_sample(args.file), args.cycles, args.changed, args.removed)
+    print(f"{'mode':<12} {'rows/cycle':>12} {'WAL KiB/cycle':>14} {'sec/cycle':>10}")
+    for mode in ("full", "incremental"):
+        result = bench_mode(snapshots, mode)
+        print(f"{result['mode']:<12} {result['rows']:>12.0f} {result['wal_bytes'] / 1024:>14.1f} {result['seconds']:>10.3f}")
+
+if __name__ == "__main__":
+    main()
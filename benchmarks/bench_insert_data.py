@@ -0,0 +1,57 @@
+import argparse
+import os
+import time
+import pandas as pd
+from src.db_manager import create_table, drop_table, insert_data, INSERT_METHODS
+
+SAMPLE_FILE = os.path.join("data", "cleaned_flight_data.csv")
+
+def read_sample(file_path=SAMPLE_FILE):
+    """
+    Read the cleaned flight data sample with the dtypes produced by load_data.
+    Args:
+        file_path (str): Path to a cleaned flight data CSV file.
+    Returns:
+        pd.DataFrame: DataFrame containing the cleaned flight data.
+    """
+    return pd.read_csv(
+        file_path,
+        dtype = {"icao24": str, "callsign": str, "squawk": str},
+        parse_dates = ["time_position", "last_contact"]
+    )
+
+def bench_insert(df, method, repeat):
+    """
+    Time insert_data for one method on a freshly created flights table.
+    Args:
+        df (pd.DataFrame): Cleaned flight data to insert.
+        method (str): Insert method passed to insert_data.
+        repeat (int): Number of runs; the fastest one is reported.
+    Returns:
+        dict: Method, row count, best time in seconds and rows per second.
+    """
+    timings = []
+    for _ in range(repeat):
+        drop_table()
+        create_table()
+        start = time.perf_counter()
+        insert_data(df, method = method)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {"method": method, "rows": len(df), "seconds": best, "rows_per_sec": len(df) / best}
+
+def main():
+    parser = argparse.ArgumentParser(description = "Compare rows/sec of the insert_data ingestion paths.")
+    parser.add_argument("--file", default = SAMPLE_FILE, help = "cleaned flight data CSV to insert")
+    parser.add_argument("--methods", nargs = "+", default = list(INSERT_METHODS), choices = INSERT_METHODS)
+    parser.add_argument("--repeat", type = int, default = 3, help = "runs per method, best is reported")
+    args = parser.parse_args()
+
+    df = read_sample(args.file)
+    print(f"{'method':<8} {'rows':>8} {'seconds':>10} {'rows/sec':>12}")
+    for method in args.methods:
+        result = bench_insert(df, method, args.repeat)
+        print(f"{result['method']:<8} {result['rows']:>8} {result['seconds']:>10.3f} {result['rows_per_sec']:>12.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from benchmarks.suite import scale_raw, local_s3, working_directory
+from src.pipeline import run_pipeline
+from src.opensky_client import reset_opensky_client
+from src.upload import get_s3_client
+from src.db_manager import create_table, drop_table
+
+RAW_FILE = "data/raw_flight_data.json"
+STAGES = ["fetch", "clean", "load", "insert", "archive_raw", "archive_cleaned"]
+
+def serve_payload(payload):
+    """
+    Serve a payload as /states/all of a local OpenSky API.
+    Args:
+        payload (bytes): JSON body of every response.
+    Returns:
+        ThreadingHTTPServer: The running server, with its API root in the url attribute.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/api"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def run(workers, repeat, s3_latency):
+    """
+    Run the pipeline repeat times with a number of stage threads.
+    Args:
+        workers (int): PIPELINE_WORKERS; 1 runs the stages one after the other.
+        repeat (int): Runs.
+        s3_latency (float): Seconds added to every S3 request, as the round trip to S3.
+    Returns:
+        tuple: Seconds of each run, and the seconds of each stage in each run.
+    """
+    os.environ["PIPELINE_WORKERS"] = str(workers)
+    totals, stages = [], []
+    with local_s3(), tempfile.TemporaryDirectory() as tmp, working_directory(tmp):
+        if s3_latency:
+            get_s3_client().meta.events.register("before-send.s3", lambda **kwargs: time.sleep(s3_latency))
+        for _ in range(repeat):
+            drop_table()
+            create_table()
+            start = time.perf_counter()
+            result = run_pipeline()
+            totals.append(time.perf_counter() - start)
+            stages.append(result["stage_timings"])
+    return totals, stages
+
+def main():
+    parser = argparse.ArgumentParser(description = "Compare the ingest time of the pipeline run stage by stage and as a graph overlapping the S3 archiving with the database load.")
+    parser.add_argument("--scale", type = int, default = 1, help = "copies of the bundled snapshot served by the local OpenSky API")
+    parser.add_argument("--repeat", type = int, default = 3, help = "runs per configuration")
+    parser.add_argument("--workers", type = int, default = 4, help = "PIPELINE_WORKERS of the graph run")
+    parser.add_argument("--s3-latency-ms", type = float, default = 100, help = "milliseconds added to every S3 request")
+    args = parser.parse_args()
+
+    with open(RAW_FILE, encoding="utf-8") as json_file:
+        payload = json.dumps(scale_raw(json.load(json_file), args.scale)).encode()
+    server = serve_payload(payload)
+    os.environ["OPENSKY_API_URL"] = server.url
+    reset_opensky_client()
+    try:
+        print(f"{'workers':>7} {'total ms':>9} " + " ".join(f"{stage:>15}" for stage in STAGES))
+        for workers in (1, args.workers):
+            totals, stages = run(workers, args.repeat, args.s3_latency_ms / 1000)
+            medians = [statistics.median(timings.get(stage, 0) for timings in stages) * 1000 for stage in STAGES]
+            print(f"{workers:>7} {statistics.median(totals) * 1000:>9.0f} "
+                  + " ".join(f"{median:>15.0f}" for median in medians))
+    finally:
+        server.shutdown()
+        reset_opensky_client()
+
+if __name__ == "__main__":
+    main()
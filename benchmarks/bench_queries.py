@@ -0,0 +1,167 @@
+import argparse
+import datetime
+import json
+from src.db_manager import (create_table, drop_table, create_partitions,
+                            FLIGHT_COUNTS_SQL, GROUND_SPEED_RANGE_SQL, SQUAWK_GROUND_SPEED_SQL)
+from utils.db_utils import db_cursor
+
+# Aircraft per snapshot, close to a global OpenSky fetch after cleaning
+ROWS_PER_SNAPSHOT = 10000
+SNAPSHOT_INTERVAL = datetime.timedelta(minutes=5)
+FIRST_SNAPSHOT = datetime.datetime(2025, 5, 1)
+DEFAULT_SIZES = [10_000, 1_000_000, 10_000_000]
+
+# Queries before they were rewritten as single-pass grouped aggregates
+LEGACY_GROUND_SPEED_RANGE_SQL = """
+    SELECT DISTINCT origin_country,
+        MAX(ground_speed) OVER (PARTITION BY origin_country) AS max_ground_speed,
+        MIN(ground_speed) OVER (PARTITION BY origin_country) AS min_ground_speed
+    FROM {table}
+    WHERE {condition}
+    ORDER BY origin_country;
+"""
+LEGACY_SQUAWK_GROUND_SPEED_SQL = """
+    SELECT 'Squawk Present' AS squawk, ROUND(AVG(ground_speed)::NUMERIC, 2) AS average_ground_speed
+    FROM {table}
+    WHERE {condition}
+    GROUP BY squawk IS NOT NULL
+    HAVING squawk IS NOT NULL
+    UNION
+    SELECT 'Squawk Missing' AS squawk, ROUND(AVG(ground_speed)::NUMERIC, 2) AS average_ground_speed
+    FROM {table}
+    WHERE {condition}
+    GROUP BY squawk
+    HAVING squawk IS NULL;
+"""
+
+QUERIES = {
+    "counts": FLIGHT_COUNTS_SQL,
+    "speed_range_legacy": LEGACY_GROUND_SPEED_RANGE_SQL,
+    "speed_range": GROUND_SPEED_RANGE_SQL,
+    "squawk_legacy": LEGACY_SQUAWK_GROUND_SPEED_SQL,
+    "squawk": SQUAWK_GROUND_SPEED_SQL,
+}
+LATEST_SNAPSHOT = "snapshot_time = (SELECT MAX(snapshot_time) FROM snapshots)"
+
+def populate(rows, indexes=True):
+    """
+    Fill freshly created flights and snapshots tables with synthetic snapshots of
+    ROWS_PER_SNAPSHOT aircraft each, generated inside the database, then vacuum
+    and analyze them as autovacuum would after a bulk load.
+    Args:
+        rows (int): Total number of flights rows.
+        indexes (bool): Keep the analytics indexes of create_table; without them
+            only the primary key is left, as a baseline.
+    Returns:
+        int: Number of snapshots.
+    """
+    drop_table()
+    create_table()
+    snapshots = max(rows // ROWS_PER_SNAPSHOT, 1)
+    per_snapshot = min(rows, ROWS_PER_SNAPSHOT)
+    last = FIRST_SNAPSHOT + SNAPSHOT_INTERVAL * (snapshots - 1)
+    day = FIRST_SNAPSHOT
+    while day <= last:
+        create_partitions(day)
+        day += datetime.timedelta(days=1)
+
+    with db_cursor() as cur:
+        if not indexes:
+            cur.execute("""
+                DROP INDEX flights_snapshot_country_idx, flights_last_contact_brin;
+            """)
+        cur.execute("""
+            INSERT INTO snapshots (snapshot_time, record_count)
+            SELECT %s + s * %s, %s FROM generate_series(0, %s - 1) AS s;
+        """, (FIRST_SNAPSHOT, SNAPSHOT_INTERVAL, per_snapshot, snapshots))
+        cur.execute("""
+            INSERT INTO flights (icao24, callsign, origin_country, time_position, last_contact,
+                                 longitude, latitude, baro_altitude, ground_speed, heading,
+                                 vertical_rate, geo_altitude, squawk, spi, snapshot_time)
+            SELECT to_hex(a), 'CS' || a, 'Country ' || (a %% 150),
+                   t - interval '3 seconds', t - interval '1 second',
+                   random() * 360 - 180, random() * 170 - 85, random() * 40000,
+                   16 + random() * 600, random() * 360, random() * 4000 - 2000,
+                   random() * 40000, CASE WHEN random() < 0.8 THEN (a %% 7777)::text END,
+                   false, t
+            FROM generate_series(0, %s - 1) AS s,
+                 LATERAL (SELECT %s + s * %s AS t) AS snapshot,
+                 generate_series(1, %s) AS a;
+        """, (snapshots, FIRST_SNAPSHOT, SNAPSHOT_INTERVAL, per_snapshot))
+        cur.connection.commit()
+        cur.connection.autocommit = True
+        try:
+            cur.execute("VACUUM ANALYZE flights, snapshots;")
+        finally:
+            cur.connection.autocommit = False
+    return snapshots
+
+def explain(sql_template):
+    """
+    Run a query on the latest snapshot with EXPLAIN (ANALYZE, BUFFERS).
+    Args:
+        sql_template (str): Query formatted with table and condition.
+    Returns:
+        dict: Execution and planning time in ms, shared buffers hit and read,
+              and the node types of the plan.
+    """
+    with db_cursor() as cur:
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) "
+                    + sql_template.format(table="flights", condition=LATEST_SNAPSHOT))
+        plan = cur.fetchone()[0][0]
+    nodes = []
+    def walk(node):
+        nodes.append(node["Node Type"])
+        for child in node.get("Plans", []):
+            walk(child)
+    walk(plan["Plan"])
+    return {
+        "execution_ms": plan["Execution Time"],
+        "planning_ms": plan["Planning Time"],
+        "shared_hit": plan["Plan"].get("Shared Hit Blocks", 0),
+        "shared_read": plan["Plan"].get("Shared Read Blocks", 0),
+        "nodes": nodes,
+    }
+
+def bench_queries(rows, repeat, indexes=True):
+    """
+    Populate the tables with rows flights and explain every query.
+    Args:
+        rows (int): Total number of flights rows.
+        repeat (int): Runs per query; the fastest one is reported.
+        indexes (bool): Keep the analytics indexes, see populate.
+    Returns:
+        list: One result per query with the table size, see explain.
+    """
+    populate(rows, indexes)
+    results = []
+    for name, sql_template in QUERIES.items():
+        runs = [explain(sql_template) for _ in range(repeat)]
+        best = min(runs, key=lambda run: run["execution_ms"])
+        results.append({"rows": rows, "query": name, **best})
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description = "EXPLAIN ANALYZE the analytics queries on the latest snapshot at several table sizes.")
+    parser.add_argument("--sizes", nargs = "+", type = int, default = DEFAULT_SIZES, help = "flights rows to generate")
+    parser.add_argument("--repeat", type = int, default = 5, help = "runs per query, best is reported")
+    parser.add_argument("--without-indexes", action = "store_true", help = "drop the analytics indexes as a baseline")
+    parser.add_argument("--plans", action = "store_true", help = "print the plan node types")
+    parser.add_argument("--json", help = "also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'rows':>10} {'query':<20} {'exec ms':>9} {'plan ms':>8} {'hit':>7} {'read':>7}")
+    for rows in args.sizes:
+        for result in bench_queries(rows, args.repeat, indexes = not args.without_indexes):
+            results.append(result)
+            print(f"{result['rows']:>10} {result['query']:<20} {result['execution_ms']:>9.2f} "
+                  f"{result['planning_ms']:>8.2f} {result['shared_hit']:>7} {result['shared_read']:>7}")
+            if args.plans:
+                print(" " * 11 + " > ".join(result["nodes"]))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as json_file:
+            json.dump(results, json_file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import argparse
+import gzip
+import os
+import time
+import tracemalloc
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from benchmarks.bench_insert_data import read_sample, SAMPLE_FILE
+from benchmarks.bench_spatial import scale_sample
+from src.db_manager import (create_table, drop_table, insert_data, get_snapshot_version, get_flights,
+                            iter_flights, get_flight_counts_by_origin_country, FLIGHT_COLUMNS)
+from src.spatial import get_spatial_index, find_in_bbox
+from src.responses import ORJSONResponse, iter_ndjson
+
+def best_ms(function, repeat):
+    """Best milliseconds of repeat calls of a function."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+def bench_serialisation(payloads, repeat, gzip_level):
+    """
+    Time the rendering of response bodies with FastAPI's jsonable_encoder and the
+    standard JSONResponse (before) and with ORJSONResponse (after), and the gzip
+    compression applied by GZipMiddleware.
+    Args:
+        payloads (dict): Name and data of each response, wrapped as {"status", "data"}.
+        repeat (int): Timed renders per payload, the best is reported.
+        gzip_level (int): Compression level of GZipMiddleware.
+    Returns:
+        list: One result per payload with rows, ms and bytes before and after, and the
+              gzip compressed bytes and ms.
+    """
+    results = []
+    for name, data in payloads.items():
+        content = {"status": "success", "data": data}
+        before = JSONResponse(content=jsonable_encoder(content)).body
+        after = ORJSONResponse(content).body
+        results.append({
+            "payload": name,
+            "rows": len(data),
+            "before_ms": best_ms(lambda: JSONResponse(content=jsonable_encoder(content)), repeat),
+            "after_ms": best_ms(lambda: ORJSONResponse(content), repeat),
+            "before_bytes": len(before),
+            "after_bytes": len(after),
+            "gzip_bytes": len(gzip.compress(after, compresslevel=gzip_level)),
+            "gzip_ms": best_ms(lambda: gzip.compress(after, compresslevel=gzip_level), repeat),
+        })
+    return results
+
+def peak_bytes(function):
+    """Peak traced Python memory allocated while calling a function."""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def bench_export():
+    """
+    Compare the peak memory of serving a whole snapshot as one JSON document with
+    streaming it as JSON Lines read in keyset pages, as /flights/export does.
+    Returns:
+        dict: Peak traced bytes of each way.
+    """
+    def whole():
+        JSONResponse(content=jsonable_encoder({"status": "success", "data": get_flights(limit=None)}))
+
+    def streamed():
+        records = (dict(zip(FLIGHT_COLUMNS, flight)) for flight in iter_flights())
+        for _ in iter_ndjson(records):
+            pass
+    return {"whole_peak_bytes": peak_bytes(whole), "streamed_peak_bytes": peak_bytes(streamed)}
+
+def main():
+    parser = argparse.ArgumentParser(description = "Compare serialisation time and size of API responses before and after orjson and gzip.")
+    parser.add_argument("--file", default = SAMPLE_FILE, help = "cleaned flight data CSV of the snapshot")
+    parser.add_argument("--scale", type = int, default = 1, help = "copies of the sample, to enlarge the snapshot")
+    parser.add_argument("--repeat", type = int, default = 5, help = "timed renders per payload")
+    parser.add_argument("--gzip-level", type = int, default = int(os.getenv("GZIP_COMPRESS_LEVEL", "5")), help = "gzip compression level, as GZIP_COMPRESS_LEVEL of the API")
+    args = parser.parse_args()
+
+    df = scale_sample(read_sample(args.file), args.scale)
+    drop_table()
+    create_table()
+    insert_data(df)
+    get_spatial_index().build(df, get_snapshot_version())
+    try:
+        payloads = {
+            "analytics flight counts": get_flight_counts_by_origin_country(),
+            "bbox europe (memory index)": find_in_bbox(-10.0, 35.0, 30.0, 60.0),
+            "flights page of 1000": get_flights(limit=1000),
+            "flights whole snapshot": get_flights(limit=None),
+        }
+        results = bench_serialisation(payloads, args.repeat, args.gzip_level)
+    finally:
+        get_spatial_index().clear()
+    export = bench_export()
+
+    print(f"{len(df)} aircraft")
+    print(f"{'payload':<28} {'rows':>7} {'before ms':>10} {'after ms':>9} {'before KiB':>11} "
+          f"{'after KiB':>10} {'gzip KiB':>9} {'gzip ms':>8}")
+    for result in results:
+        print(f"{result['payload']:<28} {result['rows']:>7} {result['before_ms']:>10.2f} {result['after_ms']:>9.2f} "
+              f"{result['before_bytes'] / 1024:>11.1f} {result['after_bytes'] / 1024:>10.1f} "
+              f"{result['gzip_bytes'] / 1024:>9.1f} {result['gzip_ms']:>8.2f}")
+    print(f"whole snapshot as one JSON response: {export['whole_peak_bytes'] / 2**20:.1f} MiB peak, "
+          f"streamed as JSON Lines: {export['streamed_peak_bytes'] / 2**20:.1f} MiB peak")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import datetime
+import time
+from benchmarks.bench_insert_data import read_sample, SAMPLE_FILE
+from src.db_manager import (create_table, drop_table, insert_data, get_rollups, get_rollup_summary,
+                            _update_rollups)
+from utils.db_utils import db_cursor
+
+START = datetime.datetime(2025, 5, 18, 0, 0, 0)
+
+# The same questions answered from the raw snapshots in flights
+RAW_HOURLY_SQL = """
+    SELECT date_trunc('hour', snapshot_time), origin_country, COUNT(DISTINCT snapshot_time), COUNT(*),
+        MIN(ground_speed), MAX(ground_speed), ROUND(AVG(ground_speed)::NUMERIC, 2)
+    FROM flights
+    WHERE snapshot_time >= %s
+    GROUP BY 1, 2
+    ORDER BY 1, 2;
+"""
+RAW_SUMMARY_SQL = """
+    SELECT origin_country, COUNT(*), MIN(ground_speed), MAX(ground_speed), ROUND(AVG(ground_speed)::NUMERIC, 2)
+    FROM flights
+    WHERE snapshot_time >= %s
+    GROUP BY origin_country
+    ORDER BY COUNT(*) DESC;
+"""
+
+def best_ms(function, repeat):
+    """Best milliseconds of repeat calls of a function."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+def raw_query(query):
+    """Run a raw query over every snapshot since START."""
+    with db_cursor() as cur:
+        cur.execute(query, (START,))
+        return cur.fetchall()
+
+def rollup_update_ms(snapshot_time, repeat):
+    """
+    Best milliseconds of adding one stored snapshot to the rollups, rolled back
+    after each run, i.e. the time the rollups add to an insert.
+    """
+    timings = []
+    for _ in range(repeat):
+        with db_cursor() as cur:
+            start = time.perf_counter()
+            _update_rollups(cur, snapshot_time, "flights", "snapshot_time = %s", (snapshot_time,))
+            timings.append(time.perf_counter() - start)
+            cur.connection.rollback()
+    return min(timings) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description = "Compare long-range analytics read from the rollup tables with scans of the raw snapshots.")
+    parser.add_argument("--file", default = SAMPLE_FILE, help = "cleaned flight data CSV of each snapshot")
+    parser.add_argument("--snapshots", type = int, default = 144, help = "snapshots to ingest")
+    parser.add_argument("--interval", type = int, default = 10, help = "minutes between snapshots")
+    parser.add_argument("--repeat", type = int, default = 5, help = "timed runs per query")
+    args = parser.parse_args()
+
+    df = read_sample(args.file)
+    drop_table()
+    create_table()
+    snapshot_times = [START + datetime.timedelta(minutes=args.interval * i) for i in range(args.snapshots)]
+    start = time.perf_counter()
+    for snapshot_time in snapshot_times:
+        insert_data(df, snapshot_time=snapshot_time)
+    insert_seconds = time.perf_counter() - start
+
+    queries = {
+        "per country per hour": (lambda: raw_query(RAW_HOURLY_SQL),
+                                 lambda: get_rollups("hour", start=START)),
+        "per country, whole range": (lambda: raw_query(RAW_SUMMARY_SQL),
+                                     lambda: get_rollup_summary("hour", start=START)),
+    }
+    print(f"{args.snapshots} snapshots of {len(df)} aircraft ({args.snapshots * len(df)} rows) over "
+          f"{args.snapshots * args.interval / 60:.1f} hours, inserted in {insert_seconds:.1f} s")
+    print(f"rollup update per snapshot: {rollup_update_ms(snapshot_times[-1], args.repeat):.2f} ms")
+    print(f"{'query':<26} {'rows':>6} {'raw ms':>9} {'rollup ms':>10} {'speedup':>8}")
+    for name, (raw, rollup) in queries.items():
+        raw_ms, rollup_ms = best_ms(raw, args.repeat), best_ms(rollup, args.repeat)
+        print(f"{name:<26} {len(rollup()):>6} {raw_ms:>9.2f} {rollup_ms:>10.2f} {raw_ms / rollup_ms:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
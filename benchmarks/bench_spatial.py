@@ -0,0 +1,96 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from benchmarks.bench_insert_data import read_sample, SAMPLE_FILE
+from benchmarks.bench_analytics import per_call_ms
+from src.cache import get_cache
+from src.db_manager import create_table, drop_table, insert_data, get_snapshot_version
+from src.spatial import get_spatial_index, find_in_bbox, find_within_radius, find_nearest
+from utils.db_utils import db_cursor
+
+# Dense and sparse regions: Europe, around Frankfurt and over the South Atlantic
+QUERIES = {
+    "bbox europe": lambda: find_in_bbox(-10.0, 35.0, 30.0, 60.0),
+    "bbox central europe": lambda: find_in_bbox(5.0, 45.0, 15.0, 55.0),
+    "radius 250km frankfurt": lambda: find_within_radius(8.68, 50.11, 250),
+    "nearest 10 frankfurt": lambda: find_nearest(8.68, 50.11, 10),
+    "nearest 10 south atlantic": lambda: find_nearest(-30.0, -40.0, 10),
+}
+
+def scale_sample(df, scale, seed=0):
+    """
+    Enlarge a snapshot with copies of its aircraft moved by up to half a degree.
+    Args:
+        df (pd.DataFrame): Cleaned flight data.
+        scale (int): Number of copies.
+        seed (int): Random seed.
+    Returns:
+        pd.DataFrame: The enlarged snapshot with unique icao24.
+    """
+    rng = np.random.default_rng(seed)
+    copies = []
+    for copy in range(scale):
+        shifted = df.copy()
+        if copy:
+            shifted["icao24"] = shifted["icao24"] + f"-{copy}"
+            shifted["longitude"] = (shifted["longitude"] + rng.uniform(-0.5, 0.5, len(df))).clip(-180, 180)
+            shifted["latitude"] = (shifted["latitude"] + rng.uniform(-0.5, 0.5, len(df))).clip(-90, 90)
+        copies.append(shifted)
+    return pd.concat(copies, ignore_index=True)
+
+def bench_spatial(df, iterations):
+    """
+    Time the spatial queries on one ingested snapshot through Postgres and the
+    in-memory grid index, and the time taken to build the index.
+    Args:
+        df (pd.DataFrame): Cleaned flight data of the snapshot.
+        iterations (int): Calls per query and path.
+    Returns:
+        tuple: Index build time in ms, and one result per query with the number of
+               aircraft found and the ms per call of each path.
+    """
+    drop_table()
+    create_table()
+    insert_data(df)
+    with db_cursor() as cur:
+        cur.connection.autocommit = True
+        try:
+            cur.execute("VACUUM ANALYZE flights;")
+        finally:
+            cur.connection.autocommit = False
+    get_cache().invalidate()
+    version = get_snapshot_version()
+
+    results = []
+    get_spatial_index().clear()
+    for name, query in QUERIES.items():
+        results.append({"query": name, "aircraft": len(query()),
+                        "postgres_ms": per_call_ms(query, iterations)})
+
+    start = time.perf_counter()
+    get_spatial_index().build(df, version)
+    build_ms = (time.perf_counter() - start) * 1000
+    try:
+        for result in results:
+            result["memory_ms"] = per_call_ms(QUERIES[result["query"]], iterations)
+    finally:
+        get_spatial_index().clear()
+    return build_ms, results
+
+def main():
+    parser = argparse.ArgumentParser(description = "Compare latency of the spatial queries in Postgres and the in-memory grid index.")
+    parser.add_argument("--file", default = SAMPLE_FILE, help = "cleaned flight data CSV of the snapshot")
+    parser.add_argument("--scale", type = int, default = 1, help = "copies of the sample, moved slightly, to densify the snapshot")
+    parser.add_argument("--iterations", type = int, default = 50, help = "calls per query and path")
+    args = parser.parse_args()
+
+    df = scale_sample(read_sample(args.file), args.scale)
+    build_ms, results = bench_spatial(df, args.iterations)
+    print(f"{len(df)} aircraft, in-memory grid index built in {build_ms:.2f} ms")
+    print(f"{'query':<28} {'aircraft':>9} {'postgres ms':>12} {'memory ms':>10}")
+    for result in results:
+        print(f"{result['query']:<28} {result['aircraft']:>9} {result['postgres_ms']:>12.3f} {result['memory_ms']:>10.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Modules of the ingestion path the read-only API must start without
+INGEST_ONLY_MODULES = ("pandas", "numpy", "pyarrow", "boto3", "botocore", "requests", "asyncpg")
+# Import time of src.main, FastAPI included (about 540 ms of it on a 1-CPU container); pandas
+# and NumPy alone add about 650 ms. Override with IMPORT_TIME_BUDGET_MS on slower machines
+IMPORT_TIME_BUDGET_MS = 1000
+
+def get_import_time_budget_ms():
+    """Import time budget of src.main in milliseconds, IMPORT_TIME_BUDGET_MS by default."""
+    return float(os.getenv("IMPORT_TIME_BUDGET_MS", IMPORT_TIME_BUDGET_MS))
+
+def profile_import(module="src.main"):
+    """
+    Import a module in a fresh interpreter with python -X importtime.
+    Args:
+        module (str): Module to import.
+    Returns:
+        dict: The cumulative import time of each module in microseconds (the first
+              import of a module counts, nested imports included), the modules loaded
+              after the import, and the wall-clock seconds of the process.
+    """
+    code = f"import json, sys; import {module}; print(json.dumps(sorted(sys.modules)))"
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, check=True)
+    wall_seconds = time.perf_counter() - start
+    cumulative = {}
+    for line in output.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, total, name = line[len("import time:"):].split("|")
+        cumulative.setdefault(name.strip(), int(total))
+    return {"cumulative_us": cumulative, "modules": json.loads(output.stdout.splitlines()[-1]),
+            "wall_seconds": wall_seconds}
+
+def loaded_ingest_modules(modules):
+    """INGEST_ONLY_MODULES among loaded module names, e.g. the modules of profile_import."""
+    return sorted({name.split(".")[0] for name in modules} & set(INGEST_ONLY_MODULES))
+
+def main():
+    parser = argparse.ArgumentParser(description = "Measure the import time of the API with python -X importtime against its budget.")
+    parser.add_argument("--module", default = "src.main", help = "module to import")
+    parser.add_argument("--repeat", type = int, default = 5, help = "fresh interpreters to time")
+    parser.add_argument("--top", type = int, default = 10, help = "slowest top-level packages to list")
+    args = parser.parse_args()
+
+    profiles = [profile_import(args.module) for _ in range(args.repeat)]
+    import_ms = [profile["cumulative_us"][args.module] / 1000 for profile in profiles]
+    wall_ms = [profile["wall_seconds"] * 1000 for profile in profiles]
+    budget_ms = get_import_time_budget_ms()
+    print(f"import {args.module}: median {statistics.median(import_ms):.0f} ms, best {min(import_ms):.0f} ms "
+          f"(budget {budget_ms:.0f} ms); process {statistics.median(wall_ms):.0f} ms")
+    print(f"ingestion modules loaded: {', '.join(loaded_ingest_modules(profiles[0]['modules'])) or 'none'}")
+
+    # Top-level packages, by their median cumulative time
+    packages = {}
+    for profile in profiles:
+        for name, total in profile["cumulative_us"].items():
+            if "." not in name:
+                packages.setdefault(name, []).append(total)
+    slowest = sorted(packages.items(), key=lambda item: -statistics.median(item[1]))[:args.top]
+    for name, totals in slowest:
+        print(f"  {name:<32} {statistics.median(totals) / 1000:>8.1f} ms")
+    if min(import_ms) > budget_ms:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
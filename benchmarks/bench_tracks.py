@@ -0,0 +1,127 @@
+import argparse
+import time
+import tracemalloc
+from collections import deque
+import pandas as pd
+from benchmarks.bench_insert_data import read_sample, SAMPLE_FILE
+from benchmarks.bench_analytics import per_call_ms
+from benchmarks.bench_spatial import scale_sample
+from src.tracks import TrackStore, VALUE_COLUMNS
+
+def snapshots(df, cycles, interval):
+    """
+    Successive snapshots of the same aircraft, interval seconds apart, each aircraft
+    moved along its heading.
+    Args:
+        df (pd.DataFrame): Cleaned flight data of the first snapshot.
+        cycles (int): Number of snapshots.
+        interval (int): Seconds between snapshots.
+    Returns:
+        generator: The snapshots.
+    """
+    for cycle in range(cycles):
+        later = df.copy()
+        later["time_position"] += pd.Timedelta(seconds=cycle * interval)
+        later["last_contact"] += pd.Timedelta(seconds=cycle * interval)
+        later["longitude"] += cycle * 0.01
+        yield later
+
+def deque_store(frames, track_length):
+    """
+    Baseline: a dict of deques of point tuples per aircraft, filled with the same snapshots.
+    Args:
+        frames (list): Snapshots to append.
+        track_length (int): Points kept per aircraft.
+    Returns:
+        dict: The tracks.
+    """
+    tracks = {}
+    for frame in frames:
+        times = frame["time_position"].fillna(frame["last_contact"]).astype("int64") // 10**6
+        for icao24, point_time, *values in zip(frame["icao24"], times, *(frame[column] for column in VALUE_COLUMNS)):
+            tracks.setdefault(icao24, deque(maxlen=track_length)).append((point_time, *values))
+    return tracks
+
+def traced_bytes(build):
+    """
+    Bytes still allocated by Python after calling build, as seen by tracemalloc.
+    Args:
+        build (callable): Function creating the object to measure.
+    Returns:
+        tuple: The object built and the bytes it holds.
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    built = build()
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return built, allocated
+
+def bench_tracks(df, track_length, interval, iterations):
+    """
+    Fill a track store with track_length snapshots of the same aircraft and measure
+    its memory per aircraft against a dict of deques, the time to append a snapshot,
+    to read one track and to export every track.
+    Args:
+        df (pd.DataFrame): Cleaned flight data of the first snapshot.
+        track_length (int): Points kept per aircraft; also the number of snapshots.
+        interval (int): Seconds between snapshots.
+        iterations (int): Calls when timing track reads.
+    Returns:
+        dict: Aircraft tracked, bytes per aircraft of both stores, ms per append,
+              ms per track read and ms to export all tracks.
+    """
+    frames = list(snapshots(df, track_length, interval))
+
+    def fill():
+        store = TrackStore(track_length=track_length, ttl_seconds=track_length * interval * 2)
+        for frame in frames:
+            store.append(frame)
+        return store
+
+    # Timed without tracemalloc, which slows allocation down
+    start = time.perf_counter()
+    store = fill()
+    append_ms = (time.perf_counter() - start) / len(frames) * 1000
+    del store
+    store, store_bytes = traced_bytes(fill)
+    baseline, deque_bytes = traced_bytes(lambda: deque_store(frames, track_length))
+    del baseline
+    aircraft = store.stats()["aircraft"]
+    icao24 = df["icao24"].iloc[0]
+
+    start = time.perf_counter()
+    lines = sum(1 for _ in store.iter_ndjson())
+    export_ms = (time.perf_counter() - start) * 1000
+    return {
+        "aircraft": aircraft,
+        "points_per_aircraft": len(store.track(icao24)),
+        "store_bytes_per_aircraft": store_bytes / aircraft,
+        "deque_bytes_per_aircraft": deque_bytes / aircraft,
+        "append_ms": append_ms,
+        "track_ms": per_call_ms(lambda: store.track(icao24), iterations),
+        "export_ms": export_ms,
+        "exported": lines,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description = "Measure memory per aircraft and latency of the aircraft track store.")
+    parser.add_argument("--file", default = SAMPLE_FILE, help = "cleaned flight data CSV of the first snapshot")
+    parser.add_argument("--scale", type = int, default = 2, help = "copies of the sample, moved slightly; 2 gives about 20k aircraft, a global peak")
+    parser.add_argument("--track-length", type = int, default = 120, help = "points kept per aircraft, and snapshots appended")
+    parser.add_argument("--interval", type = int, default = 10, help = "seconds between snapshots")
+    parser.add_argument("--iterations", type = int, default = 1000, help = "calls when timing track reads")
+    args = parser.parse_args()
+
+    df = scale_sample(read_sample(args.file), args.scale)
+    result = bench_tracks(df, args.track_length, args.interval, args.iterations)
+    print(f"{result['aircraft']} aircraft, {result['points_per_aircraft']} points each")
+    print(f"track store:    {result['store_bytes_per_aircraft']:>9.0f} bytes per aircraft, "
+          f"{result['store_bytes_per_aircraft'] * result['aircraft'] / 2**20:.1f} MiB")
+    print(f"dict of deques: {result['deque_bytes_per_aircraft']:>9.0f} bytes per aircraft, "
+          f"{result['deque_bytes_per_aircraft'] * result['aircraft'] / 2**20:.1f} MiB")
+    print(f"append {result['append_ms']:.2f} ms per snapshot, read {result['track_ms']:.4f} ms per track, "
+          f"export {result['exported']} tracks in {result['export_ms']:.0f} ms")
+
+if __name__ == "__main__":
+    main()
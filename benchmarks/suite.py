@@ -0,0 +1,287 @@
+import argparse
+import contextlib
+import datetime
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import boto3
+import numpy as np
+from benchmarks.bench_clean_data import SAMPLE_FILE
+from src.transform import clean_data
+from src.load import load_data
+from src.db_manager import create_table, drop_table, insert_data, get_aircraft_in_boxes
+from src.cache import ANALYTICS_QUERIES
+from src.analytics import SnapshotAggregates
+from src.spatial import SpatialIndex, split_bbox
+from src.tracks import TrackStore
+from src.upload import reset_s3_client
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+SNAPSHOT_TIME = "2025-05-18_18-44-48"
+# Europe, the densest region of the bundled snapshot
+EUROPE_BOXES = split_bbox(-10.0, 35.0, 30.0, 60.0)
+
+def scale_raw(raw_data, scale, seed=0):
+    """
+    Enlarge a raw OpenSky payload with copies of its states, each copy with its own
+    icao24 and moved by up to half a degree, so scaled snapshots hold distinct aircraft.
+    Args:
+        raw_data (dict): Raw flight data from OpenSky API.
+        scale (int): Number of copies.
+        seed (int): Random seed.
+    Returns:
+        dict: The enlarged payload.
+    """
+    rng = np.random.default_rng(seed)
+    states = list(raw_data["states"])
+    for copy in range(1, scale):
+        shifts = rng.uniform(-0.5, 0.5, (len(raw_data["states"]), 2))
+        for state, (lon_shift, lat_shift) in zip(raw_data["states"], shifts):
+            state = list(state)
+            state[0] = f"{state[0]}-{copy}"
+            if state[5] is not None:
+                state[5] = min(max(state[5] + lon_shift, -180.0), 180.0)
+            if state[6] is not None:
+                state[6] = min(max(state[6] + lat_shift, -90.0), 90.0)
+            states.append(state)
+    return {**raw_data, "states": states}
+
+@contextlib.contextmanager
+def local_s3():
+    """
+    Point uploads at a local S3 stand-in: the server at S3_ENDPOINT_URL if set
+    (e.g. MinIO or a moto server), otherwise moto's in-process mock.
+    """
+    bucket = os.getenv("S3_DATA_BUCKET", "opensky-bench-data")
+    saved = {name: os.environ.get(name) for name in
+             ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_DEFAULT_REGION", "S3_DATA_BUCKET")}
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ["S3_DATA_BUCKET"] = bucket
+    mock = contextlib.nullcontext()
+    if not os.getenv("S3_ENDPOINT_URL"):
+        from moto import mock_aws
+        mock = mock_aws()
+    try:
+        with mock:
+            reset_s3_client()
+            client = boto3.client("s3", endpoint_url=os.getenv("S3_ENDPOINT_URL") or None)
+            with contextlib.suppress(client.exceptions.BucketAlreadyOwnedByYou):
+                client.create_bucket(Bucket=bucket)
+            yield
+    finally:
+        reset_s3_client()
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+@contextlib.contextmanager
+def working_directory(path):
+    """Run in another directory, so files written to data/ do not replace the bundled samples."""
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+def measure(run, repeat, setup=None):
+    """
+    Time a stage and measure its peak Python memory allocation.
+    Args:
+        run (callable): Runs the stage once and returns its output.
+        repeat (int): Timed runs; the memory is measured on one more, untimed run.
+        setup (callable): Called before every run, untimed, e.g. to reset a table.
+    Returns:
+        tuple: The output of the last run, and its best and median seconds and
+               peak traced bytes.
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        output = run()
+        timings.append(time.perf_counter() - start)
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        output = run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return output, {"seconds": min(timings), "seconds_median": statistics.median(timings), "peak_bytes": peak}
+
+def bench_scale(raw_data, scale, repeat):
+    """
+    Run every stage of the pipeline on the raw payload scaled up scale times:
+    clean_data, load_data (files written to a temporary directory and uploaded to
+    the local S3 stand-in), insert_data, the Postgres queries served by the API,
+    and the in-memory analytics aggregates, spatial index and tracks built after
+    an ingest.
+    Args:
+        raw_data (dict): Raw flight data from OpenSky API.
+        scale (int): Number of copies of the states.
+        repeat (int): Timed runs per stage.
+    Returns:
+        list: One result per stage with the rows processed, best and median seconds,
+              rows per second and peak traced bytes.
+    """
+    scaled = scale_raw(raw_data, scale)
+    results = []
+
+    def record(stage, rows, run, setup=None):
+        output, result = measure(run, repeat, setup)
+        results.append({"stage": stage, "scale": scale, "rows": rows, **result,
+                        "rows_per_sec": rows / result["seconds"] if result["seconds"] else None})
+        print(f"  {stage:<62} {rows:>9} rows {result['seconds'] * 1000:>10.1f} ms "
+              f"{result['peak_bytes'] / 2**20:>8.1f} MiB")
+        return output
+
+    df, _ = record("clean_data", len(scaled["states"]), lambda: clean_data(scaled, SNAPSHOT_TIME))
+    with local_s3(), tempfile.TemporaryDirectory() as tmp, working_directory(tmp):
+        df = record("load_data", len(df), lambda: load_data(df, SNAPSHOT_TIME))
+
+    def reset_tables():
+        drop_table()
+        create_table()
+    record("insert_data", len(df), lambda: insert_data(df, snapshot_time=SNAPSHOT_TIME), setup=reset_tables)
+    for name, query in ANALYTICS_QUERIES.items():
+        record(f"query:{name}", len(df), query)
+    record("query:aircraft-in-bbox-europe", len(df), lambda: get_aircraft_in_boxes(EUROPE_BOXES))
+
+    record("memory:analytics-aggregates", len(df), lambda: SnapshotAggregates(df, "bench"))
+    index = record("memory:spatial-index", len(df), lambda: SpatialIndex(df, "bench"))
+    record("memory:spatial-bbox-europe", len(df), lambda: index.records(index.search(EUROPE_BOXES)))
+    # Short tracks sized for the snapshot: the stage times appending, not allocating 120 points per aircraft
+    record("memory:tracks-append", len(df),
+           lambda: TrackStore(track_length=8, ttl_seconds=10**9, initial_slots=len(df)).append(df))
+    return results
+
+def environment():
+    """
+    Describe the run, so results files can be told apart.
+    Returns:
+        dict: Creation time, git commit, Python version, platform and CPU count.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+def compare(baseline, current, threshold=0.1):
+    """
+    Compare two results files stage by stage.
+    Args:
+        baseline (dict): Earlier results.
+        current (dict): New results.
+        threshold (float): Relative increase in time or peak memory counted as a regression.
+    Returns:
+        tuple: One row per stage and scale found in both runs, with the seconds and peak bytes
+               of each run and their relative changes, and the rows that regressed.
+    """
+    earlier = {(result["stage"], result["scale"]): result for result in baseline["results"]}
+    rows, regressions = [], []
+    for result in current["results"]:
+        before = earlier.get((result["stage"], result["scale"]))
+        if before is None:
+            continue
+        row = {
+            "stage": result["stage"],
+            "scale": result["scale"],
+            "seconds_before": before["seconds"],
+            "seconds_after": result["seconds"],
+            "seconds_change": result["seconds"] / before["seconds"] - 1 if before["seconds"] else None,
+            "peak_bytes_before": before["peak_bytes"],
+            "peak_bytes_after": result["peak_bytes"],
+            "peak_bytes_change": result["peak_bytes"] / before["peak_bytes"] - 1 if before["peak_bytes"] else None,
+        }
+        rows.append(row)
+        if any(change is not None and change > threshold
+               for change in (row["seconds_change"], row["peak_bytes_change"])):
+            regressions.append(row)
+    return rows, regressions
+
+def print_comparison(rows, regressions):
+    """Print the output of compare as a table, marking the regressions."""
+    print(f"{'stage':<62} {'scale':>5} {'ms before':>10} {'ms after':>10} {'time':>8} {'memory':>8}")
+    for row in rows:
+        changes = [f"{change:+.1%}" if change is not None else "n/a"
+                   for change in (row["seconds_change"], row["peak_bytes_change"])]
+        marker = "  REGRESSION" if row in regressions else ""
+        print(f"{row['stage']:<62} {row['scale']:>5} {row['seconds_before'] * 1000:>10.1f} "
+              f"{row['seconds_after'] * 1000:>10.1f} {changes[0]:>8} {changes[1]:>8}{marker}")
+
+def read_results(file_path):
+    """Read a results file written by run."""
+    with open(file_path, encoding="utf-8") as results_file:
+        return json.load(results_file)
+
+def run(args):
+    """Run the suite, write the results file and compare it with a baseline if one is given."""
+    with open(args.file, encoding="utf-8") as json_file:
+        raw_data = json.load(json_file)
+    results = []
+    for scale in args.scales:
+        print(f"scale {scale}x ({len(raw_data['states']) * scale} states)")
+        results.extend(bench_scale(raw_data, scale, args.repeat))
+    report = {**environment(), "repeat": args.repeat, "file": args.file, "results": results}
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{report['created_at'].replace(':', '-')}_{report['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as results_file:
+        json.dump(report, results_file, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        rows, regressions = compare(read_results(args.compare), report, args.threshold)
+        print_comparison(rows, regressions)
+        return 1 if regressions else 0
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmark every pipeline stage and compare results between runs.")
+    commands = parser.add_subparsers(dest = "command", required = True)
+    run_parser = commands.add_parser("run", help = "run the suite and write a results file")
+    run_parser.add_argument("--file", default = SAMPLE_FILE, help = "raw OpenSky JSON payload replayed through the stages")
+    run_parser.add_argument("--scales", nargs = "+", type = int, default = [1, 10, 100], help = "copies of the payload's states")
+    run_parser.add_argument("--repeat", type = int, default = 3, help = "timed runs per stage, best and median are reported")
+    run_parser.add_argument("--output", help = f"results file, by default under {RESULTS_DIR}/")
+    run_parser.add_argument("--compare", help = "results file of an earlier run to compare with")
+    run_parser.add_argument("--threshold", type = float, default = 0.1, help = "relative slowdown or memory growth reported as a regression")
+    compare_parser = commands.add_parser("compare", help = "compare two results files")
+    compare_parser.add_argument("baseline", help = "results file of the earlier run")
+    compare_parser.add_argument("current", help = "results file of the new run")
+    compare_parser.add_argument("--threshold", type = float, default = 0.1, help = "relative slowdown or memory growth reported as a regression")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        sys.exit(run(args))
+    rows, regressions = compare(read_results(args.baseline), read_results(args.current), args.threshold)
+    print_comparison(rows, regressions)
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import os
+import math
+import threading
+from decimal import Decimal, ROUND_HALF_UP
+from src.cache import get_cache, ANALYTICS_QUERIES, ASYNC_ANALYTICS_QUERIES
+
+ANALYTICS_ENGINES = ("postgres", "memory")
+
+def get_analytics_engine_name():
+    """
+    Engine answering the analytics endpoints, read from the ANALYTICS_ENGINE environment variable.
+    Returns:
+        str: One of ANALYTICS_ENGINES, "postgres" by default.
+    Raises:
+        ValueError: If the engine is not one of ANALYTICS_ENGINES.
+    """
+    engine = os.getenv("ANALYTICS_ENGINE", "postgres")
+    if engine not in ANALYTICS_ENGINES:
+        raise ValueError(f"Unknown analytics engine '{engine}', expected one of {ANALYTICS_ENGINES}.")
+    return engine
+
+def _to_decimal(value):
+    """
+    Round an average to 2 decimal places as ROUND(AVG(x)::NUMERIC, 2) does in Postgres:
+    the double is cast to numeric with 15 significant digits, then rounded half away from zero.
+    Args:
+        value (float): Average, NaN if there was nothing to average.
+    Returns:
+        Decimal: The rounded average, or None for NaN.
+    """
+    if math.isnan(value):
+        return None
+    return Decimal(f"{value:.15g}").quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+def _to_float(value):
+    """
+    Convert a NumPy float to a Python float, or None for NaN as Postgres returns NULL.
+    Args:
+        value (float): Value to convert.
+    Returns:
+        float: The value, or None.
+    """
+    return None if math.isnan(value) else float(value)
+
+class SnapshotAggregates:
+    """
+    Results of the analytics queries for one snapshot, computed once from the
+    cleaned flight data with grouped NumPy reductions and returned as the same
+    lists of tuples as the db_manager queries. Countries are ordered by code
+    point, as the db_manager queries order them with COLLATE "C", and countries
+    with equal counts by code point too.
+    Args:
+        df (pd.DataFrame): Cleaned flight data of the snapshot, as returned by load_data.
+        version (str): Snapshot version the results belong to, see db_manager.get_snapshot_version.
+    """
+    def __init__(self, df, version):
+        # Imported here: the aggregates are built by ingestion, the API only reads them
+        import numpy as np
+        import pandas as pd
+        from src.transform import to_float64
+
+        self.version = version
+        self.record_count = len(df)
+
+        countries = df["origin_country"]
+        codes, groups = pd.factorize(countries, sort=True, use_na_sentinel=False)
+        group_count = len(groups)
+        speed = to_float64(df[["velocity"]])["velocity"].to_numpy(dtype=np.float64, na_value=np.nan)
+        has_speed = ~np.isnan(speed)
+
+        # COUNT(origin_country) counts no rows for the NULL country group
+        counts = np.bincount(codes[countries.notna().to_numpy()], minlength=group_count)
+        # fmax/fmin skip NaN like MAX/MIN skip NULL; groups without speeds stay NaN
+        max_speed = np.full(group_count, np.nan)
+        min_speed = np.full(group_count, np.nan)
+        np.fmax.at(max_speed, codes, speed)
+        np.fmin.at(min_speed, codes, speed)
+
+        group_names = [None if pd.isna(name) else str(name) for name in groups]
+        by_count = sorted(range(group_count), key=lambda group: (-counts[group], group))
+        self.results = {
+            "flight-counts-by-origin-country":
+                [(group_names[group], int(counts[group])) for group in by_count],
+            "fastest-and-slowest-ground-speed-by-origin-country":
+                [(group_names[group], _to_float(max_speed[group]), _to_float(min_speed[group]))
+                 for group in range(group_count)],
+            "average-ground-speed-of-flights-with-and-without-squawk":
+                self._squawk_split(df["squawk"].notna().to_numpy(), speed, has_speed),
+        }
+
+    @staticmethod
+    def _squawk_split(present, speed, has_speed):
+        """
+        Average speed of the flights with and without squawk, 'Squawk Present' first,
+        leaving out a status no flight has.
+        Args:
+            present (np.ndarray): Whether each flight has a squawk.
+            speed (np.ndarray): Ground speed of each flight, NaN if missing.
+            has_speed (np.ndarray): Whether each flight has a ground speed.
+        Returns:
+            list: Tuples of squawk status and average ground speed.
+        """
+        rows = []
+        for label, mask in (("Squawk Present", present), ("Squawk Missing", ~present)):
+            if not mask.any():
+                continue
+            speeds = mask & has_speed
+            average = speed[speeds].mean() if speeds.any() else math.nan
+            rows.append((label, _to_decimal(average)))
+        return rows
+
+class AnalyticsEngine:
+    """
+    Holds the SnapshotAggregates of the latest snapshot ingested by this process.
+    Results are only served for the snapshot version they were built for, so a
+    snapshot ingested by another process, or a failed build, falls back to Postgres.
+    """
+    def __init__(self):
+        self._aggregates = None
+        self._lock = threading.Lock()
+
+    def build(self, df, version):
+        """
+        Compute the aggregates of a newly ingested snapshot and serve them from now on.
+        Args:
+            df (pd.DataFrame): Cleaned flight data of the snapshot.
+            version (str): Snapshot version after the ingest.
+        Returns:
+            SnapshotAggregates: The new aggregates.
+        """
+        aggregates = SnapshotAggregates(df, version)
+        with self._lock:
+            self._aggregates = aggregates
+        return aggregates
+
+    def get(self, name, version):
+        """
+        Result of an analytics query for a snapshot version.
+        Args:
+            name (str): Query name, a key of cache.ANALYTICS_QUERIES.
+            version (str): Current snapshot version.
+        Returns:
+            list: The query result, or None if no aggregates were built for this version.
+        """
+        aggregates = self._aggregates
+        if aggregates is None or aggregates.version != version:
+            return None
+        return aggregates.results[name]
+
+    def clear(self):
+        """
+        Drop the aggregates, so every query falls back to Postgres.
+        Returns:
+            None
+        """
+        with self._lock:
+            self._aggregates = None
+
+_engine = AnalyticsEngine()
+
+def get_engine():
+    """
+    Return the process-wide in-memory analytics engine.
+    Returns:
+        AnalyticsEngine: The shared engine.
+    """
+    return _engine
+
+def get_query_result(name):
+    """
+    Result of an analytics query for the current snapshot. With ANALYTICS_ENGINE=memory
+    it is served from the in-memory aggregates when they match the current snapshot
+    version, otherwise from the result cache backed by Postgres.
+    Args:
+        name (str): Query name, a key of cache.ANALYTICS_QUERIES.
+    Returns:
+        tuple: The snapshot version and the query result.
+    """
+    cache = get_cache()
+    if get_analytics_engine_name() == "memory":
+        version = cache.version()
+        result = get_engine().get(name, version)
+        if result is not None:
+            return version, result
+    return cache.get(name, ANALYTICS_QUERIES[name])
+
+async def get_query_result_async(name):
+    """
+    Async counterpart of get_query_result, querying Postgres through the asyncpg pool.
+    Args:
+        name (str): Query name, a key of cache.ASYNC_ANALYTICS_QUERIES.
+    Returns:
+        tuple: The snapshot version and the query result.
+    """
+    cache = get_cache()
+    if get_analytics_engine_name() == "memory":
+        version = await cache.version_async()
+        result = get_engine().get(name, version)
+        if result is not None:
+            return version, result
+    return await cache.get_async(name, ASYNC_ANALYTICS_QUERIES[name])
@@ -0,0 +1,91 @@
+import re
+from utils.async_db_utils import async_db_connection
+from src.metrics import observe_query
+from src.db_manager import _snapshot_filter, FLIGHT_COUNTS_SQL, GROUND_SPEED_RANGE_SQL, SQUAWK_GROUND_SPEED_SQL
+
+def _numbered(query):
+    """
+    Convert the %s placeholders of a psycopg2 query to the $1, $2, ... placeholders of asyncpg,
+    so the queries of db_manager can be shared.
+    Args:
+        query (str): Query with %s placeholders.
+    Returns:
+        str: The query with numbered placeholders.
+    """
+    numbers = iter(range(1, query.count("%s") + 1))
+    return re.sub(r"%s", lambda _: f"${next(numbers)}", query)
+
+async def _fetch(query, params=()):
+    """
+    Run a query on a pooled asyncpg connection.
+    Args:
+        query (str): Query with %s placeholders.
+        params (tuple): Query parameters.
+    Returns:
+        list: List of tuples, as cursor.fetchall returns with psycopg2.
+    """
+    async with async_db_connection() as conn:
+        records = await conn.fetch(_numbered(query), *params)
+    return [tuple(record) for record in records]
+
+@observe_query(driver="asyncpg", rows=None)
+async def get_latest_snapshot_time():
+    """
+    Query returns the time of the most recently ingested snapshot.
+    See db_manager.get_latest_snapshot_time.
+    Returns:
+        datetime.datetime: The latest snapshot time, or None if nothing has been ingested.
+    """
+    records = await _fetch("SELECT MAX(snapshot_time) FROM snapshots;")
+    return records[0][0]
+
+@observe_query(driver="asyncpg", rows=None)
+async def get_snapshot_version():
+    """
+    Query returns a version string of the data served by the analytics queries.
+    See db_manager.get_snapshot_version.
+    Returns:
+        str: The snapshot version, "empty" if nothing has been ingested.
+    """
+    records = await _fetch("SELECT MAX(snapshot_time), MAX(ingested_at), COUNT(*) FROM snapshots;")
+    latest, ingested_at, count = records[0]
+    if latest is None:
+        return "empty"
+    return f"{latest.isoformat()}/{ingested_at.isoformat()}/{count}"
+
+@observe_query(driver="asyncpg")
+async def get_flight_counts_by_origin_country(snapshot_time=None):
+    """
+    Query returns the number of flights for each origin country.
+    Args:
+        snapshot_time (str | datetime): Snapshot to query. Defaults to the latest snapshot.
+    Returns:
+        list: List of tuples containing origin country and number of flights.
+    """
+    table, condition, params = _snapshot_filter(snapshot_time)
+    return await _fetch(FLIGHT_COUNTS_SQL.format(table=table, condition=condition), params)
+
+@observe_query(driver="asyncpg")
+async def get_fastest_and_slowest_ground_speed_by_origin_country(snapshot_time=None):
+    """
+    Query returns the fastest and slowest ground speed for each origin country.
+    Args:
+        snapshot_time (str | datetime): Snapshot to query. Defaults to the latest snapshot.
+    Returns:
+        list: List of tuples containing origin country, max ground speed, and min ground speed.
+    """
+    table, condition, params = _snapshot_filter(snapshot_time)
+    return await _fetch(GROUND_SPEED_RANGE_SQL.format(table=table, condition=condition), params)
+
+@observe_query(driver="asyncpg")
+async def get_average_ground_speed_of_flights_with_and_without_squawk(snapshot_time=None):
+    """
+    Query returns the average ground speed of flights with and without squawk,
+    'Squawk Present' first.
+    Args:
+        snapshot_time (str | datetime): Snapshot to query. Defaults to the latest snapshot.
+    Returns:
+        list: List of tuples containing squawk status and average ground speed.
+    """
+    table, condition, params = _snapshot_filter(snapshot_time)
+    return await _fetch(SQUAWK_GROUND_SPEED_SQL.format(table=table, condition=condition), params)
@@ -0,0 +1,263 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from src.db_manager import (
+    get_snapshot_version,
+    get_flight_counts_by_origin_country,
+    get_fastest_and_slowest_ground_speed_by_origin_country,
+    get_average_ground_speed_of_flights_with_and_without_squawk
+    )
+from src import async_db_manager
+
+# Analytics queries served through the cache, by endpoint name
+ANALYTICS_QUERIES = {
+    "flight-counts-by-origin-country": get_flight_counts_by_origin_country,
+    "fastest-and-slowest-ground-speed-by-origin-country": get_fastest_and_slowest_ground_speed_by_origin_country,
+    "average-ground-speed-of-flights-with-and-without-squawk": get_average_ground_speed_of_flights_with_and_without_squawk,
+}
+# The same queries on the asyncpg pool, for handlers running with API_DB_DRIVER=asyncpg
+ASYNC_ANALYTICS_QUERIES = {
+    "flight-counts-by-origin-country": async_db_manager.get_flight_counts_by_origin_country,
+    "fastest-and-slowest-ground-speed-by-origin-country": async_db_manager.get_fastest_and_slowest_ground_speed_by_origin_country,
+    "average-ground-speed-of-flights-with-and-without-squawk": async_db_manager.get_average_ground_speed_of_flights_with_and_without_squawk,
+}
+
+class ResultCache:
+    """
+    LRU cache of query results keyed by query name and snapshot version.
+    Results only change when a snapshot is ingested, so an entry stays valid for
+    as long as the snapshot version it was computed for is current. The version
+    is read from the database at most once every version_ttl seconds, so an ingest
+    made by another process is picked up within version_ttl; an ingest in this
+    process calls invalidate to pick it up at once. Every lookup has an async
+    counterpart for async handlers, sharing the same entries and statistics.
+    Args:
+        get_version (callable): Returns the current snapshot version string.
+        max_entries (int): Maximum number of results kept.
+        version_ttl (float): Seconds a version read from the database is trusted.
+        get_version_async (callable): Coroutine function returning the current snapshot
+            version, used by the async lookups.
+    """
+    def __init__(self, get_version, max_entries=128, version_ttl=2.0, get_version_async=None):
+        self.get_version = get_version
+        self.get_version_async = get_version_async
+        self.max_entries = max_entries
+        self.version_ttl = version_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = None
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "not_modified": 0}
+
+    def _fresh_version(self):
+        """The snapshot version if it was read within version_ttl, otherwise None."""
+        with self._lock:
+            checked_at = self._version_checked_at
+            if checked_at is not None and time.monotonic() - checked_at < self.version_ttl:
+                return self._version
+        return None
+
+    def _set_version(self, version):
+        """Remember a snapshot version just read from the database."""
+        with self._lock:
+            self._version = version
+            self._version_checked_at = time.monotonic()
+
+    def version(self):
+        """
+        Current snapshot version, read again once version_ttl has passed.
+        Returns:
+            str: The snapshot version.
+        """
+        version = self._fresh_version()
+        if version is None:
+            version = self.get_version()
+            self._set_version(version)
+        return version
+
+    async def version_async(self):
+        """
+        Current snapshot version, read again with get_version_async once version_ttl has passed.
+        Returns:
+            str: The snapshot version.
+        """
+        version = self._fresh_version()
+        if version is None:
+            version = await self.get_version_async()
+            self._set_version(version)
+        return version
+
+    def etag(self, name, version=None):
+        """
+        Entity tag of a query result, derived from the query name and snapshot version
+        so it can be checked without computing the result.
+        Args:
+            name (str): Query name.
+            version (str): Snapshot version. Defaults to the current version.
+        Returns:
+            str: Quoted entity tag for the ETag header.
+        """
+        version = self.version() if version is None else version
+        return '"' + hashlib.sha1(f"{name}:{version}".encode()).hexdigest()[:20] + '"'
+
+    def not_modified(self, name, if_none_match):
+        """
+        Check an If-None-Match request header against the current entity tag of a query.
+        Args:
+            name (str): Query name.
+            if_none_match (str): Value of the If-None-Match header, or None.
+        Returns:
+            bool: True if the client already has the current result.
+        """
+        if not if_none_match:
+            return False
+        return self._matches(name, if_none_match, self.version())
+
+    async def not_modified_async(self, name, if_none_match):
+        """
+        Async counterpart of not_modified.
+        Args:
+            name (str): Query name.
+            if_none_match (str): Value of the If-None-Match header, or None.
+        Returns:
+            bool: True if the client already has the current result.
+        """
+        if not if_none_match:
+            return False
+        return self._matches(name, if_none_match, await self.version_async())
+
+    def _matches(self, name, if_none_match, version):
+        """Whether an If-None-Match header lists the entity tag of a query for a version."""
+        etag = self.etag(name, version)
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if etag in tags or "*" in tags:
+            with self._lock:
+                self._stats["not_modified"] += 1
+            return True
+        return False
+
+    def get(self, name, compute):
+        """
+        Return the result of a query for the current snapshot version, computing and
+        caching it on a miss. The least recently used entry is evicted when full.
+        Args:
+            name (str): Query name.
+            compute (callable): Runs the query.
+        Returns:
+            tuple: The snapshot version and the query result.
+        """
+        version = self.version()
+        found, result = self._lookup((name, version))
+        if not found:
+            result = compute()
+            self._store((name, version), result)
+        return version, result
+
+    async def get_async(self, name, compute):
+        """
+        Async counterpart of get.
+        Args:
+            name (str): Query name.
+            compute (callable): Coroutine function running the query.
+        Returns:
+            tuple: The snapshot version and the query result.
+        """
+        version = await self.version_async()
+        found, result = self._lookup((name, version))
+        if not found:
+            result = await compute()
+            self._store((name, version), result)
+        return version, result
+
+    def _lookup(self, key):
+        """Look an entry up, counting a hit or a miss. Returns whether it was found and the result."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return True, self._entries[key]
+            self._stats["misses"] += 1
+        return False, None
+
+    def _store(self, key, result):
+        """Cache a result, evicting the least recently used entries beyond max_entries."""
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self):
+        """
+        Drop every cached result and read the snapshot version again on next use,
+        e.g. right after an ingest.
+        Returns:
+            None
+        """
+        with self._lock:
+            self._entries.clear()
+            self._version_checked_at = None
+            self._stats["invalidations"] += 1
+
+    def warm(self, queries):
+        """
+        Compute and cache the results of several queries for the current snapshot version.
+        Args:
+            queries (dict): Query functions by name.
+        Returns:
+            None
+        """
+        for name, compute in queries.items():
+            self.get(name, compute)
+
+    def stats(self):
+        """
+        Cache statistics for monitoring.
+        Returns:
+            dict: Hits, misses, evictions, invalidations, 304 responses, hit ratio,
+                  entries, maximum entries and the current snapshot version.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else None
+            stats["entries"] = len(self._entries)
+            stats["max_entries"] = self.max_entries
+            stats["version"] = self._version
+        return stats
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """
+    Return the process-wide analytics result cache, creating it on first use.
+    Its size and version check interval are read from RESULT_CACHE_MAX_ENTRIES
+    (default 128) and RESULT_CACHE_VERSION_TTL (seconds, default 2).
+    Returns:
+        ResultCache: The shared cache.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(
+                get_snapshot_version,
+                max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "128")),
+                version_ttl=float(os.getenv("RESULT_CACHE_VERSION_TTL", "2")),
+                get_version_async=async_db_manager.get_snapshot_version,
+            )
+        return _cache
+
+def refresh_cache():
+    """
+    Invalidate the analytics result cache and pre-compute every analytics query
+    for the new snapshot, so the first requests after an ingest are hits.
+    Returns:
+        None
+    """
+    cache = get_cache()
+    cache.invalidate()
+    cache.warm(ANALYTICS_QUERIES)
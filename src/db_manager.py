@@ -1,19 +1,110 @@
-import psycopg2
-import pandas as pd
+import io
+import os
+import datetime
+from typing import TYPE_CHECKING
+from psycopg2 import sql
+from psycopg2.extras import execute_values
 from utils.db_utils import db_cursor
+from src.metrics import observe_query
 
+if TYPE_CHECKING:
+    # pandas is only needed to ingest, the read-only API starts without it
+    import pandas as pd
+
+# Columns of the flights table filled on insert, and the DataFrame columns they come from
+FLIGHT_COLUMNS = ["icao24", "callsign", "origin_country", "time_position", "last_contact",
+                  "longitude", "latitude", "baro_altitude", "ground_speed", "heading",
+                  "vertical_rate", "geo_altitude", "squawk", "spi"]
+DATAFRAME_COLUMNS = ["icao24", "callsign", "origin_country", "time_position", "last_contact",
+                     "longitude", "latitude", "baro_altitude", "velocity", "true_track",
+                     "vertical_rate", "geo_altitude", "squawk", "spi"]
+INSERT_METHODS = ("copy", "values", "row")
+# Rows formatted as CSV at a time by the copy method, bounding the text held in memory
+COPY_CHUNK_ROWS = 20000
+# "full" stores every fetch as a snapshot in flights, "incremental" only writes
+# the aircraft that changed since the previous fetch to flight_states
+INGEST_MODES = ("full", "incremental")
+# Columns compared between fetches to find the aircraft that changed
+STATE_KEY_COLUMNS = ["icao24", "time_position", "last_contact"]
+
+# Columns returned by the spatial queries, and the DataFrame columns they come from
+SPATIAL_COLUMNS = ["icao24", "callsign", "origin_country", "longitude", "latitude",
+                   "baro_altitude", "ground_speed", "heading"]
+SPATIAL_DATAFRAME_COLUMNS = ["icao24", "callsign", "origin_country", "longitude", "latitude",
+                             "baro_altitude", "velocity", "true_track"]
+
+# Format of the UTC timestamp returned by get_flight_data and used in the S3 keys
+SNAPSHOT_TIME_FORMAT = "%Y-%m-%d_%H-%M-%S"
+# Snapshots are stored in one flights partition per UTC day
+PARTITION_PREFIX = "flights_p"
+PARTITION_DATE_FORMAT = "%Y%m%d"
+
+# Rollup tables aggregating every snapshot per origin country and time bucket,
+# keyed by the date_trunc unit of their buckets
+ROLLUP_TABLES = {"minute": "flight_rollups_minute", "hour": "flight_rollups_hour"}
+# Columns returned by get_rollups; get_rollup_summary returns them without the bucket
+ROLLUP_COLUMNS = ["bucket", "origin_country", "snapshots", "flights", "average_flights", "squawk_flights",
+                  "min_ground_speed", "max_ground_speed", "average_ground_speed",
+                  "average_ground_speed_with_squawk", "average_ground_speed_without_squawk"]
+# Window read by the rollup queries when no start is given, ending at the latest bucket
+ROLLUP_DEFAULT_WINDOWS = {"minute": datetime.timedelta(hours=1), "hour": datetime.timedelta(days=1)}
+
+# Relations created by create_table; once they all exist (and nothing is left to migrate)
+# create_table only reads the catalog, so calling it takes no locks on flights
+SCHEMA_RELATIONS = ("flights", "flights_snapshot_country_idx", "flights_last_contact_brin",
+                    "flights_snapshot_icao24_idx", "flights_position_gist", "snapshots", "flight_states",
+                    *ROLLUP_TABLES.values(), "rollup_snapshots")
+
+def _schema_is_current(cur):
+    """
+    Whether create_table has nothing to create, drop or migrate, read from the catalog only.
+    Args:
+        cur: psycopg2 cursor.
+    Returns:
+        bool: True if flights is partitioned, every SCHEMA_RELATIONS exists and neither
+              the replaced snapshot_time index nor an unpartitioned flights table is left.
+    """
+    cur.execute("""
+        SELECT (SELECT relkind FROM pg_class WHERE oid = to_regclass('flights')) = 'p'
+            AND bool_and(to_regclass(name) IS NOT NULL)
+            AND to_regclass('flights_snapshot_time_idx') IS NULL
+            AND to_regclass('flights_unpartitioned') IS NULL
+        FROM unnest(%s::text[]) AS name;
+    """, (list(SCHEMA_RELATIONS),))
+    return bool(cur.fetchone()[0])
+
+@observe_query(rows=None)
 def create_table():
     """
-    Create table flights in the opensky_flights database.
+    Create the flights table, partitioned by day on snapshot_time, the snapshots
+    table recording every ingested snapshot, the flight_states table holding the
+    latest state of each aircraft and the rollup tables in the opensky_flights database.
+    A flights table left over from the previous unpartitioned schema is renamed to
+    flights_unpartitioned and its rows are moved into the partitioned table as one
+    snapshot, see _migrate_unpartitioned_flights. Once the schema is current the
+    DDL is skipped, as it would lock flights and its partitions.
     Args:
         None
     Returns:
         None
     """
     with db_cursor() as cur:
+        if _schema_is_current(cur):
+            return
+        cur.execute("""
+            SELECT relkind FROM pg_class WHERE oid = to_regclass('flights');
+        """)
+        relkind = cur.fetchone()
+        if relkind is not None and relkind[0] == "r":
+            # Its primary key and sequence are renamed with it, so the partitioned table gets their names
+            cur.execute("""
+                ALTER TABLE flights RENAME TO flights_unpartitioned;
+                ALTER INDEX IF EXISTS flights_pkey RENAME TO flights_unpartitioned_pkey;
+                ALTER SEQUENCE IF EXISTS flights_flight_id_seq RENAME TO flights_unpartitioned_flight_id_seq;
+            """)
         cur.execute("""
             CREATE TABLE IF NOT EXISTS flights (
-                flight_id SERIAL PRIMARY KEY,
+                flight_id BIGSERIAL,
                 icao24 VARCHAR(10) NOT NULL,
                 callsign VARCHAR(20),
                 origin_country VARCHAR(50),
@@ -27,109 +118,896 @@ def create_table():
                 vertical_rate DOUBLE PRECISION,
                 geo_altitude DOUBLE PRECISION,
                 squawk VARCHAR(10),
-                spi BOOLEAN
+                spi BOOLEAN,
+                snapshot_time TIMESTAMP NOT NULL,
+                PRIMARY KEY (flight_id, snapshot_time)
+            ) PARTITION BY RANGE (snapshot_time);
+        """)
+        # Covers the analytics queries, which read one snapshot grouped by country or
+        # squawk, with index-only scans; replaces the plain snapshot_time index
+        cur.execute("""
+            DROP INDEX IF EXISTS flights_snapshot_time_idx;
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS flights_snapshot_country_idx
+            ON flights (snapshot_time, origin_country) INCLUDE (ground_speed, squawk);
+        """)
+        # last_contact grows with snapshot_time, so a BRIN index serves time range scans
+        # for a fraction of the size of a B-tree
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS flights_last_contact_brin
+            ON flights USING BRIN (last_contact);
+        """)
+        # Keyset pagination of a snapshot by icao24, see get_flights
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS flights_snapshot_icao24_idx
+            ON flights (snapshot_time, icao24);
+        """)
+        # Positions as points for bounding box searches of the spatial queries
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS flights_position_gist
+            ON flights USING GIST (point(longitude, latitude));
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                snapshot_time TIMESTAMP PRIMARY KEY,
+                record_count INTEGER NOT NULL,
+                ingested_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'UTC')
+            );
+        """)
+        # Latest state of every aircraft for incremental ingest. Free space left in each
+        # page lets updates stay on the page (HOT) as only icao24 is indexed
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS flight_states (
+                icao24 VARCHAR(10) PRIMARY KEY,
+                callsign VARCHAR(20),
+                origin_country VARCHAR(50),
+                time_position TIMESTAMP,
+                last_contact TIMESTAMP,
+                longitude DOUBLE PRECISION NOT NULL,
+                latitude DOUBLE PRECISION NOT NULL,
+                baro_altitude DOUBLE PRECISION,
+                ground_speed DOUBLE PRECISION,
+                heading DOUBLE PRECISION,
+                vertical_rate DOUBLE PRECISION,
+                geo_altitude DOUBLE PRECISION,
+                squawk VARCHAR(10),
+                spi BOOLEAN,
+                snapshot_time TIMESTAMP NOT NULL,
+                active BOOLEAN NOT NULL DEFAULT TRUE
+            ) WITH (fillfactor = 70);
+        """)
+        # Sums and counts rather than averages, so a snapshot is added to a bucket
+        # without reading the snapshots already in it; see _update_rollups
+        for table in ROLLUP_TABLES.values():
+            cur.execute(sql.SQL("""
+                CREATE TABLE IF NOT EXISTS {} (
+                    bucket TIMESTAMP NOT NULL,
+                    origin_country VARCHAR(50) NOT NULL,
+                    snapshots INTEGER NOT NULL,
+                    flights BIGINT NOT NULL,
+                    squawk_flights BIGINT NOT NULL,
+                    ground_speed_count BIGINT NOT NULL,
+                    ground_speed_sum DOUBLE PRECISION NOT NULL,
+                    squawk_ground_speed_count BIGINT NOT NULL,
+                    squawk_ground_speed_sum DOUBLE PRECISION NOT NULL,
+                    min_ground_speed DOUBLE PRECISION,
+                    max_ground_speed DOUBLE PRECISION,
+                    PRIMARY KEY (bucket, origin_country)
+                );
+            """).format(sql.Identifier(table)))
+        # Every snapshot time added to the rollups and the table its rows were read from.
+        # Unlike snapshots it is not pruned by retention, so a snapshot replayed after its
+        # partition was dropped is never added to its buckets twice
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS rollup_snapshots (
+                snapshot_time TIMESTAMP PRIMARY KEY,
+                source VARCHAR(20) NOT NULL
             );
         """)
         cur.connection.commit()
+    _migrate_unpartitioned_flights()
 
+def _migrate_unpartitioned_flights():
+    """
+    Move the rows of a flights table of the previous unpartitioned schema, renamed to
+    flights_unpartitioned by create_table, into the partitioned flights table. They
+    are stored as one snapshot, timed by their latest last_contact, in a single
+    transaction that also records the snapshot, adds it to the rollups and drops the
+    old table. A migration that failed is resumed by the next create_table.
+    Returns:
+        datetime.datetime: The snapshot time of the migrated rows, or None if there
+            was nothing to migrate.
+    """
+    with db_cursor() as cur:
+        cur.execute("""
+            SELECT to_regclass('flights_unpartitioned');
+        """)
+        if cur.fetchone()[0] is None:
+            return None
+        cur.execute("""
+            SELECT MAX(last_contact) FROM flights_unpartitioned;
+        """)
+        snapshot_time = to_snapshot_time(cur.fetchone()[0])
+    create_partitions(snapshot_time)
+
+    columns = ", ".join(FLIGHT_COLUMNS)
+    with db_cursor() as cur:
+        replaced = _snapshot_rolled_up(cur, snapshot_time)
+        cur.execute(f"""
+            INSERT INTO flights ({columns}, snapshot_time)
+            SELECT {columns}, %s FROM flights_unpartitioned;
+        """, (snapshot_time,))
+        record_count = cur.rowcount
+        if record_count:
+            cur.execute("""
+                INSERT INTO snapshots (snapshot_time, record_count) VALUES (%s, %s)
+                ON CONFLICT (snapshot_time) DO UPDATE SET record_count = snapshots.record_count + EXCLUDED.record_count;
+            """, (snapshot_time, record_count))
+            if replaced:
+                _rebuild_rollups(cur, snapshot_time)
+            else:
+                _update_rollups(cur, snapshot_time, "flights", "snapshot_time = %s", (snapshot_time,))
+        cur.execute("""
+            DROP TABLE flights_unpartitioned;
+        """)
+        cur.connection.commit()
+    return snapshot_time
+
+@observe_query(rows=None)
 def drop_table():
     """
-    Drop table flights in the opensky_flights database.
+    Drop the flights table, its partitions, the snapshots table, the flight_states table
+    and the rollup tables, rollup_snapshots included, in the opensky_flights database.
     Args:
         None
     Returns:
         None
     """
+    with db_cursor() as cur:
+        cur.execute(f"""
+            DROP TABLE IF EXISTS flights, flights_unpartitioned, snapshots, flight_states, rollup_snapshots,
+                {", ".join(ROLLUP_TABLES.values())};
+        """)
+        cur.connection.commit()
+
+def to_snapshot_time(snapshot_time=None):
+    """
+    Normalise a snapshot time to a naive UTC datetime with second precision.
+    Args:
+        snapshot_time (str | datetime | None): UTC timestamp in SNAPSHOT_TIME_FORMAT
+            as returned by get_flight_data, a datetime, or None for the current time.
+    Returns:
+        datetime.datetime: The snapshot time.
+    """
+    if snapshot_time is None:
+        snapshot_time = datetime.datetime.now(datetime.timezone.utc)
+    elif isinstance(snapshot_time, str):
+        snapshot_time = datetime.datetime.strptime(snapshot_time, SNAPSHOT_TIME_FORMAT)
+    if snapshot_time.tzinfo is not None:
+        snapshot_time = snapshot_time.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return snapshot_time.replace(microsecond=0)
+
+def get_ingest_mode():
+    """
+    Ingest mode, read from the INGEST_MODE environment variable.
+    Returns:
+        str: One of INGEST_MODES, "full" by default.
+    Raises:
+        ValueError: If the mode is not one of INGEST_MODES.
+    """
+    mode = os.getenv("INGEST_MODE", "full")
+    if mode not in INGEST_MODES:
+        raise ValueError(f"Unknown ingest mode '{mode}', expected one of {INGEST_MODES}.")
+    return mode
+
+@observe_query(rows=None)
+def create_partitions(snapshot_time):
+    """
+    Create the daily flights partition holding snapshot_time and the one for the
+    following day, so ingest never has to create a partition at midnight.
+    Partitions are created in their own short transaction, and only when missing,
+    because attaching a partition locks the parent table.
+    Args:
+        snapshot_time (str | datetime): Snapshot time, see to_snapshot_time.
+    Returns:
+        list: Names of the partitions that were created.
+    """
+    day = to_snapshot_time(snapshot_time).replace(hour=0, minute=0, second=0)
+    created = []
+    with db_cursor() as cur:
+        for start in (day, day + datetime.timedelta(days=1)):
+            name = PARTITION_PREFIX + start.strftime(PARTITION_DATE_FORMAT)
+            cur.execute("SELECT to_regclass(%s);", (name,))
+            if cur.fetchone()[0] is not None:
+                continue
+            cur.execute(sql.SQL("""
+                CREATE TABLE IF NOT EXISTS {} PARTITION OF flights FOR VALUES FROM (%s) TO (%s);
+            """).format(sql.Identifier(name)), (start, start + datetime.timedelta(days=1)))
+            cur.connection.commit()
+            created.append(name)
+    return created
+
+@observe_query(rows=None)
+def drop_expired_partitions(retention_days=None):
+    """
+    Enforce retention by dropping whole daily partitions of the flights table.
+    Partitions ending more than retention_days before the latest snapshot are
+    dropped together with their rows in the snapshots table, and so are the
+    flight_states tombstones of aircraft that disappeared before then.
+    Minute rollups are kept for ROLLUP_MINUTE_RETENTION_DAYS (default 30) and
+    hour rollups, with the rollup_snapshots they were built from, for good, as they
+    outlive the raw snapshots they summarise.
+    Args:
+        retention_days (int): Days of history to keep. Defaults to the
+            FLIGHTS_RETENTION_DAYS environment variable, or 7.
+    Returns:
+        list: Names of the partitions that were dropped.
+    """
+    if retention_days is None:
+        retention_days = int(os.getenv("FLIGHTS_RETENTION_DAYS", "7"))
+    rollup_retention_days = int(os.getenv("ROLLUP_MINUTE_RETENTION_DAYS", "30"))
+    latest = get_latest_snapshot_time()
+    if latest is None:
+        return []
+    cutoff = latest.replace(hour=0, minute=0, second=0) - datetime.timedelta(days=retention_days)
+
     with db_cursor() as cur:
         cur.execute("""
-            DROP TABLE IF EXISTS flights;
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = 'flights'::regclass;
         """)
+        expired = []
+        for (name,) in cur.fetchall():
+            start = datetime.datetime.strptime(name[len(PARTITION_PREFIX):], PARTITION_DATE_FORMAT)
+            if start + datetime.timedelta(days=1) <= cutoff:
+                expired.append(name)
+        # Readers resolve the latest snapshot through the snapshots table,
+        # so its rows go in the same transaction as the partitions
+        cur.execute("""
+            DELETE FROM snapshots WHERE snapshot_time < %s;
+        """, (cutoff,))
+        cur.execute("""
+            DELETE FROM flight_states WHERE NOT active AND snapshot_time < %s;
+        """, (cutoff,))
+        cur.execute(sql.SQL("""
+            DELETE FROM {} WHERE bucket < %s;
+        """).format(sql.Identifier(ROLLUP_TABLES["minute"])),
+            (latest.replace(hour=0, minute=0, second=0) - datetime.timedelta(days=rollup_retention_days),))
+        for name in sorted(expired):
+            cur.execute(sql.SQL("DROP TABLE IF EXISTS {};").format(sql.Identifier(name)))
         cur.connection.commit()
+    return sorted(expired)
 
-def insert_data(df: pd.DataFrame):
+@observe_query(rows=lambda result, df, *args, **kwargs: len(df))
+def insert_data(df: "pd.DataFrame", snapshot_time=None, method: str = "copy", batch_size: int = 1000):
     """
-    Insert data into the flights table in the opensky_flights database.
+    Insert data into the flights table in the opensky_flights database as one snapshot.
+    The rows, the snapshots entry and the rollups are written in a single transaction,
+    so readers only ever see complete snapshots. Inserting a snapshot time again replaces it,
+    see _rebuild_rollups for its rollups.
     Note: velocity is renamed to ground_speed and true_track to heading
     to match the database schema.
     Args:
         df (pd.DataFrame): DataFrame containing flight data.
+        snapshot_time (str | datetime): Time of the OpenSky snapshot, see to_snapshot_time.
+            Defaults to the current time.
+        method (str): Ingestion path to use:
+            "copy" streams the frame through COPY FROM STDIN (fastest),
+            "values" sends batched multi-row INSERTs with execute_values,
+            "row" issues one INSERT per aircraft (legacy behaviour).
+        batch_size (int): Rows per INSERT statement for the "values" method.
     Returns:
+        datetime.datetime: The snapshot time the rows were stored under.
+    Raises:
+        ValueError: If the method is not one of INSERT_METHODS.
+    """
+    if method not in INSERT_METHODS:
+        raise ValueError(f"Unknown insert method '{method}', expected one of {INSERT_METHODS}.")
+    snapshot_time = to_snapshot_time(snapshot_time)
+    create_partitions(snapshot_time)
+
+    rows = df[DATAFRAME_COLUMNS].assign(snapshot_time=snapshot_time)
+    columns = ", ".join(FLIGHT_COLUMNS + ["snapshot_time"])
+    with db_cursor() as cur:
+        replaced = _snapshot_rolled_up(cur, snapshot_time)
+        cur.execute("""
+            DELETE FROM flights WHERE snapshot_time = %s;
+        """, (snapshot_time,))
+        if method == "copy":
+            _copy_rows(cur, rows, columns)
+        elif method == "values":
+            execute_values(cur, f"""
+                INSERT INTO flights ({columns}) VALUES %s;
+            """, _iter_rows(rows), page_size=batch_size)
+        else:
+            for row in _iter_rows(rows):
+                cur.execute(f"""
+                    INSERT INTO flights ({columns})
+                    VALUES ({", ".join(["%s"] * len(row))});
+                """, row)
+        cur.execute("""
+            INSERT INTO snapshots (snapshot_time, record_count) VALUES (%s, %s)
+            ON CONFLICT (snapshot_time) DO UPDATE
+            SET record_count = EXCLUDED.record_count, ingested_at = EXCLUDED.ingested_at;
+        """, (snapshot_time, len(rows)))
+        if replaced:
+            _rebuild_rollups(cur, snapshot_time)
+        else:
+            _update_rollups(cur, snapshot_time, "flights", "snapshot_time = %s", (snapshot_time,))
+        cur.connection.commit()
+    return snapshot_time
+
+@observe_query()
+def get_current_states():
+    """
+    Query returns the key columns of every aircraft currently in flight_states,
+    i.e. in the previous incremental snapshot.
+    Args:
         None
+    Returns:
+        pd.DataFrame: STATE_KEY_COLUMNS of the active aircraft.
+    """
+    with db_cursor() as cur:
+        cur.execute("""
+            SELECT icao24, time_position, last_contact FROM flight_states WHERE active;
+        """)
+        records = cur.fetchall()
+    import pandas as pd
+
+    return pd.DataFrame(records, columns=STATE_KEY_COLUMNS).astype(
+        {"icao24": object, "time_position": "datetime64[us]", "last_contact": "datetime64[us]"})
+
+@observe_query(rows=lambda result, *args, **kwargs: result["upserted"] + result["removed"])
+def apply_delta(changed: "pd.DataFrame", removed, snapshot_time=None, record_count=None):
+    """
+    Apply the difference between two snapshots to the flight_states table.
+    New and changed aircraft are upserted through a temporary table filled with COPY,
+    disappeared aircraft are kept as tombstones (active = FALSE) until retention
+    removes them, and the snapshot is recorded in the snapshots table and added to the
+    rollups, all in one transaction. Unchanged aircraft are not written at all. A
+    snapshot time applied again is not added to the rollups twice, and as flights
+    does not hold it the rollups keep its first version.
+    Args:
+        changed (pd.DataFrame): Cleaned flight data of the new and changed aircraft,
+            see transform.diff_snapshots.
+        removed (list): icao24 of the aircraft that disappeared.
+        snapshot_time (str | datetime): Time of the OpenSky snapshot, see to_snapshot_time.
+            Defaults to the current time.
+        record_count (int): Number of aircraft in the whole snapshot.
+            Defaults to the number of changed aircraft.
+    Returns:
+        dict: The snapshot time and the number of aircraft upserted and removed.
     """
+    snapshot_time = to_snapshot_time(snapshot_time)
+    rows = changed[DATAFRAME_COLUMNS].assign(snapshot_time=snapshot_time)
+    columns = FLIGHT_COLUMNS + ["snapshot_time"]
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in columns[1:])
     with db_cursor() as cur:
-        for _, row in df.iterrows():
+        replaced = _snapshot_rolled_up(cur, snapshot_time)
+        if len(rows):
             cur.execute("""
-                INSERT INTO flights 
-                (icao24, callsign, origin_country, time_position, last_contact, 
-                longitude, latitude, baro_altitude, ground_speed, heading, 
-                vertical_rate, geo_altitude, squawk, spi) 
-                VALUES 
-                (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
-            """,
-                (row['icao24'], row['callsign'], row['origin_country'], row['time_position'],
-                row['last_contact'], row['longitude'], row['latitude'], row['baro_altitude'],
-                row['velocity'], row['true_track'], row['vertical_rate'], row['geo_altitude'],
-                row['squawk'], row['spi'])
-            )
+                CREATE TEMP TABLE flight_states_delta
+                (LIKE flight_states INCLUDING DEFAULTS) ON COMMIT DROP;
+            """)
+            _copy_rows(cur, rows, ", ".join(columns), table="flight_states_delta")
+            cur.execute(f"""
+                INSERT INTO flight_states ({", ".join(columns)}, active)
+                SELECT {", ".join(columns)}, TRUE FROM flight_states_delta
+                ON CONFLICT (icao24) DO UPDATE SET {updates}, active = TRUE;
+            """)
+        removed_count = 0
+        if len(removed):
+            cur.execute("""
+                UPDATE flight_states SET active = FALSE, snapshot_time = %s
+                WHERE active AND icao24 = ANY(%s);
+            """, (snapshot_time, list(removed)))
+            removed_count = cur.rowcount
+        cur.execute("""
+            INSERT INTO snapshots (snapshot_time, record_count) VALUES (%s, %s)
+            ON CONFLICT (snapshot_time) DO UPDATE
+            SET record_count = EXCLUDED.record_count, ingested_at = EXCLUDED.ingested_at;
+        """, (snapshot_time, len(rows) if record_count is None else record_count))
+        if not replaced:
+            _update_rollups(cur, snapshot_time, "flight_states", "active", ())
         cur.connection.commit()
+    return {"snapshot_time": snapshot_time, "upserted": len(rows), "removed": removed_count}
 
-def get_flight_counts_by_origin_country():
+def _snapshot_rolled_up(cur, snapshot_time):
     """
-    Query returns the number of flights for each origin country.
+    Whether a snapshot time was already added to the rollups, even if retention has
+    dropped it from flights and snapshots since.
+    Args:
+        cur: psycopg2 cursor.
+        snapshot_time (datetime.datetime): Snapshot time.
+    Returns:
+        bool: True if the rollup_snapshots table holds the snapshot time.
+    """
+    cur.execute("""
+        SELECT 1 FROM rollup_snapshots WHERE snapshot_time = %s;
+    """, (snapshot_time,))
+    return cur.fetchone() is not None
+
+# Aggregates of one rollup row, computed from flights or flight_states rows
+ROLLUP_AGGREGATES_SQL = """
+    COUNT(*), COUNT(squawk),
+    COUNT(ground_speed), COALESCE(SUM(ground_speed), 0),
+    COUNT(ground_speed) FILTER (WHERE squawk IS NOT NULL),
+    COALESCE(SUM(ground_speed) FILTER (WHERE squawk IS NOT NULL), 0),
+    MIN(ground_speed), MAX(ground_speed)
+"""
+ROLLUP_VALUE_COLUMNS = ["snapshots", "flights", "squawk_flights", "ground_speed_count", "ground_speed_sum",
+                        "squawk_ground_speed_count", "squawk_ground_speed_sum",
+                        "min_ground_speed", "max_ground_speed"]
+
+def _update_rollups(cur, snapshot_time, table, condition, params):
+    """
+    Add one snapshot to the minute and hour rollups of its time: each bucket is
+    upserted with the snapshot's aggregates per origin country, summing counts and
+    sums and keeping the extreme ground speeds, so the cost depends on the size of
+    the snapshot and not on the history already rolled up. The snapshot is recorded
+    in rollup_snapshots with table as its source.
     Args:
+        cur: psycopg2 cursor, in the transaction writing the snapshot.
+        snapshot_time (datetime.datetime): Snapshot time.
+        table (str): Table holding the snapshot, flights or flight_states.
+        condition (str): SQL condition selecting the snapshot in the table.
+        params (tuple): Parameters of the condition.
+    Returns:
         None
+    """
+    updates = ", ".join([f"{column} = rollup.{column} + EXCLUDED.{column}" for column in ROLLUP_VALUE_COLUMNS[:-2]]
+                        + ["min_ground_speed = LEAST(rollup.min_ground_speed, EXCLUDED.min_ground_speed)",
+                           "max_ground_speed = GREATEST(rollup.max_ground_speed, EXCLUDED.max_ground_speed)"])
+    for unit, rollup_table in ROLLUP_TABLES.items():
+        cur.execute(f"""
+            INSERT INTO {rollup_table} AS rollup (bucket, origin_country, {", ".join(ROLLUP_VALUE_COLUMNS)})
+            SELECT date_trunc('{unit}', %s::timestamp), COALESCE(origin_country, ''), 1, {ROLLUP_AGGREGATES_SQL}
+            FROM {table}
+            WHERE {condition}
+            GROUP BY COALESCE(origin_country, '')
+            ON CONFLICT (bucket, origin_country) DO UPDATE SET {updates};
+        """, (snapshot_time,) + params)
+    cur.execute("""
+        INSERT INTO rollup_snapshots (snapshot_time, source) VALUES (%s, %s);
+    """, (snapshot_time, table))
+
+def _rebuild_rollups(cur, snapshot_time):
+    """
+    Recompute the minute and hour rollups of a replaced snapshot from flights, as its
+    previous version cannot be subtracted from its buckets. A bucket is only rebuilt
+    if flights still holds every snapshot rolled up into it; one also summarising
+    snapshots that retention dropped or that were ingested incrementally keeps the
+    first version of the replaced snapshot rather than losing the others.
+    Args:
+        cur: psycopg2 cursor, in the transaction writing the snapshot.
+        snapshot_time (datetime.datetime): Snapshot time.
     Returns:
-        list: List of tuples containing origin country and number of flights.
+        None
     """
-    with db_cursor() as cur:
+    columns = ", ".join(ROLLUP_VALUE_COLUMNS)
+    buckets = {"minute": (snapshot_time.replace(second=0), datetime.timedelta(minutes=1)),
+               "hour": (snapshot_time.replace(minute=0, second=0), datetime.timedelta(hours=1))}
+    for unit, rollup_table in ROLLUP_TABLES.items():
+        start, width = buckets[unit]
         cur.execute("""
-            SELECT origin_country, COUNT(origin_country) AS number_of_flights 
+            SELECT EXISTS (
+                SELECT 1 FROM rollup_snapshots
+                WHERE snapshot_time >= %s AND snapshot_time < %s
+                AND (source <> 'flights' OR snapshot_time NOT IN (SELECT snapshot_time FROM snapshots))
+            );
+        """, (start, start + width))
+        if cur.fetchone()[0]:
+            continue
+        cur.execute(f"""
+            DELETE FROM {rollup_table} WHERE bucket = %s;
+        """, (start,))
+        cur.execute(f"""
+            INSERT INTO {rollup_table} (bucket, origin_country, {columns})
+            SELECT %s, COALESCE(origin_country, ''), COUNT(DISTINCT snapshot_time), {ROLLUP_AGGREGATES_SQL}
             FROM flights
-            GROUP BY origin_country
-            ORDER BY number_of_flights DESC;
+            WHERE snapshot_time >= %s AND snapshot_time < %s
+            GROUP BY COALESCE(origin_country, '');
+        """, (start, start, start + width))
+
+def _iter_rows(df: "pd.DataFrame"):
+    """
+    Yield the DataFrame as tuples of plain Python values in column order,
+    with missing values (NaN/NaT/None/NA) converted to None so psycopg2 sends NULL.
+    float32 columns of the compact schema are widened first, see transform.to_float64.
+    Args:
+        df (pd.DataFrame): DataFrame containing flight data.
+    Returns:
+        generator: Tuples ready to be passed as query parameters.
+    """
+    from src.transform import to_float64
+
+    rows = to_float64(df).astype(object)
+    rows = rows.where(rows.notna(), None)
+    return rows.itertuples(index=False, name=None)
+
+class _CsvChunks(io.RawIOBase):
+    """
+    Readable file of a DataFrame as headerless CSV, formatted COPY_CHUNK_ROWS rows at
+    a time as COPY reads it, so only one chunk of text is held rather than the
+    whole snapshot (a StringIO stores 4 bytes per character).
+    Args:
+        df (pd.DataFrame): DataFrame to format.
+        chunk_rows (int): Rows formatted at a time.
+    """
+    def __init__(self, df, chunk_rows=COPY_CHUNK_ROWS):
+        self._chunks = (df.iloc[start:start + chunk_rows].to_csv(index=False, header=False).encode()
+                        for start in range(0, len(df), chunk_rows))
+        self._pending = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+def _copy_rows(cur, df: "pd.DataFrame", columns: str, table: str = "flights"):
+    """
+    Stream the DataFrame into a table with COPY FROM STDIN, formatted in chunks, see _CsvChunks.
+    Missing values are written as empty unquoted CSV fields, which COPY reads as NULL.
+    Args:
+        cur: psycopg2 cursor.
+        df (pd.DataFrame): DataFrame containing flight data.
+        columns (str): Comma-separated table columns matching the DataFrame columns.
+        table (str): Table to copy into.
+    Returns:
+        None
+    """
+    cur.copy_expert(f"""
+        COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv);
+    """, _CsvChunks(df))
+
+@observe_query(rows=None)
+def get_latest_snapshot_time():
+    """
+    Query returns the time of the most recently ingested snapshot.
+    Args:
+        None
+    Returns:
+        datetime.datetime: The latest snapshot time, or None if nothing has been ingested.
+    """
+    with db_cursor() as cur:
+        cur.execute("""
+            SELECT MAX(snapshot_time) FROM snapshots;
         """)
+        return cur.fetchone()[0]
+
+@observe_query(rows=None)
+def get_snapshot_version():
+    """
+    Query returns a version string of the data served by the analytics queries,
+    which changes whenever a snapshot is ingested, re-ingested or expired.
+    Args:
+        None
+    Returns:
+        str: The snapshot version, "empty" if nothing has been ingested.
+    """
+    with db_cursor() as cur:
+        cur.execute("""
+            SELECT MAX(snapshot_time), MAX(ingested_at), COUNT(*) FROM snapshots;
+        """)
+        latest, ingested_at, count = cur.fetchone()
+    if latest is None:
+        return "empty"
+    return f"{latest.isoformat()}/{ingested_at.isoformat()}/{count}"
+
+def _snapshot_filter(snapshot_time):
+    """
+    Table and SQL condition selecting one snapshot. In incremental ingest mode the
+    latest snapshot is read from the active rows of flight_states, as flights only
+    holds the snapshots ingested in full mode.
+    Args:
+        snapshot_time (str | datetime | None): Snapshot to select, or None for the latest one.
+    Returns:
+        tuple: The table, the SQL condition and its query parameters.
+    """
+    if snapshot_time is None and get_ingest_mode() == "incremental":
+        return "flight_states", "active", ()
+    if snapshot_time is None:
+        return "flights", "snapshot_time = (SELECT MAX(snapshot_time) FROM snapshots)", ()
+    return "flights", "snapshot_time = %s", (to_snapshot_time(snapshot_time),)
+
+# Analytics queries, formatted with the table and condition returned by _snapshot_filter.
+# Countries are ordered by code point (COLLATE "C") whatever the database collation, so the
+# results match those of the in-memory analytics engine, see analytics.SnapshotAggregates
+FLIGHT_COUNTS_SQL = """
+    SELECT origin_country, COUNT(origin_country) AS number_of_flights
+    FROM {table}
+    WHERE {condition}
+    GROUP BY origin_country
+    ORDER BY number_of_flights DESC, origin_country COLLATE "C";
+"""
+GROUND_SPEED_RANGE_SQL = """
+    SELECT origin_country,
+        MAX(ground_speed) AS max_ground_speed,
+        MIN(ground_speed) AS min_ground_speed
+    FROM {table}
+    WHERE {condition}
+    GROUP BY origin_country
+    ORDER BY origin_country COLLATE "C";
+"""
+SQUAWK_GROUND_SPEED_SQL = """
+    SELECT CASE WHEN squawk IS NOT NULL THEN 'Squawk Present' ELSE 'Squawk Missing' END AS squawk,
+        ROUND(AVG(ground_speed)::NUMERIC, 2) AS average_ground_speed
+    FROM {table}
+    WHERE {condition}
+    GROUP BY squawk IS NOT NULL
+    ORDER BY squawk IS NOT NULL DESC;
+"""
+
+def _keyset_clauses(after, limit):
+    """
+    SQL clauses and parameters of a page of a query ordered by icao24.
+    Args:
+        after (str): icao24 of the last aircraft of the previous page, or None for the first page.
+        limit (int): Page size, or None for all remaining rows.
+    Returns:
+        tuple: The condition to add to the WHERE clause, its parameters, the LIMIT clause
+               and its parameters.
+    """
+    after_condition = "" if after is None else "AND icao24 > %s"
+    after_params = () if after is None else (after,)
+    limit_clause = "" if limit is None else "LIMIT %s"
+    limit_params = () if limit is None else (limit,)
+    return after_condition, after_params, limit_clause, limit_params
+
+@observe_query()
+def get_aircraft_in_boxes(boxes, snapshot_time=None, limit=None, after=None):
+    """
+    Query returns the aircraft positioned inside any of the bounding boxes, ordered by icao24.
+    Args:
+        boxes (list): (min_lon, min_lat, max_lon, max_lat) tuples in degrees, boundaries included.
+        snapshot_time (str | datetime): Snapshot to query. Defaults to the latest snapshot.
+        limit (int): Maximum number of aircraft returned. Defaults to all.
+        after (str): Only return aircraft with a greater icao24, to fetch the next page.
+    Returns:
+        list: List of tuples of SPATIAL_COLUMNS.
+    """
+    table, condition, params = _snapshot_filter(snapshot_time)
+    box_condition = " OR ".join(
+        ["point(longitude, latitude) <@ box(point(%s, %s), point(%s, %s))"] * len(boxes))
+    box_params = tuple(value for box in boxes for value in box)
+    after_condition, after_params, limit_clause, limit_params = _keyset_clauses(after, limit)
+    with db_cursor() as cur:
+        cur.execute(f"""
+            SELECT {", ".join(SPATIAL_COLUMNS)}
+            FROM {table}
+            WHERE {condition} AND ({box_condition}) {after_condition}
+            ORDER BY icao24
+            {limit_clause};
+        """, params + box_params + after_params + limit_params)
         records = cur.fetchall()
         return records
 
-def get_fastest_and_slowest_ground_speed_by_origin_country():
+def resolve_snapshot_time(snapshot_time=None):
+    """
+    Snapshot to page through. In full ingest mode the latest snapshot is resolved
+    up front, so every page comes from the same snapshot while new ones are ingested;
+    in incremental mode the latest snapshot is the live flight_states table.
+    Args:
+        snapshot_time (str | datetime | None): Requested snapshot, or None for the latest one.
+    Returns:
+        str | datetime | None: The snapshot time to pass to get_flights.
+    """
+    if snapshot_time is None and get_ingest_mode() == "full":
+        return get_latest_snapshot_time()
+    return snapshot_time
+
+@observe_query()
+def get_flights(snapshot_time=None, after=None, limit=1000):
+    """
+    Query returns one page of the flights of a snapshot, ordered by icao24. The next
+    page starts after the icao24 of the last flight (keyset pagination), so every page
+    is an index range scan however deep it is.
+    Args:
+        snapshot_time (str | datetime): Snapshot to query. Defaults to the latest snapshot.
+        after (str): icao24 of the last flight of the previous page, or None for the first page.
+        limit (int): Maximum number of flights returned, None for all.
+    Returns:
+        list: List of tuples of FLIGHT_COLUMNS.
+    """
+    table, condition, params = _snapshot_filter(snapshot_time)
+    after_condition, after_params, limit_clause, limit_params = _keyset_clauses(after, limit)
+    with db_cursor() as cur:
+        cur.execute(f"""
+            SELECT {", ".join(FLIGHT_COLUMNS)}
+            FROM {table}
+            WHERE {condition} {after_condition}
+            ORDER BY icao24
+            {limit_clause};
+        """, params + after_params + limit_params)
+        return cur.fetchall()
+
+def iter_flights(snapshot_time=None, batch_size=5000):
+    """
+    Iterate over every flight of a snapshot in pages of get_flights, so an export
+    neither holds the whole snapshot in memory nor a connection between pages.
+    Args:
+        snapshot_time (str | datetime): Snapshot to read. Defaults to the latest snapshot,
+            see resolve_snapshot_time.
+        batch_size (int): Flights read per query.
+    Returns:
+        generator: Tuples of FLIGHT_COLUMNS ordered by icao24.
+    """
+    snapshot_time = resolve_snapshot_time(snapshot_time)
+    after = None
+    while True:
+        page = get_flights(snapshot_time, after, batch_size)
+        yield from page
+        if len(page) < batch_size:
+            return
+        after = page[-1][0]
+
+@observe_query()
+def get_flight_counts_by_origin_country(snapshot_time=None):
+    """
+    Query returns the number of flights for each origin country.
+    Args:
+        snapshot_time (str | datetime): Snapshot to query. Defaults to the latest snapshot.
+    Returns:
+        list: List of tuples containing origin country and number of flights.
+    """
+    table, condition, params = _snapshot_filter(snapshot_time)
+    with db_cursor() as cur:
+        cur.execute(FLIGHT_COUNTS_SQL.format(table=table, condition=condition), params)
+        records = cur.fetchall()
+        return records
+
+@observe_query()
+def get_fastest_and_slowest_ground_speed_by_origin_country(snapshot_time=None):
     """
     Query returns the fastest and slowest ground speed for each origin country.
     Args:
-        None
+        snapshot_time (str | datetime): Snapshot to query. Defaults to the latest snapshot.
     Returns:
         list: List of tuples containing origin country, max ground speed, and min ground speed.
     """
+    table, condition, params = _snapshot_filter(snapshot_time)
     with db_cursor() as cur:
-        cur.execute("""
-            SELECT DISTINCT origin_country, 
-                MAX(ground_speed) OVER (PARTITION BY origin_country) AS max_ground_speed,
-                MIN(ground_speed) OVER (PARTITION BY origin_country) AS min_ground_speed
-            FROM flights
-            ORDER BY origin_country;
-        """)
+        cur.execute(GROUND_SPEED_RANGE_SQL.format(table=table, condition=condition), params)
         records = cur.fetchall()
         return records
     
-def get_average_ground_speed_of_flights_with_and_without_squawk():
+@observe_query()
+def get_average_ground_speed_of_flights_with_and_without_squawk(snapshot_time=None):
     """
     Query returns the average ground speed of flights with and without squawk.
     Args:
-        None
+        snapshot_time (str | datetime): Snapshot to query. Defaults to the latest snapshot.
     Returns:
         list: List of tuples containing squawk status and average ground speed.
-    Note: The squawk status is represented as 'Squawk Present' or 'Squawk Missing'
+    Note: The squawk status is represented as 'Squawk Present' or 'Squawk Missing',
+    'Squawk Present' first
     """
+    table, condition, params = _snapshot_filter(snapshot_time)
     with db_cursor() as cur:
-        cur.execute("""
-            SELECT 'Squawk Present' AS squawk, ROUND(AVG(ground_speed)::NUMERIC, 2) AS average_ground_speed
-            FROM flights
-            GROUP BY squawk IS NOT NULL
-            HAVING squawk IS NOT NULL
-            UNION
-            SELECT 'Squawk Missing' AS squawk, ROUND(AVG(ground_speed)::NUMERIC, 2) AS average_ground_speed
-            FROM flights
-            GROUP BY squawk
-            HAVING squawk IS NULL;
-        """)
+        cur.execute(SQUAWK_GROUND_SPEED_SQL.format(table=table, condition=condition), params)
         records = cur.fetchall()
-        return records
\ No newline at end of file
+        return records
+
+def _rollup_range(granularity, start, end, origin_country):
+    """
+    Rollup table and SQL condition selecting the buckets of a time range.
+    Args:
+        granularity (str): One of ROLLUP_TABLES.
+        start (str | datetime): First bucket included, see to_snapshot_time. Defaults to
+            ROLLUP_DEFAULT_WINDOWS before end.
+        end (str | datetime): Buckets from end on are excluded. Defaults to after the latest bucket.
+        origin_country (str): Only select this country, or None for all.
+    Returns:
+        tuple: The table, the SQL condition and its query parameters.
+    Raises:
+        ValueError: If the granularity is unknown or start is after end.
+    """
+    if granularity not in ROLLUP_TABLES:
+        raise ValueError(f"Unknown rollup granularity '{granularity}', expected one of {tuple(ROLLUP_TABLES)}.")
+    table = ROLLUP_TABLES[granularity]
+    start = start and to_snapshot_time(start)
+    end = end and to_snapshot_time(end)
+    if start and end and start > end:
+        raise ValueError(f"Rollup range starts at {start} after it ends at {end}.")
+    conditions, params = [], []
+    if start:
+        conditions.append("bucket >= %s")
+        params.append(start)
+    elif end:
+        conditions.append("bucket >= %s")
+        params.append(end - ROLLUP_DEFAULT_WINDOWS[granularity])
+    else:
+        conditions.append(f"bucket > (SELECT MAX(bucket) FROM {table}) - %s")
+        params.append(ROLLUP_DEFAULT_WINDOWS[granularity])
+    if end:
+        conditions.append("bucket < %s")
+        params.append(end)
+    if origin_country is not None:
+        conditions.append("origin_country = %s")
+        params.append(origin_country)
+    return table, " AND ".join(conditions), tuple(params)
+
+def _rollup_select(summed):
+    """
+    Select list of ROLLUP_COLUMNS after the bucket and country, from the rows of a
+    rollup table or, when summed, from their sums over a range.
+    """
+    total = (lambda column: f"SUM({column})") if summed else (lambda column: column)
+    count = (lambda column: f"SUM({column})::BIGINT") if summed else (lambda column: column)
+    lowest, highest = ("MIN(min_ground_speed)", "MAX(max_ground_speed)") if summed \
+        else ("min_ground_speed", "max_ground_speed")
+    return f"""
+        {count("snapshots")}, {count("flights")},
+        ROUND({total("flights")}::NUMERIC / {total("snapshots")}, 2),
+        {count("squawk_flights")}, {lowest}, {highest},
+        ROUND(({total("ground_speed_sum")} / NULLIF({total("ground_speed_count")}, 0))::NUMERIC, 2),
+        ROUND(({total("squawk_ground_speed_sum")}
+            / NULLIF({total("squawk_ground_speed_count")}, 0))::NUMERIC, 2),
+        ROUND((({total("ground_speed_sum")} - {total("squawk_ground_speed_sum")})
+            / NULLIF({total("ground_speed_count")} - {total("squawk_ground_speed_count")}, 0))::NUMERIC, 2)
+    """
+
+@observe_query()
+def get_rollups(granularity="hour", start=None, end=None, origin_country=None):
+    """
+    Query returns the rollups of each origin country per minute or hour over a time
+    range, read from the rollup tables instead of the raw snapshots. flights counts
+    aircraft over every snapshot of the bucket where the country had any, and
+    average_flights is that count per snapshot.
+    Args:
+        granularity (str): "minute" or "hour".
+        start (str | datetime): First bucket included, see to_snapshot_time. Defaults to
+            the last hour of minute buckets or the last day of hour buckets.
+        end (str | datetime): Buckets from end on are excluded. Defaults to none.
+        origin_country (str): Only return this country. Defaults to every country.
+    Returns:
+        list: List of tuples of ROLLUP_COLUMNS, ordered by bucket and origin country.
+    Raises:
+        ValueError: If the granularity is unknown or start is after end.
+    """
+    table, condition, params = _rollup_range(granularity, start, end, origin_country)
+    with db_cursor() as cur:
+        cur.execute(f"""
+            SELECT bucket, origin_country, {_rollup_select(summed=False)}
+            FROM {table}
+            WHERE {condition}
+            ORDER BY bucket, origin_country;
+        """, params)
+        return cur.fetchall()
+
+@observe_query()
+def get_rollup_summary(granularity="hour", start=None, end=None):
+    """
+    Query returns the rollups of each origin country summed over a time range, e.g.
+    flights per country over the last month from the hour buckets.
+    Args:
+        granularity (str): Rollups to sum, "minute" or "hour".
+        start (str | datetime): First bucket included, see get_rollups.
+        end (str | datetime): Buckets from end on are excluded, see get_rollups.
+    Returns:
+        list: List of tuples of ROLLUP_COLUMNS without the bucket, ordered by flights descending.
+    Raises:
+        ValueError: If the granularity is unknown or start is after end.
+    """
+    table, condition, params = _rollup_range(granularity, start, end, None)
+    with db_cursor() as cur:
+        cur.execute(f"""
+            SELECT origin_country, {_rollup_select(summed=True)}
+            FROM {table}
+            WHERE {condition}
+            GROUP BY origin_country
+            ORDER BY SUM(flights) DESC, origin_country;
+        """, params)
+        return cur.fetchall()
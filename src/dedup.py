@@ -0,0 +1,118 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from src.db_manager import to_snapshot_time
+
+# Columns identifying a state: OpenSky repeats both while an aircraft's position is not updated
+DEDUP_KEY_COLUMNS = ["icao24", "time_position"]
+# Dropped rows serialised to estimate the bytes saved; formatting every row costs more than deduplicating
+BYTES_SAMPLE_ROWS = 500
+
+class StateDeduplicator:
+    """
+    Drops the aircraft states already seen in a recent poll. Each state is keyed by a
+    64-bit hash of (icao24, time_position), and the keys seen within ttl_seconds are
+    kept in a sorted uint64 array with a parallel array of the time they were last
+    seen, i.e. 16 bytes per key, looked up with a binary search per snapshot. A state
+    seen again is dropped and its key kept alive; keys not seen for ttl_seconds expire.
+    States without a time_position are never dropped.
+    Args:
+        ttl_seconds (int): Seconds a key is remembered after it was last seen.
+    """
+    def __init__(self, ttl_seconds=900):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._keys = np.empty(0, dtype=np.uint64)
+        self._seen = np.empty(0, dtype=np.int64)
+        self._totals = {"runs": 0, "rows_in": 0, "rows_dropped": 0, "bytes_saved": 0}
+
+    def filter(self, df, snapshot_time=None):
+        """
+        Drop the states of a snapshot seen within the TTL and remember the others.
+        Args:
+            df (pd.DataFrame): Cleaned flight data of the snapshot, as returned by clean_data.
+            snapshot_time (str | datetime): Time of the snapshot, see db_manager.to_snapshot_time.
+                Defaults to the latest time_position of the snapshot.
+        Returns:
+            tuple: The DataFrame without the repeated states, and a dict with the rows in,
+                   the rows dropped, the bytes saved (the dropped rows as CSV, estimated from
+                   up to BYTES_SAMPLE_ROWS of them) and the keys held.
+        """
+        has_time = df["time_position"].notna().to_numpy()
+        keys = pd.util.hash_pandas_object(df.loc[has_time, DEDUP_KEY_COLUMNS], index=False).to_numpy()
+        if snapshot_time is None:
+            times = df["time_position"].dropna()
+            now = int(times.max().timestamp()) if len(times) else 0
+        else:
+            now = int(pd.Timestamp(to_snapshot_time(snapshot_time)).timestamp())
+
+        with self._lock:
+            live = self._seen >= now - self.ttl_seconds
+            if not live.all():
+                self._keys, self._seen = self._keys[live], self._seen[live]
+            positions = np.searchsorted(self._keys, keys)
+            found = positions < len(self._keys)
+            found[found] = self._keys[positions[found]] == keys[found]
+            self._seen[positions[found]] = now
+            new_keys = np.unique(keys[~found])
+            at = np.searchsorted(self._keys, new_keys)
+            self._keys = np.insert(self._keys, at, new_keys)
+            self._seen = np.insert(self._seen, at, now)
+            held = len(self._keys)
+
+        duplicate = np.zeros(len(df), dtype=bool)
+        duplicate[has_time] = found
+        dropped = df[duplicate]
+        bytes_saved = 0
+        if len(dropped):
+            sample = dropped.iloc[::max(1, len(dropped) // BYTES_SAMPLE_ROWS)]
+            sample_bytes = len(sample.to_csv(index=False, header=False).encode())
+            bytes_saved = round(sample_bytes * len(dropped) / len(sample))
+        with self._lock:
+            self._totals["runs"] += 1
+            self._totals["rows_in"] += len(df)
+            self._totals["rows_dropped"] += len(dropped)
+            self._totals["bytes_saved"] += bytes_saved
+        return df[~duplicate], {"rows_in": len(df), "rows_dropped": len(dropped),
+                                "bytes_saved": bytes_saved, "keys": held}
+
+    def clear(self):
+        """
+        Forget every key.
+        Returns:
+            None
+        """
+        with self._lock:
+            self._keys = np.empty(0, dtype=np.uint64)
+            self._seen = np.empty(0, dtype=np.int64)
+
+    def stats(self):
+        """
+        Deduplication statistics for monitoring.
+        Returns:
+            dict: Keys held, bytes of the key arrays, and the runs, rows in, rows dropped
+                  and bytes saved since the deduplicator was created.
+        """
+        with self._lock:
+            return {"keys": len(self._keys), "array_bytes": self._keys.nbytes + self._seen.nbytes,
+                    "ttl_seconds": self.ttl_seconds, **self._totals}
+
+_deduplicator = None
+_deduplicator_lock = threading.Lock()
+
+def get_deduplicator():
+    """
+    Return the process-wide deduplicator, creating it on first use, if deduplication
+    is turned on by setting DEDUP_TTL_SECONDS to the seconds a state is remembered.
+    Returns:
+        StateDeduplicator: The shared deduplicator, or None if DEDUP_TTL_SECONDS is unset or 0.
+    """
+    global _deduplicator
+    ttl_seconds = int(os.getenv("DEDUP_TTL_SECONDS", "0"))
+    if ttl_seconds <= 0:
+        return None
+    with _deduplicator_lock:
+        if _deduplicator is None or _deduplicator.ttl_seconds != ttl_seconds:
+            _deduplicator = StateDeduplicator(ttl_seconds)
+        return _deduplicator
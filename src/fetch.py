@@ -1,66 +1,258 @@
-import requests
 import json
 import csv
-import boto3
+import codecs
 import os
 import datetime
+from src.upload import upload_artifacts
+from src.metrics import observe_stage, record_file_written
+from src.opensky_client import get_opensky_client, get_states_filters
 
-def get_flight_data():
+# Columns from OpenSky documentation: https://openskynetwork.github.io/opensky-api/rest.html
+RAW_COLUMNS = ["icao24", "callsign", "origin_country", "time_position",
+               "last_contact", "longitude", "latitude", "baro_altitude",
+               "on_ground", "velocity", "true_track", "vertical_rate",
+               "sensors", "geo_altitude", "squawk", "spi", "position_source"]
+
+# Bytes read from the response per iteration and state rows per batch in streaming mode
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_BATCH_SIZE = 2000
+
+file_path_json = os.path.join("data", "raw_flight_data.json")
+file_path_csv = os.path.join("data", "raw_flight_data.csv")
+
+def get_flight_data(upload=True, **filters):
     """
-    Fetches flight data from the OpenSky Network API. The data is saved in both JSON 
-    and CSV formats in the 'data' directory. The JSON and CSV files are then uploaded 
-    to an S3 bucket. A timestamp is used to create a unique folder structure in the 
+    Fetches flight data from the OpenSky Network API. The data is saved in both JSON
+    and CSV formats in the 'data' directory. The JSON and CSV files are then uploaded
+    to an S3 bucket. A timestamp is used to create a unique folder structure in the
     S3 bucket.
     Args:
-        None
+        upload (bool): Upload the files before returning. Without, the caller uploads
+            them with upload_raw_files, e.g. while the data is loaded.
+        **filters: bbox, icao24 and time filters of OpenSkyClient.get_states. The bbox
+            and icao24 filters default to OPENSKY_BBOX and OPENSKY_ICAO24.
     Returns:
-        tuple: A tuple containing the raw flight data as a dictionary and the UTC 
+        tuple: A tuple containing the raw flight data as a dictionary and the UTC
                timestamp of the data retrieval as a string.
     """
     # Fetch flight data from OpenSky Network API
-    url = "https://opensky-network.org/api/states/all"
-    response = requests.get(url)
-    response.raise_for_status()
-    raw_data = response.json()
+    with observe_stage("fetch_download"):
+        response = get_opensky_client().get_states(**{**get_states_filters(), **filters})
+        raw_data = response.json()
 
     os.makedirs("data", exist_ok=True)  # This creates /app/data inside the container
-    
-    # Save the raw data to JSON and CSV files
-    file_path_json = os.path.join("data", "raw_flight_data.json")
-    with open(file_path_json, 'w', encoding='utf-8') as json_file:
-        json.dump(raw_data, json_file, indent=4)
-    
-    file_path_csv = os.path.join("data", "raw_flight_data.csv")
-    with open(file_path_csv, 'w', encoding='utf-8', newline='') as csv_file:
-        writer = csv.writer(csv_file)
-        # Write header
-        writer.writerow([
-            "icao24", "callsign", "origin_country", "time_position", 
-            "last_contact", "longitude", "latitude", "baro_altitude", 
-            "on_ground", "velocity", "true_track", "vertical_rate", 
-            "sensors", "geo_altitude", "squawk", "spi", "position_source"
-    ])
-        # Write data rows
-        for flight in raw_data.get('states', []):
-            writer.writerow(flight[:17])  # ensures exactly 17 columns are written
-
-    # Upload the files to S3
-    s3  = boto3.client("s3")
-    bucket_name = os.getenv("S3_DATA_BUCKET", "opensky-dev-data")
-    
-    timestamp = raw_data["time"]
-    # Convert the timestamp to ISO format
-    utc_timestamp = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime('%Y-%m-%d_%H-%M-%S')
-    s3.upload_file(
-        Filename = file_path_json,
-        Bucket = bucket_name,
-        # Use the UTC timestamp to create a unique folder structure
-        Key = f"data/{utc_timestamp}/raw_flight_data.json"
-    )
-    s3.upload_file(
-        Filename = file_path_csv,
-        Bucket = bucket_name,
-        Key = f"data/{utc_timestamp}/raw_flight_data.csv"
-    )
-
-    return (raw_data, utc_timestamp)
\ No newline at end of file
+
+    # Save the response body as received, then the states as CSV
+    with observe_stage("fetch_write"):
+        with open(file_path_json, 'wb') as json_file:
+            json_file.write(response.content)
+
+        with open(file_path_csv, 'w', encoding='utf-8', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(RAW_COLUMNS)
+            writer.writerows(flight[:17] for flight in raw_data.get('states') or [])  # ensures exactly 17 columns are written
+
+    utc_timestamp = to_utc_timestamp(raw_data["time"])
+    if upload:
+        upload_raw_files(utc_timestamp)
+
+    return (raw_data, utc_timestamp)
+
+def stream_flight_data(batch_size=STREAM_BATCH_SIZE, upload=True, **filters):
+    """
+    Fetches flight data from the OpenSky Network API without holding the whole
+    response in memory. See FlightDataStream.
+    Args:
+        batch_size (int): Number of state rows per batch.
+        upload (bool): Upload the raw files once the response is exhausted, see get_flight_data.
+        **filters: Filters of OpenSkyClient.get_states, see get_flight_data.
+    Returns:
+        FlightDataStream: Iterable over batches of raw state rows.
+    """
+    response = get_opensky_client().get_states(**{**get_states_filters(), **filters}, stream=True)
+    return FlightDataStream(response, batch_size, upload)
+
+def to_utc_timestamp(timestamp):
+    """
+    Convert an OpenSky Unix timestamp to the UTC string used in file and S3 key names.
+    Args:
+        timestamp (int): Seconds since the epoch.
+    Returns:
+        str: UTC timestamp formatted as %Y-%m-%d_%H-%M-%S.
+    """
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime('%Y-%m-%d_%H-%M-%S')
+
+def upload_raw_files(utc_timestamp):
+    """
+    Upload the raw JSON and CSV files concurrently to the S3 bucket under data/{utc_timestamp}/,
+    counting their sizes in the bytes written metric.
+    Args:
+        utc_timestamp (str): UTC timestamp of the data retrieval.
+    Returns:
+        list: Upload report per file, see upload.upload_file.
+    """
+    record_file_written(file_path_json)
+    record_file_written(file_path_csv)
+    # Use the UTC timestamp to create a unique folder structure
+    with observe_stage("fetch_upload"):
+        return upload_artifacts([
+            (file_path_json, f"data/{utc_timestamp}/raw_flight_data.json"),
+            (file_path_csv, f"data/{utc_timestamp}/raw_flight_data.csv"),
+        ])
+
+class FlightDataStream:
+    """
+    Iterates over an OpenSky states response in batches of raw state rows.
+    While iterating, the response bytes are written unchanged to the raw JSON file
+    and the rows to the raw CSV file. Once the response is exhausted both files are
+    uploaded to S3 and the timestamp attribute is set, so the stream can be passed
+    to transform.clean_flight_stream like the output of get_flight_data.
+    Args:
+        response (requests.Response): Response opened with stream=True.
+        batch_size (int): Number of state rows per batch.
+        upload (bool): Upload the files once the response is exhausted.
+    """
+    def __init__(self, response, batch_size=STREAM_BATCH_SIZE, upload=True):
+        self.response = response
+        self.batch_size = batch_size
+        self.upload = upload
+        self.time = None
+        self.timestamp = None
+        self.record_count = 0
+
+    def __iter__(self):
+        os.makedirs("data", exist_ok=True)
+        parser = StatesParser()
+        batch = []
+        try:
+            with open(file_path_json, 'wb') as json_file, \
+                 open(file_path_csv, 'w', encoding='utf-8', newline='') as csv_file:
+                writer = csv.writer(csv_file)
+                writer.writerow(RAW_COLUMNS)
+                for chunk in self.response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                    json_file.write(chunk)
+                    rows = parser.feed(chunk)
+                    writer.writerows(flight[:17] for flight in rows)
+                    batch.extend(rows)
+                    while len(batch) >= self.batch_size:
+                        self.record_count += self.batch_size
+                        yield batch[:self.batch_size]
+                        batch = batch[self.batch_size:]
+                parser.close()
+        finally:
+            self.response.close()
+        if batch:
+            self.record_count += len(batch)
+            yield batch
+
+        if parser.time is None:
+            raise ValueError("OpenSky response has no 'time' field.")
+        self.time = parser.time
+        self.timestamp = to_utc_timestamp(parser.time)
+        if self.upload:
+            upload_raw_files(self.timestamp)
+
+class StatesParser:
+    """
+    Incremental parser for the OpenSky /states/all JSON payload.
+    Bytes are fed in arbitrary chunks; every complete row of the "states" array is
+    returned as soon as its closing bracket has arrived, so only the unparsed tail
+    of the payload is buffered. Other top-level fields are parsed as they complete
+    and "time" is kept.
+    """
+    _WHITESPACE = " \t\n\r"
+
+    def __init__(self):
+        self.time = None
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._state = "start"  # start -> key -> value -> (states ->) key ... -> done
+        self._key = None
+
+    def _skip_whitespace(self, buf, pos):
+        while pos < len(buf) and buf[pos] in self._WHITESPACE:
+            pos += 1
+        return pos
+
+    def feed(self, chunk):
+        """
+        Parse the next chunk of the payload.
+        Args:
+            chunk (bytes): Next bytes of the response body.
+        Returns:
+            list: Complete state rows found so far and not returned before.
+        Raises:
+            ValueError: If the payload is not a JSON object.
+        """
+        buf = self._buffer + self._decoder.decode(chunk)
+        rows = []
+        pos = 0
+        while True:
+            pos = self._skip_whitespace(buf, pos)
+            if pos == len(buf) or self._state == "done":
+                break
+            char = buf[pos]
+            if self._state == "start":
+                if char != "{":
+                    raise ValueError("OpenSky payload is not a JSON object.")
+                pos += 1
+                self._state = "key"
+            elif self._state == "key":
+                if char == ",":
+                    pos += 1
+                elif char == "}":
+                    pos += 1
+                    self._state = "done"
+                else:
+                    try:
+                        key, end = self._json.raw_decode(buf, pos)
+                    except json.JSONDecodeError:
+                        break
+                    colon = self._skip_whitespace(buf, end)
+                    if colon == len(buf):
+                        break
+                    self._key = key
+                    pos = colon + 1
+                    self._state = "value"
+            elif self._state == "value":
+                if self._key == "states" and char == "[":
+                    pos += 1
+                    self._state = "states"
+                    continue
+                try:
+                    value, end = self._json.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    break
+                # A number at the end of the buffer may still be missing digits
+                if end == len(buf):
+                    break
+                if self._key == "time":
+                    self.time = value
+                pos = end
+                self._state = "key"
+            else:  # inside the states array
+                if char == ",":
+                    pos += 1
+                elif char == "]":
+                    pos += 1
+                    self._state = "key"
+                else:
+                    try:
+                        row, pos = self._json.raw_decode(buf, pos)
+                    except json.JSONDecodeError:
+                        break
+                    rows.append(row)
+        self._buffer = buf[pos:]
+        return rows
+
+    def close(self):
+        """
+        Check that the whole payload has been parsed.
+        Returns:
+            None
+        Raises:
+            ValueError: If the payload ended before the top-level object was closed.
+        """
+        if self._state != "done":
+            raise ValueError("OpenSky payload ended unexpectedly.")
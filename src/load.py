@@ -1,44 +1,134 @@
 import os
 import pandas as pd
-import boto3
+from src.upload import upload_artifacts
+from src.metrics import observe_stage, record_file_written
+from src.transform import to_float64
 
-def load_data(cleaned_data, timestamp):
+OUTPUT_FORMATS = ("csv", "jsonl", "parquet")
+# Repeated strings stored as dictionary pages in Parquet files
+PARQUET_DICTIONARY_COLUMNS = ["origin_country", "callsign"]
+# Rows serialised at a time to JSON Lines; pandas builds the whole document in memory otherwise
+JSONL_CHUNK_ROWS = 20000
+
+def get_output_formats():
+    """
+    Output formats of load_data, read from the comma-separated LOAD_OUTPUT_FORMATS
+    environment variable, e.g. "parquet" or "csv,jsonl,parquet".
+    Returns:
+        list: Output formats, "csv" and "jsonl" by default.
+    """
+    formats = os.getenv("LOAD_OUTPUT_FORMATS", "csv,jsonl")
+    return [output_format.strip() for output_format in formats.split(",") if output_format.strip()]
+
+def write_parquet(df, file_path):
+    """
+    Write cleaned flight data to a Parquet file with dictionary-encoded
+    origin_country and callsign columns and typed timestamp columns.
+    Args:
+        df (pd.DataFrame): Cleaned flight data.
+        file_path (str): Path of the Parquet file.
+    Returns:
+        None
+    """
+    df.to_parquet(
+        file_path,
+        engine = "pyarrow",
+        index = False,
+        compression = os.getenv("PARQUET_COMPRESSION", "zstd"),
+        use_dictionary = PARQUET_DICTIONARY_COLUMNS,
+        # Parquet has no seconds unit, store timestamps as milliseconds
+        coerce_timestamps = "ms"
+    )
+
+def write_jsonl(df, file_path, chunk_rows=JSONL_CHUNK_ROWS):
     """
-    Load selected columns of cleaned flight data into CSV and JSON files, and upload to S3.
+    Write cleaned flight data to a JSON Lines file, chunk_rows rows at a time, with ISO
+    timestamps. float32 columns of the compact schema are written as the decimals
+    clean_data kept, see transform.to_float64.
+    Args:
+        df (pd.DataFrame): Cleaned flight data.
+        file_path (str): Path of the JSON Lines file.
+        chunk_rows (int): Rows serialised at a time.
+    Returns:
+        None
+    """
+    with open(file_path, "w", encoding="utf-8") as jsonl_file:
+        for start in range(0, len(df), chunk_rows):
+            chunk = to_float64(df.iloc[start:start + chunk_rows])
+            jsonl_file.write(chunk.to_json(orient="records", date_format="iso", lines=True))
+
+def cleaned_file_path(output_format):
+    """Local path of the cleaned flight data file of an output format."""
+    return os.path.join("data", f"cleaned_flight_data.{output_format}")
+
+def cleaned_artifacts(timestamp, formats):
+    """
+    Files written by load_data for some output formats, and their S3 keys.
+    Args:
+        timestamp (str): UTC timestamp of the data retrieval.
+        formats (list): Output formats out of OUTPUT_FORMATS.
+    Returns:
+        list: (file path, S3 key) pairs, in the order of OUTPUT_FORMATS.
+    """
+    return [(cleaned_file_path(output_format), f"data/{timestamp}/cleaned_flight_data.{output_format}")
+            for output_format in OUTPUT_FORMATS if output_format in formats]
+
+def upload_cleaned_files(timestamp, formats=None):
+    """
+    Upload the files written by load_data concurrently to the S3 bucket under data/{timestamp}/.
+    Args:
+        timestamp (str): UTC timestamp of the data retrieval.
+        formats (list): Output formats written. Defaults to get_output_formats().
+    Returns:
+        list: Upload report per file, see upload.upload_file.
+    """
+    formats = get_output_formats() if formats is None else formats
+    with observe_stage("load_upload"):
+        return upload_artifacts(cleaned_artifacts(timestamp, formats))
+
+def load_data(cleaned_data, timestamp, formats=None, upload=True):
+    """
+    Load selected columns of cleaned flight data into CSV, JSON Lines and/or Parquet files,
+    and upload to S3.
     Args:
         cleaned_data (pd.DataFrame): Cleaned flight data.
         timestamp (str): UTC timestamp of the data retrieval.
+        formats (list): Output formats out of OUTPUT_FORMATS. Defaults to get_output_formats().
+        upload (bool): Upload the files before returning. Without, the caller uploads
+            them with upload_cleaned_files, e.g. while the data is inserted.
     Returns:
         pd.DataFrame: DataFrame containing the cleaned flight data.
+    Raises:
+        ValueError: If there is no data, no output format or an unknown output format.
     """
+    formats = get_output_formats() if formats is None else formats
+    unknown_formats = set(formats) - set(OUTPUT_FORMATS)
+    if unknown_formats or not formats:
+        raise ValueError(f"Invalid output formats {formats}, expected some of {OUTPUT_FORMATS}.")
+
     # Columns removed: "on_ground" - all False, "sensors" - data not available, "position_source" - all data from ADS-B
-    columns_to_export = ["icao24", "callsign", "origin_country", "time_position", 
-                        "last_contact", "longitude", "latitude", "baro_altitude", 
-                        "velocity", "true_track", "vertical_rate", "geo_altitude", 
+    columns_to_export = ["icao24", "callsign", "origin_country", "time_position",
+                        "last_contact", "longitude", "latitude", "baro_altitude",
+                        "velocity", "true_track", "vertical_rate", "geo_altitude",
                         "squawk", "spi"]
     df_selected = cleaned_data[columns_to_export]
 
     # Ensure the DataFrame is not empty before saving
     if df_selected.empty:
         raise ValueError("No data available to load.")
-    
-    file_path_csv = os.path.join("data", "cleaned_flight_data.csv")
-    file_path_jsonl = os.path.join("data", "cleaned_flight_data.jsonl")
-    df_selected.to_csv(file_path_csv, index=False)
-    df_selected.to_json(file_path_jsonl, orient="records", date_format="iso", lines=True)
-
-    # Upload the files to S3 bucket
-    bucket_name = os.getenv("S3_DATA_BUCKET", "opensky-dev-data")
-    s3 = boto3.client("s3")
-    s3.upload_file(
-        Filename = file_path_jsonl,
-        Bucket = bucket_name,
-        Key = f"data/{timestamp}/cleaned_flight_data.jsonl"
-    )
-    s3.upload_file(
-        Filename = file_path_csv,
-        Bucket = bucket_name,
-        Key = f"data/{timestamp}/cleaned_flight_data.csv"
-    )
-    
-    return df_selected
\ No newline at end of file
+
+    os.makedirs("data", exist_ok=True)
+    with observe_stage("load_write"):
+        if "csv" in formats:
+            df_selected.to_csv(cleaned_file_path("csv"), index=False)
+        if "jsonl" in formats:
+            write_jsonl(df_selected, cleaned_file_path("jsonl"))
+        if "parquet" in formats:
+            write_parquet(df_selected, cleaned_file_path("parquet"))
+    for file_path, _ in cleaned_artifacts(timestamp, formats):
+        record_file_written(file_path)
+
+    if upload:
+        upload_cleaned_files(timestamp, formats)
+
+    return df_selected
@@ -1,15 +1,42 @@
-from fastapi import FastAPI, HTTPException
-from src.fetch import get_flight_data
-from src.transform import clean_data
-from src.load import load_data
-from src.db_manager import (
-    create_table, drop_table, insert_data, 
-    get_flight_counts_by_origin_country,
-    get_fastest_and_slowest_ground_speed_by_origin_country,
-    get_average_ground_speed_of_flights_with_and_without_squawk
-    )
-
-app = FastAPI()
+import os
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Header, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from src.scheduler import get_scheduler
+from src.cache import get_cache
+from src.analytics import get_query_result, get_query_result_async
+from src.metrics import render_metrics
+from src.responses import ORJSONResponse, iter_ndjson
+from src.db_manager import (FLIGHT_COLUMNS, get_flights, iter_flights, resolve_snapshot_time, to_snapshot_time,
+                            SNAPSHOT_TIME_FORMAT, ROLLUP_COLUMNS, get_rollups, get_rollup_summary)
+from utils.db_utils import pool_stats
+from utils.async_db_utils import get_db_driver, close_async_pool, async_pool_stats
+# The spatial index and track store need NumPy and are imported by their endpoints, and
+# ingestion (pandas, boto3, requests) by the scheduler with its first job, so the API starts without them
+
+@asynccontextmanager
+async def lifespan(app):
+    """
+    Start the ingestion scheduler with the app, so scheduled runs
+    (INGEST_INTERVAL_SECONDS) begin without waiting for a request, and close
+    the asyncpg pool on shutdown.
+    """
+    scheduler = get_scheduler()
+    if scheduler.interval:
+        scheduler.start()
+    yield
+    scheduler.stop(timeout=5)
+    await close_async_pool()
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+# Compress responses, including streamed exports, above GZIP_MINIMUM_SIZE bytes for clients
+# sending Accept-Encoding: gzip. Level 5 compresses about 3 times faster than Starlette's
+# default of 9 for 2% larger responses
+app.add_middleware(GZipMiddleware, minimum_size=int(os.getenv("GZIP_MINIMUM_SIZE", "1000")),
+                   compresslevel=int(os.getenv("GZIP_COMPRESS_LEVEL", "5")))
 
 @app.get("/")
 def root():
@@ -29,67 +56,359 @@ def healthcheck():
     """
     return {"status": "OK"}
 
+@app.get("/db-pool-stats")
+def db_pool_stats():
+    """
+    Database connection pool statistics for monitoring.
+    Returns:
+        dict: A status message and the psycopg2 pool statistics, with the asyncpg
+              pool statistics under async_pool (None until the pool is used).
+    """
+    return {"status": "success", "data": {**pool_stats(), "async_pool": async_pool_stats()}}
+
+@app.get("/metrics")
+def metrics():
+    """
+    Pipeline, database query, upload, connection pool and cache metrics in the
+    Prometheus text format, for scraping.
+    Returns:
+        Response: The metrics.
+    """
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
+@app.get("/cache-stats")
+def cache_stats():
+    """
+    Analytics result cache statistics for monitoring.
+    Returns:
+        dict: A status message and the cache statistics.
+    """
+    return {"status": "success", "data": get_cache().stats()}
+
+@app.get("/track-stats")
+def track_stats():
+    """
+    Aircraft track store statistics for monitoring, including its memory use.
+    Returns:
+        dict: A status message and the track store statistics.
+    """
+    from src.tracks import get_track_store
+
+    return {"status": "success", "data": get_track_store().stats()}
+
+def cached_query_response(name, if_none_match):
+    """
+    Serve an analytics query from the in-memory analytics engine or the result
+    cache (see analytics.get_query_result) with an ETag tied to the snapshot version. A matching If-None-Match header is answered with 304
+    without running or looking up the query.
+    Args:
+        name (str): Query name, a key of cache.ANALYTICS_QUERIES.
+        if_none_match (str): Value of the If-None-Match request header, or None.
+    Returns:
+        Response: 304 Not Modified, or the status message and query result as JSON.
+    """
+    cache = get_cache()
+    if cache.not_modified(name, if_none_match):
+        return Response(status_code = 304, headers = {"ETag": cache.etag(name)})
+    version, data = get_query_result(name)
+    return ORJSONResponse(content = {"status": "success", "data": data},
+                          headers = {"ETag": cache.etag(name, version)})
+
+async def async_cached_query_response(name, if_none_match):
+    """
+    Async counterpart of cached_query_response, querying Postgres through the asyncpg pool.
+    Args:
+        name (str): Query name, a key of cache.ASYNC_ANALYTICS_QUERIES.
+        if_none_match (str): Value of the If-None-Match request header, or None.
+    Returns:
+        Response: 304 Not Modified, or the status message and query result as JSON.
+    """
+    cache = get_cache()
+    if await cache.not_modified_async(name, if_none_match):
+        return Response(status_code = 304, headers = {"ETag": cache.etag(name, await cache.version_async())})
+    version, data = await get_query_result_async(name)
+    return ORJSONResponse(content = {"status": "success", "data": data},
+                          headers = {"ETag": cache.etag(name, version)})
+
+async def query_response(name, if_none_match):
+    """
+    Answer an analytics query without blocking the event loop: with API_DB_DRIVER=asyncpg
+    the queries are awaited on the asyncpg pool, otherwise the blocking psycopg2
+    path runs in the threadpool.
+    Args:
+        name (str): Query name, a key of cache.ANALYTICS_QUERIES.
+        if_none_match (str): Value of the If-None-Match request header, or None.
+    Returns:
+        Response: 304 Not Modified, or the status message and query result as JSON.
+    """
+    if get_db_driver() == "asyncpg":
+        return await async_cached_query_response(name, if_none_match)
+    return await run_in_threadpool(cached_query_response, name, if_none_match)
+
 @app.get("/fetch-flights")
 def fetch_flights():
     """
-    Fetch flight data from OpenSky API, clean it, and load it into the database.
+    Queue a run of the ingestion pipeline (fetch, clean, load and insert a new
+    snapshot) on the background scheduler and return without waiting for it.
+    If a run is already waiting in the queue, that run is returned instead.
     Returns:
-        dict: A status message and the number of records inserted.
+        JSONResponse: 202 with a status message and the job id to poll at /jobs/{job_id}.
     Raises:
-        HTTPException: If there is an error during the process.
+        HTTPException: If the job cannot be queued.
     """
     try:
-        data = get_flight_data()
-        cleaned_data = clean_data(*data)
-        loaded_data = load_data(*cleaned_data)
-        drop_table()
-        create_table()
-        insert_data(loaded_data)
-        return {"status": "success", "records_inserted": len(loaded_data)}
+        job = get_scheduler().enqueue()
+        return JSONResponse(status_code = 202, content = {"status": job.status, "job_id": job.id})
     except Exception as e:
         raise HTTPException(status_code = 500, detail = str(e))
-    
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """
+    Get the status of an ingestion job.
+    Args:
+        job_id (str): Job id returned by /fetch-flights.
+    Returns:
+        dict: A status message and the job status, per-stage timings in seconds,
+              number of records inserted, snapshot time and error if it failed.
+    Raises:
+        HTTPException: 404 if the job is unknown or no longer kept.
+    """
+    job = get_scheduler().get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code = 404, detail = f"Job {job_id} not found")
+    return {"status": "success", "data": job.to_dict()}
+
 @app.get("/flight-counts-by-origin-country")
-def flight_counts_by_origin_country():
+async def flight_counts_by_origin_country(if_none_match: Optional[str] = Header(default = None)):
     """
     Get flight counts by origin country.
+    Served from the result cache of the current snapshot, see query_response.
     Returns:
         dict: A status message and the flight counts.
     Raises:
         HTTPException: If there is an error during the process.
     """
     try:
-        counts = get_flight_counts_by_origin_country()
-        return {"status": "success", "data": counts}
+        return await query_response("flight-counts-by-origin-country", if_none_match)
     except Exception as e:
         raise HTTPException(status_code = 500, detail = str(e))
     
 @app.get("/fastest-and-slowest-ground-speed-by-origin-country")
-def fastest_and_slowest_ground_speed_by_origin_country():
+async def fastest_and_slowest_ground_speed_by_origin_country(if_none_match: Optional[str] = Header(default = None)):
     """
     Get the fastest and slowest ground speed for each origin country.
+    Served from the result cache of the current snapshot, see query_response.
     Returns:
         dict: A status message and the ground speeds.
     Raises:
         HTTPException: If there is an error during the process.
     """
     try:
-        speeds = get_fastest_and_slowest_ground_speed_by_origin_country()
-        return {"status": "success", "data": speeds}
+        return await query_response("fastest-and-slowest-ground-speed-by-origin-country", if_none_match)
     except Exception as e:
         raise HTTPException(status_code = 500, detail = str(e))
     
 @app.get("/average-ground-speed-of-flights-with-and-without-squawk")
-def average_ground_speed_of_flights_with_and_without_squawk():
+async def average_ground_speed_of_flights_with_and_without_squawk(if_none_match: Optional[str] = Header(default = None)):
     """
     Get the average ground speed of flights with and without squawk.
+    Served from the result cache of the current snapshot, see query_response.
     Returns:
         dict: A status message and the average ground speeds.
     Raises:
         HTTPException: If there is an error during the process.
     """
     try:
-        speeds = get_average_ground_speed_of_flights_with_and_without_squawk()
-        return {"status": "success", "data": speeds}
+        return await query_response("average-ground-speed-of-flights-with-and-without-squawk", if_none_match)
+    except Exception as e:
+        raise HTTPException(status_code = 500, detail = str(e))
+
+@app.get("/aircraft/bbox")
+def aircraft_in_bbox(min_lon: float = Query(ge = -180, le = 180), min_lat: float = Query(ge = -90, le = 90),
+                     max_lon: float = Query(ge = -180, le = 180), max_lat: float = Query(ge = -90, le = 90),
+                     snapshot_time: Optional[str] = None, limit: int = Query(default = 1000, ge = 1, le = 100000),
+                     after: Optional[str] = None):
+    """
+    Get the aircraft inside a bounding box, ordered by icao24. A box with min_lon above
+    max_lon crosses the antimeridian. The latest snapshot is searched in the in-memory
+    spatial index, earlier snapshots (snapshot_time as %Y-%m-%d_%H-%M-%S) in Postgres.
+    A full page is followed by the next one with after set to its next_after.
+    Returns:
+        dict: A status message, the aircraft as icao24, callsign, origin country,
+              longitude, latitude, barometric altitude, ground speed and heading,
+              and next_after, the icao24 to request the next page after (None on the last page).
+    Raises:
+        HTTPException: 400 if the box is invalid, 500 if there is an error during the process.
+    """
+    from src.spatial import find_in_bbox
+
+    try:
+        aircraft = find_in_bbox(min_lon, min_lat, max_lon, max_lat, snapshot_time, limit, after)
+        next_after = aircraft[-1][0] if len(aircraft) == limit else None
+        return ORJSONResponse({"status": "success", "data": aircraft, "next_after": next_after})
+    except ValueError as e:
+        raise HTTPException(status_code = 400, detail = str(e))
+    except Exception as e:
+        raise HTTPException(status_code = 500, detail = str(e))
+
+@app.get("/aircraft/radius")
+def aircraft_within_radius(lon: float = Query(ge = -180, le = 180), lat: float = Query(ge = -90, le = 90),
+                           radius_km: float = Query(gt = 0, le = 20100), snapshot_time: Optional[str] = None,
+                           limit: int = Query(default = 1000, ge = 1, le = 100000)):
+    """
+    Get the aircraft within a great-circle distance of a point, nearest first.
+    Returns:
+        dict: A status message and the aircraft as in /aircraft/bbox followed by the distance in km.
+    Raises:
+        HTTPException: 400 if the point is invalid, 500 if there is an error during the process.
+    """
+    from src.spatial import find_within_radius
+
+    try:
+        aircraft = find_within_radius(lon, lat, radius_km, snapshot_time, limit)
+        return ORJSONResponse({"status": "success", "data": aircraft})
+    except ValueError as e:
+        raise HTTPException(status_code = 400, detail = str(e))
+    except Exception as e:
+        raise HTTPException(status_code = 500, detail = str(e))
+
+@app.get("/aircraft/nearest")
+def nearest_aircraft(lon: float = Query(ge = -180, le = 180), lat: float = Query(ge = -90, le = 90),
+                     k: int = Query(default = 10, ge = 1, le = 1000), snapshot_time: Optional[str] = None):
+    """
+    Get the k aircraft nearest to a point, nearest first.
+    Returns:
+        dict: A status message and the aircraft as in /aircraft/bbox followed by the distance in km.
+    Raises:
+        HTTPException: 400 if the point is invalid, 500 if there is an error during the process.
+    """
+    from src.spatial import find_nearest
+
+    try:
+        aircraft = find_nearest(lon, lat, k, snapshot_time)
+        return ORJSONResponse({"status": "success", "data": aircraft})
+    except ValueError as e:
+        raise HTTPException(status_code = 400, detail = str(e))
+    except Exception as e:
+        raise HTTPException(status_code = 500, detail = str(e))
+
+@app.get("/flights")
+def list_flights(snapshot_time: Optional[str] = None, after: Optional[str] = None,
+                 limit: int = Query(default = 1000, ge = 1, le = 10000)):
+    """
+    Get one page of the flights of a snapshot (snapshot_time as %Y-%m-%d_%H-%M-%S,
+    the latest by default), ordered by icao24. The next page is requested with the
+    returned snapshot_time and after set to next_after, so pages stay on one snapshot
+    while new ones are ingested.
+    Returns:
+        dict: A status message, the flight fields, the flights, the snapshot time of
+              the page and next_after (None on the last page).
+    Raises:
+        HTTPException: 400 if the snapshot time is invalid, 500 if there is an error during the process.
+    """
+    try:
+        snapshot_time = resolve_snapshot_time(snapshot_time and to_snapshot_time(snapshot_time))
+        flights = get_flights(snapshot_time, after, limit)
+        next_after = flights[-1][0] if len(flights) == limit else None
+        return ORJSONResponse({"status": "success", "fields": FLIGHT_COLUMNS, "data": flights,
+                               "snapshot_time": snapshot_time and snapshot_time.strftime(SNAPSHOT_TIME_FORMAT),
+                               "next_after": next_after})
+    except ValueError as e:
+        raise HTTPException(status_code = 400, detail = str(e))
     except Exception as e:
-        raise HTTPException(status_code = 500, detail = str(e))
\ No newline at end of file
+        raise HTTPException(status_code = 500, detail = str(e))
+
+@app.get("/flights/export")
+def export_flights(snapshot_time: Optional[str] = None):
+    """
+    Export every flight of a snapshot (the latest by default) as JSON Lines
+    (application/x-ndjson), one object of FLIGHT_COLUMNS per line, ordered by icao24.
+    The flights are read and sent in pages, so neither the API nor the client holds
+    the whole snapshot.
+    Returns:
+        StreamingResponse: The flights, one per line.
+    Raises:
+        HTTPException: 400 if the snapshot time is invalid.
+    """
+    try:
+        # Resolved before streaming, so an invalid time is answered with 400 rather than a broken stream
+        snapshot_time = resolve_snapshot_time(snapshot_time and to_snapshot_time(snapshot_time))
+    except ValueError as e:
+        raise HTTPException(status_code = 400, detail = str(e))
+    records = (dict(zip(FLIGHT_COLUMNS, flight)) for flight in iter_flights(snapshot_time))
+    return StreamingResponse(iter_ndjson(records), media_type = "application/x-ndjson")
+
+@app.get("/rollups/{granularity}")
+def rollups(granularity: str, start: Optional[str] = None, end: Optional[str] = None,
+            origin_country: Optional[str] = None):
+    """
+    Get the flight counts and ground speeds of each origin country per minute or hour
+    bucket (granularity) from start (included) to end (excluded), both as
+    %Y-%m-%d_%H-%M-%S. Without start, the last hour of minutes or the last day of hours
+    is returned. Read from the rollup tables, so long ranges do not scan raw snapshots.
+    Returns:
+        dict: A status message, the rollup fields and one row per bucket and country.
+    Raises:
+        HTTPException: 400 if the granularity or range is invalid, 500 if there is an error during the process.
+    """
+    try:
+        data = get_rollups(granularity, start, end, origin_country)
+        return ORJSONResponse({"status": "success", "fields": ROLLUP_COLUMNS, "data": data})
+    except ValueError as e:
+        raise HTTPException(status_code = 400, detail = str(e))
+    except Exception as e:
+        raise HTTPException(status_code = 500, detail = str(e))
+
+@app.get("/rollups/{granularity}/summary")
+def rollup_summary(granularity: str, start: Optional[str] = None, end: Optional[str] = None):
+    """
+    Get the flight counts and ground speeds of each origin country over a time range,
+    summed from the minute or hour rollups (granularity), busiest country first.
+    The range is as in /rollups/{granularity}.
+    Returns:
+        dict: A status message, the rollup fields without the bucket and one row per country.
+    Raises:
+        HTTPException: 400 if the granularity or range is invalid, 500 if there is an error during the process.
+    """
+    try:
+        data = get_rollup_summary(granularity, start, end)
+        return ORJSONResponse({"status": "success", "fields": ROLLUP_COLUMNS[1:], "data": data})
+    except ValueError as e:
+        raise HTTPException(status_code = 400, detail = str(e))
+    except Exception as e:
+        raise HTTPException(status_code = 500, detail = str(e))
+
+@app.get("/tracks")
+def export_tracks():
+    """
+    Export the recent track of every aircraft as JSON Lines (application/x-ndjson),
+    one {"icao24": ..., "points": [...]} object per line, streamed as it is read.
+    Points are as in /tracks/{icao24}.
+    Returns:
+        StreamingResponse: The tracks, one aircraft per line.
+    """
+    from src.tracks import get_track_store
+
+    return StreamingResponse(get_track_store().iter_ndjson(), media_type = "application/x-ndjson")
+
+@app.get("/tracks/{icao24}")
+def get_track(icao24: str):
+    """
+    Get the recent track of an aircraft, from the positions appended at each ingest
+    by this process (TRACK_LENGTH points at most, oldest first).
+    Args:
+        icao24 (str): ICAO 24-bit address of the aircraft.
+    Returns:
+        dict: A status message, the point fields and the points as time (epoch seconds),
+              longitude, latitude, barometric altitude, ground speed and heading.
+    Raises:
+        HTTPException: 404 if the aircraft has no track.
+    """
+    from src.tracks import get_track_store, TRACK_FIELDS
+
+    points = get_track_store().track(icao24.lower())
+    if points is None:
+        raise HTTPException(status_code = 404, detail = f"No track for aircraft {icao24}")
+    return {"status": "success", "data": {"icao24": icao24.lower(), "fields": TRACK_FIELDS, "points": points}}
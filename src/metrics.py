@@ -0,0 +1,190 @@
+import functools
+import inspect
+import os
+import sys
+import time
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Pipeline stages take from milliseconds (insert of a small delta) to minutes (a slow download)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+STAGE_SECONDS = Histogram("opensky_pipeline_stage_seconds", "Duration of a pipeline stage or step.",
+                          ["stage"], buckets=STAGE_BUCKETS)
+STAGE_ERRORS = Counter("opensky_pipeline_stage_errors_total", "Pipeline stages or steps that raised.",
+                       ["stage", "error"])
+ROWS_PROCESSED = Counter("opensky_pipeline_rows_total", "Rows output by a pipeline stage.", ["stage"])
+PIPELINE_RUNS = Counter("opensky_pipeline_runs_total", "Finished ingestion jobs.", ["status"])
+LAST_SUCCESS = Gauge("opensky_pipeline_last_success_timestamp_seconds",
+                     "Unix time the last ingestion job succeeded.")
+FILE_BYTES_WRITTEN = Counter("opensky_file_bytes_written_total", "Bytes written to local data files.", ["file"])
+S3_UPLOAD_BYTES = Counter("opensky_s3_upload_bytes_total", "Bytes sent to S3, after compression.", ["file"])
+S3_UPLOAD_SECONDS = Histogram("opensky_s3_upload_seconds", "Duration of an S3 upload.", ["file"],
+                              buckets=STAGE_BUCKETS)
+S3_UPLOAD_ERRORS = Counter("opensky_s3_upload_errors_total", "S3 uploads that raised.", ["file", "error"])
+OPENSKY_REQUESTS = Counter("opensky_api_requests_total", "Requests to the OpenSky API by HTTP status or error.",
+                           ["status"])
+OPENSKY_RETRIES = Counter("opensky_api_retries_total", "OpenSky API requests retried, by status or error.",
+                          ["reason"])
+DEDUP_ROWS_DROPPED = Counter("opensky_dedup_rows_dropped_total", "Repeated aircraft states left out of a snapshot.")
+DEDUP_BYTES_SAVED = Counter("opensky_dedup_bytes_saved_total", "Bytes of the repeated states left out, as CSV.")
+DB_QUERY_SECONDS = Histogram("opensky_db_query_seconds", "Duration of a database function.",
+                             ["query", "driver"], buckets=QUERY_BUCKETS)
+DB_QUERY_ROWS = Counter("opensky_db_query_rows_total", "Rows returned or written by a database function.",
+                        ["query", "driver"])
+DB_QUERY_ERRORS = Counter("opensky_db_query_errors_total", "Database functions that raised.",
+                          ["query", "driver", "error"])
+
+@contextmanager
+def observe_stage(stage):
+    """
+    Context manager recording the duration of a pipeline stage or step in
+    STAGE_SECONDS, and counting it in STAGE_ERRORS if it raises.
+    Args:
+        stage (str): Name of the stage, e.g. "insert" or "fetch_download".
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        STAGE_ERRORS.labels(stage, type(e).__name__).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+
+def record_file_written(file_path):
+    """
+    Count the size of a data file just written in FILE_BYTES_WRITTEN.
+    Args:
+        file_path (str): Path of the file.
+    Returns:
+        None
+    """
+    FILE_BYTES_WRITTEN.labels(os.path.basename(file_path)).inc(os.path.getsize(file_path))
+
+def _result_rows(result, *args, **kwargs):
+    """Rows of a query result: the length of the returned list or DataFrame."""
+    return len(result)
+
+def observe_query(driver="psycopg2", rows=_result_rows):
+    """
+    Decorator recording the duration of a database function in DB_QUERY_SECONDS,
+    the rows it returned or wrote in DB_QUERY_ROWS and its errors in DB_QUERY_ERRORS,
+    labelled with the function name. Coroutine functions are awaited.
+    Args:
+        driver (str): Database driver label, "psycopg2" or "asyncpg".
+        rows (callable): Called with the result and the arguments of the function,
+            returns the number of rows; None to count no rows.
+    Returns:
+        callable: The decorator.
+    """
+    def decorator(function):
+        name = function.__name__
+        seconds = DB_QUERY_SECONDS.labels(name, driver)
+        row_count = DB_QUERY_ROWS.labels(name, driver)
+
+        def record(start, result, args, kwargs):
+            seconds.observe(time.perf_counter() - start)
+            if rows is not None:
+                row_count.inc(rows(result, *args, **kwargs))
+
+        def record_error(start, error):
+            seconds.observe(time.perf_counter() - start)
+            DB_QUERY_ERRORS.labels(name, driver, type(error).__name__).inc()
+
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    result = await function(*args, **kwargs)
+                except Exception as e:
+                    record_error(start, e)
+                    raise
+                record(start, result, args, kwargs)
+                return result
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except Exception as e:
+                record_error(start, e)
+                raise
+            record(start, result, args, kwargs)
+            return result
+        return wrapper
+    return decorator
+
+class StatsCollector:
+    """
+    Exposes the statistics the API already keeps (connection pools, result cache,
+    track store, deduplicator) as metrics. They are only read when /metrics is
+    scraped, so they cost nothing otherwise.
+    """
+    def describe(self):
+        # Nothing to describe up front: registering must not read the statistics
+        return []
+
+    def collect(self):
+        from utils.db_utils import pool_stats
+        from utils.async_db_utils import async_pool_stats
+        from src.cache import get_cache
+
+        connections = GaugeMetricFamily("opensky_db_pool_connections", "Open database connections by state.",
+                                        labels=["driver", "state"])
+        max_size = GaugeMetricFamily("opensky_db_pool_max_size", "Maximum database connections.", labels=["driver"])
+        # Scraping must not open a pool the process has not needed yet
+        sync_stats = pool_stats(create=False)
+        for driver, stats in (("psycopg2", sync_stats), ("asyncpg", async_pool_stats())):
+            if stats is None:
+                continue
+            connections.add_metric([driver, "in_use"], stats["in_use"])
+            connections.add_metric([driver, "idle"], stats["idle"])
+            max_size.add_metric([driver], stats["max_size"])
+        yield connections
+        yield max_size
+
+        if sync_stats is not None:
+            for key, help_text in (("checkouts", "Connections checked out of the pool."),
+                                   ("waits", "Checkouts that waited for a free connection."),
+                                   ("timeouts", "Checkouts that timed out."),
+                                   ("connections_created", "Connections opened by the pool."),
+                                   ("connections_discarded", "Connections closed by the pool.")):
+                yield CounterMetricFamily(f"opensky_db_pool_{key}", help_text, value=sync_stats[key])
+            yield CounterMetricFamily("opensky_db_pool_wait_seconds", "Seconds spent waiting for a connection.",
+                                      value=sync_stats["wait_time"])
+
+        stats = get_cache().stats()
+        for key in ("hits", "misses", "evictions", "invalidations", "not_modified"):
+            yield CounterMetricFamily(f"opensky_result_cache_{key}", f"Result cache {key.replace('_', ' ')}.",
+                                      value=stats[key])
+        yield GaugeMetricFamily("opensky_result_cache_entries", "Results held by the cache.", value=stats["entries"])
+
+        # The track store and deduplicator are only read once ingestion imported them,
+        # so scraping does not load NumPy into a read-only API process
+        tracks, dedup = sys.modules.get("src.tracks"), sys.modules.get("src.dedup")
+        stats = tracks.get_track_store().stats() if tracks else {"aircraft": 0, "array_bytes": 0}
+        yield GaugeMetricFamily("opensky_tracks_aircraft", "Aircraft with a track.", value=stats["aircraft"])
+        yield GaugeMetricFamily("opensky_tracks_bytes", "Bytes of the track store arrays.", value=stats["array_bytes"])
+
+        deduplicator = dedup.get_deduplicator() if dedup else None
+        if deduplicator is not None:
+            stats = deduplicator.stats()
+            yield GaugeMetricFamily("opensky_dedup_keys", "State keys remembered for deduplication.", value=stats["keys"])
+            yield GaugeMetricFamily("opensky_dedup_bytes", "Bytes of the deduplication key arrays.",
+                                    value=stats["array_bytes"])
+
+REGISTRY.register(StatsCollector())
+
+def render_metrics():
+    """
+    Render every metric in the Prometheus text format.
+    Returns:
+        tuple: The metrics as bytes and their content type.
+    """
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
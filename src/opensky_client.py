@@ -0,0 +1,216 @@
+import os
+import time
+import random
+import datetime
+import threading
+import email.utils
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from src.metrics import OPENSKY_REQUESTS, OPENSKY_RETRIES
+
+OPENSKY_API_URL = "https://opensky-network.org/api"
+# Rate limiting (429) and transient server errors are retried
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# OpenSky sends the seconds until its rate limit resets with a 429; Retry-After is the standard header
+RETRY_AFTER_HEADERS = ("X-Rate-Limit-Retry-After-Seconds", "Retry-After")
+
+def parse_retry_after(headers):
+    """
+    Seconds to wait before retrying, from the rate limit headers of a response.
+    Args:
+        headers (Mapping): Response headers.
+    Returns:
+        float: Seconds to wait, or None if no header says.
+    """
+    for name in RETRY_AFTER_HEADERS:
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        # Retry-After may also be an HTTP date
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            continue
+        return max((retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds(), 0.0)
+    return None
+
+def states_params(bbox=None, icao24=None, time=None):
+    """
+    Query parameters of /states/all, which filters the states server-side.
+    Args:
+        bbox (tuple): (min_lon, min_lat, max_lon, max_lat) in degrees. OpenSky does not
+            accept boxes crossing the antimeridian.
+        icao24 (list): ICAO 24-bit addresses of the aircraft to return.
+        time (int | datetime): Time of the states, Unix seconds. Defaults to the latest states.
+    Returns:
+        dict: Query parameters.
+    Raises:
+        ValueError: If the box is invalid.
+    """
+    params = {}
+    if bbox is not None:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox)
+        if not (-180 <= min_lon <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+            raise ValueError(f"Invalid bounding box {bbox}, expected min_lon <= max_lon and "
+                             "min_lat <= max_lat within [-180, 180] and [-90, 90].")
+        params.update(lamin=min_lat, lomin=min_lon, lamax=max_lat, lomax=max_lon)
+    if icao24:
+        # Repeated as icao24=...&icao24=...
+        params["icao24"] = [address.strip().lower() for address in icao24]
+    if time is not None:
+        params["time"] = int(time.timestamp()) if isinstance(time, datetime.datetime) else int(time)
+    return params
+
+class OpenSkyClient:
+    """
+    Client of the OpenSky Network REST API. One session keeps the TLS connection
+    open between polls and asks for compressed responses, which requests decodes
+    transparently. Rate limited (429) and failed (5xx, connection errors, timeouts)
+    requests are retried with exponential backoff and full jitter, waiting as long
+    as the rate limit headers ask when they do.
+    Args:
+        base_url (str): API root. Defaults to the OPENSKY_API_URL environment variable,
+            or the public API.
+        timeout (float): Seconds to wait for the server to answer, or between bytes of the
+            response. Defaults to OPENSKY_TIMEOUT_SECONDS, or 30.
+        max_retries (int): Retries after the first attempt. Defaults to OPENSKY_MAX_RETRIES, or 4.
+        backoff (float): Upper bound of the first backoff in seconds, doubled on every retry.
+            Defaults to OPENSKY_BACKOFF_SECONDS, or 1.
+        max_backoff (float): Upper bound of any backoff in seconds. Defaults to 60.
+        max_retry_after (float): Longest wait asked by a rate limit header that is honoured;
+            a later reset fails at once rather than holding the ingest. Defaults to
+            OPENSKY_MAX_RETRY_AFTER_SECONDS, or 120.
+        sleep (callable): Called with the seconds to wait between attempts.
+    """
+    def __init__(self, base_url=None, timeout=None, max_retries=None, backoff=None,
+                 max_backoff=60.0, max_retry_after=None, sleep=time.sleep):
+        self.base_url = (base_url or os.getenv("OPENSKY_API_URL") or OPENSKY_API_URL).rstrip("/")
+        read_timeout = timeout if timeout is not None else float(os.getenv("OPENSKY_TIMEOUT_SECONDS", "30"))
+        self.timeout = (min(10.0, read_timeout), read_timeout)
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("OPENSKY_MAX_RETRIES", "4"))
+        self.backoff = backoff if backoff is not None else float(os.getenv("OPENSKY_BACKOFF_SECONDS", "1"))
+        self.max_backoff = max_backoff
+        self.max_retry_after = (max_retry_after if max_retry_after is not None
+                                else float(os.getenv("OPENSKY_MAX_RETRY_AFTER_SECONDS", "120")))
+        self.sleep = sleep
+        self.rate_limit_remaining = None
+        self.session = requests.Session()
+        # gzip and deflate, plus br and zstd when urllib3 can decode them
+        self.session.headers["Accept-Encoding"] = make_headers(accept_encoding=True)["accept-encoding"]
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
+    def _backoff(self, attempt):
+        """Full jitter: a random wait up to the exponential backoff of the attempt."""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def get(self, path, params=None, stream=False):
+        """
+        Send a GET request to the API, retrying rate limited and failed requests.
+        Args:
+            path (str): Path under the API root, e.g. "/states/all".
+            params (dict): Query parameters.
+            stream (bool): Return before the body is read, see requests.
+        Returns:
+            requests.Response: The successful response.
+        Raises:
+            requests.HTTPError: If the last attempt failed with an HTTP error, or the
+                rate limit resets later than max_retry_after.
+            requests.RequestException: If the last attempt failed to connect or timed out.
+        """
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                OPENSKY_REQUESTS.labels(type(e).__name__).inc()
+                if attempt == self.max_retries:
+                    raise
+                OPENSKY_RETRIES.labels(type(e).__name__).inc()
+                delay = self._backoff(attempt)
+            else:
+                OPENSKY_REQUESTS.labels(str(response.status_code)).inc()
+                self.rate_limit_remaining = response.headers.get("X-Rate-Limit-Remaining", self.rate_limit_remaining)
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response
+                delay = parse_retry_after(response.headers)
+                if delay is not None and delay > self.max_retry_after:
+                    response.raise_for_status()
+                if delay is None:
+                    delay = self._backoff(attempt)
+                response.close()
+                OPENSKY_RETRIES.labels(str(response.status_code)).inc()
+            self.sleep(delay)
+
+    def get_states(self, bbox=None, icao24=None, time=None, stream=False):
+        """
+        Get state vectors from /states/all, filtered server-side, see states_params.
+        Args:
+            bbox (tuple): (min_lon, min_lat, max_lon, max_lat) in degrees.
+            icao24 (list): ICAO 24-bit addresses of the aircraft to return.
+            time (int | datetime): Time of the states. Defaults to the latest states.
+            stream (bool): Return before the body is read, to parse it as it arrives.
+        Returns:
+            requests.Response: The response, with a JSON body of "time" and "states".
+        """
+        return self.get("/states/all", states_params(bbox, icao24, time), stream=stream)
+
+    def close(self):
+        """
+        Close the connections of the session.
+        Returns:
+            None
+        """
+        self.session.close()
+
+def get_states_filters():
+    """
+    Server-side filters of every fetch, read from OPENSKY_BBOX ("min_lon,min_lat,max_lon,max_lat")
+    and OPENSKY_ICAO24 (comma-separated addresses). Both default to no filter.
+    Returns:
+        dict: bbox and icao24 keyword arguments of OpenSkyClient.get_states.
+    Raises:
+        ValueError: If OPENSKY_BBOX does not hold four numbers.
+    """
+    bbox = os.getenv("OPENSKY_BBOX")
+    if bbox:
+        bbox = tuple(float(value) for value in bbox.split(","))
+        if len(bbox) != 4:
+            raise ValueError(f"OPENSKY_BBOX needs four comma-separated numbers, got {len(bbox)}.")
+    icao24 = [address.strip() for address in os.getenv("OPENSKY_ICAO24", "").split(",") if address.strip()]
+    return {"bbox": bbox or None, "icao24": icao24 or None}
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_opensky_client():
+    """
+    Return the OpenSky client shared by every fetch in the process, creating it on
+    first use, so polls reuse its connection.
+    Returns:
+        OpenSkyClient: The shared client.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenSkyClient()
+        return _client
+
+def reset_opensky_client():
+    """
+    Close and drop the shared client so the next fetch creates a new one,
+    e.g. after OPENSKY_API_URL changed.
+    Returns:
+        None
+    """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
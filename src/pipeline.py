@@ -0,0 +1,239 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from src.fetch import get_flight_data, stream_flight_data, upload_raw_files
+from src.transform import clean_data, clean_flight_stream, diff_snapshots
+from src.load import load_data, upload_cleaned_files, get_output_formats
+from src.db_manager import (insert_data, drop_expired_partitions,
+                            get_ingest_mode, get_current_states, apply_delta,
+                            get_snapshot_version)
+from src.cache import refresh_cache
+from src.analytics import get_analytics_engine_name, get_engine
+from src.spatial import get_spatial_index
+from src.tracks import get_track_store
+from src.dedup import get_deduplicator
+from src.metrics import observe_stage, ROWS_PROCESSED, DEDUP_ROWS_DROPPED, DEDUP_BYTES_SAVED
+
+@contextmanager
+def timed_stage(stage_timings, stage):
+    """
+    Context manager recording the duration of a pipeline stage in seconds,
+    whether the stage succeeds or fails, in stage_timings and in the stage metrics.
+    Args:
+        stage_timings (dict): Mapping of stage name to seconds, updated in place.
+        stage (str): Name of the stage.
+    """
+    start = time.perf_counter()
+    try:
+        with observe_stage(stage):
+            yield
+    finally:
+        stage_timings[stage] = round(time.perf_counter() - start, 4)
+
+class PipelineGraph:
+    """
+    Runs the stages of an ingest as a dependency graph on a thread pool: a stage starts
+    as soon as the stages it depends on have finished, so independent branches, such as
+    archiving the files to S3 and loading the database, overlap. Every stage is timed
+    with timed_stage. A critical stage that fails fails the run: the stages not started
+    yet are dropped, the running ones are waited for and its error is raised. A
+    non-critical stage that fails is recorded in errors and only its dependents are skipped.
+    Args:
+        stage_timings (dict): Mapping filled in place with the seconds taken by each stage.
+        max_workers (int): Threads running stages. Defaults to the PIPELINE_WORKERS
+            environment variable, or 4.
+    """
+    def __init__(self, stage_timings=None, max_workers=None):
+        self.stage_timings = {} if stage_timings is None else stage_timings
+        self.max_workers = max_workers or int(os.getenv("PIPELINE_WORKERS", "4"))
+        self.stages = {}
+        self.results = {}
+        self.errors = {}
+
+    def add(self, name, function, after=(), critical=True):
+        """
+        Add a stage. Stages are added after the stages they depend on, so the graph has no cycle.
+        Args:
+            name (str): Stage name, used in stage_timings and the stage metrics.
+            function (callable): Runs the stage, called with the results of the stages in after.
+            after (list): Names of the stages to wait for.
+            critical (bool): Whether a failure of the stage fails the run.
+        Returns:
+            None
+        Raises:
+            ValueError: If the name is taken, a stage in after has not been added, or a
+                critical stage depends on a non-critical one, which may be skipped.
+        """
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' is already in the pipeline.")
+        for dependency in after:
+            if dependency not in self.stages:
+                raise ValueError(f"Stage '{name}' depends on '{dependency}', which has not been added.")
+            if critical and not self.stages[dependency][2]:
+                raise ValueError(f"Critical stage '{name}' depends on non-critical stage '{dependency}'.")
+        self.stages[name] = (function, tuple(after), critical)
+
+    def _run_stage(self, name, function, arguments):
+        with timed_stage(self.stage_timings, name):
+            return function(*arguments)
+
+    def run(self):
+        """
+        Run every stage.
+        Returns:
+            dict: The result of every stage that succeeded, by name.
+        Raises:
+            Exception: The error of the first critical stage that failed.
+        """
+        pending = dict(self.stages)
+        running = {}
+        failure = None
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline") as executor:
+            while pending or running:
+                # Stages are in dependency order, so a dependency is decided before its dependents
+                for name, (function, after, _) in list(pending.items()):
+                    if failure is not None:
+                        break
+                    if any(dependency in self.errors for dependency in after):
+                        del pending[name]
+                        self.errors[name] = "skipped: " + ", ".join(d for d in after if d in self.errors) + " failed"
+                    elif all(dependency in self.results for dependency in after):
+                        del pending[name]
+                        arguments = [self.results[dependency] for dependency in after]
+                        running[executor.submit(self._run_stage, name, function, arguments)] = name
+                if failure is not None:
+                    pending.clear()
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        self.results[name] = future.result()
+                    except Exception as e:
+                        if self.stages[name][2]:
+                            failure = failure or e
+                        else:
+                            self.errors[name] = f"{type(e).__name__}: {e}"
+        if failure is not None:
+            raise failure
+        return self.results
+
+def run_pipeline(stage_timings=None):
+    """
+    Fetch flight data from OpenSky API, clean it, and load it into the database
+    as a new snapshot. Partitions older than the retention period are dropped and
+    the analytics result cache is refreshed for the new snapshot. The in-memory
+    spatial index, and with ANALYTICS_ENGINE=memory the in-memory analytics
+    aggregates, are rebuilt from the loaded data, and the positions are appended
+    to the aircraft tracks. The database schema must exist, see db_manager.create_table;
+    the ingestion scheduler creates it once, before its first job, and insert_data
+    creates the daily partitions it writes to.
+    The stages run as a PipelineGraph: the raw and cleaned files are archived to S3
+    (archive_raw, archive_cleaned) while the data is cleaned and inserted, and a failed
+    upload is reported in stage_errors without failing the ingest.
+    With OPENSKY_FETCH_MODE=stream the response is parsed and cleaned in batches
+    as it arrives, so fetch and clean are timed together. With INGEST_MODE=incremental
+    only the aircraft that changed since the previous fetch are written. With
+    DEDUP_TTL_SECONDS set, states already seen within that many seconds are left out
+    of the cleaned files and their upload; the database, in-memory index, tracks and
+    aggregates still receive every aircraft of the snapshot.
+    Args:
+        stage_timings (dict): Mapping filled in place with the seconds taken by each stage.
+    Returns:
+        dict: The number of records inserted, the snapshot time and the stage timings,
+              in incremental mode the number of aircraft upserted and removed, with
+              deduplication the number of records and bytes it saved, and the errors
+              of the archive uploads that failed, if any.
+    """
+    stage_timings = {} if stage_timings is None else stage_timings
+    ingest_mode = get_ingest_mode()
+    formats = get_output_formats()
+    deduplicator = get_deduplicator()
+    result = {}
+    graph = PipelineGraph(stage_timings)
+
+    def clean(data=None):
+        cleaned_data = clean_flight_stream(stream_flight_data(upload=False)) if data is None else clean_data(*data)
+        ROWS_PROCESSED.labels("clean").inc(len(cleaned_data[0]))
+        return cleaned_data
+    if os.getenv("OPENSKY_FETCH_MODE", "buffered") == "stream":
+        graph.add("fetch_and_clean", clean)
+        graph.add("archive_raw", lambda cleaned_data: upload_raw_files(cleaned_data[1]),
+                  after=["fetch_and_clean"], critical=False)
+        cleaned = "fetch_and_clean"
+    else:
+        def fetch():
+            data = get_flight_data(upload=False)
+            ROWS_PROCESSED.labels("fetch").inc(len(data[0].get("states") or []))
+            return data
+        graph.add("fetch", fetch)
+        graph.add("archive_raw", lambda data: upload_raw_files(data[1]), after=["fetch"], critical=False)
+        graph.add("clean", clean, after=["fetch"])
+        cleaned = "clean"
+
+    def deduplicate(cleaned_data):
+        deduplicated, dedup = deduplicator.filter(*cleaned_data)
+        result["records_deduplicated"] = dedup["rows_dropped"]
+        result["bytes_deduplicated"] = dedup["bytes_saved"]
+        DEDUP_ROWS_DROPPED.inc(dedup["rows_dropped"])
+        DEDUP_BYTES_SAVED.inc(dedup["bytes_saved"])
+        return (deduplicated, cleaned_data[1])
+    deduplicated = cleaned
+    if deduplicator is not None:
+        graph.add("dedup", deduplicate, after=[cleaned])
+        deduplicated = "dedup"
+
+    def load(cleaned_data, deduplicated_data):
+        if deduplicated_data[0].empty and not cleaned_data[0].empty:
+            # Every state was a repeat: nothing to write or upload
+            return None
+        return load_data(*deduplicated_data, formats=formats, upload=False)
+    graph.add("load", load, after=[cleaned, deduplicated])
+    graph.add("archive_cleaned", lambda loaded_data, cleaned_data:
+              loaded_data is not None and upload_cleaned_files(cleaned_data[1], formats),
+              after=["load", cleaned], critical=False)
+
+    def insert(cleaned_data, _):
+        snapshot, snapshot_time = cleaned_data
+        if ingest_mode == "incremental":
+            # Compared whole, as aircraft missing from the snapshot are tombstoned
+            changed, removed = diff_snapshots(get_current_states(), snapshot)
+            delta = apply_delta(changed, removed, snapshot_time = snapshot_time,
+                                record_count = len(snapshot))
+            result["records_upserted"] = delta["upserted"]
+            result["records_removed"] = delta["removed"]
+            ROWS_PROCESSED.labels("insert").inc(delta["upserted"] + delta["removed"])
+        else:
+            insert_data(snapshot, snapshot_time = snapshot_time)
+            ROWS_PROCESSED.labels("insert").inc(len(snapshot))
+    # Inserts the whole snapshot, so it only waits for load to keep the two CPU-bound stages
+    # from competing for the GIL; the S3 uploads overlap with both
+    graph.add("insert", insert, after=[cleaned, "load"])
+
+    def retention(_):
+        drop_expired_partitions()
+        return get_snapshot_version()
+    graph.add("retention", retention, after=["insert"])
+    graph.add("spatial", lambda cleaned_data, version: get_spatial_index().build(cleaned_data[0], version),
+              after=[cleaned, "retention"])
+    graph.add("tracks", lambda cleaned_data, _: get_track_store().append(
+        cleaned_data[0], snapshot_time = cleaned_data[1]), after=[cleaned, "insert"])
+    memory_stages = ["spatial", "tracks"]
+    if get_analytics_engine_name() == "memory":
+        graph.add("analytics", lambda cleaned_data, version: get_engine().build(cleaned_data[0], version),
+                  after=[cleaned, "retention"])
+        memory_stages.append("analytics")
+    graph.add("cache", lambda *_: refresh_cache(), after=memory_stages)
+
+    results = graph.run()
+    snapshot, snapshot_time = results[cleaned]
+    if graph.errors:
+        result["stage_errors"] = graph.errors
+    return {
+        "records_inserted": len(snapshot),
+        "snapshot_time": snapshot_time,
+        **result,
+        "stage_timings": stage_timings,
+    }
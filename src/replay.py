@@ -0,0 +1,217 @@
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.transform import clean_data
+from src.db_manager import create_table, create_partitions, insert_data
+from src.upload import get_s3_client, reset_s3_client
+from utils.db_utils import close_pool
+
+RAW_FILE_NAME = "raw_flight_data.json"
+TIMESTAMP_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}$")
+# Suffixes of raw files compressed locally, e.g. after downloading with aws s3 sync
+LOCAL_SUFFIXES = ("", ".gz", ".zst")
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+def parse_s3_url(url):
+    """
+    Split an s3://bucket/prefix URL.
+    Args:
+        url (str): S3 URL, the prefix defaults to "data/".
+    Returns:
+        tuple: The bucket name and the key prefix, ending with "/".
+    """
+    bucket, _, prefix = url[len("s3://"):].partition("/")
+    prefix = prefix or "data/"
+    return bucket, prefix if prefix.endswith("/") else prefix + "/"
+
+def list_snapshots(source, since=None, until=None):
+    """
+    List the archived raw snapshots, stored as {timestamp}/raw_flight_data.json
+    under an S3 prefix as get_flight_data uploads them, or under a local directory
+    with the same layout (optionally gzip or zstd compressed, with a .gz or .zst suffix).
+    Args:
+        source (str): s3://bucket/prefix URL (prefix defaults to "data/") or a local directory.
+        since (str): Earliest UTC timestamp to include, as %Y-%m-%d_%H-%M-%S.
+        until (str): Latest UTC timestamp to include, as %Y-%m-%d_%H-%M-%S.
+    Returns:
+        list: (timestamp, location) pairs, oldest first; the location is an
+              s3:// URL or a local file path.
+    Raises:
+        ValueError: If the local directory does not exist.
+    """
+    snapshots = {}
+    if source.startswith("s3://"):
+        bucket, prefix = parse_s3_url(source)
+        paginator = get_s3_client().get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for item in page.get("Contents", []):
+                timestamp, _, name = item["Key"][len(prefix):].partition("/")
+                if name == RAW_FILE_NAME and TIMESTAMP_PATTERN.match(timestamp):
+                    snapshots[timestamp] = f"s3://{bucket}/{item['Key']}"
+    else:
+        if not os.path.isdir(source):
+            raise ValueError(f"Replay source '{source}' is not a directory or s3:// URL.")
+        for entry in os.scandir(source):
+            if not (entry.is_dir() and TIMESTAMP_PATTERN.match(entry.name)):
+                continue
+            for suffix in LOCAL_SUFFIXES:
+                file_path = os.path.join(entry.path, RAW_FILE_NAME + suffix)
+                if os.path.isfile(file_path):
+                    snapshots[entry.name] = file_path
+                    break
+    return [(timestamp, snapshots[timestamp]) for timestamp in sorted(snapshots)
+            if (since is None or timestamp >= since) and (until is None or timestamp <= until)]
+
+def decode_body(body, content_encoding=None):
+    """
+    Decompress an archived file body. The compression is taken from the
+    Content-Encoding set by upload_file, or recognised from the first bytes
+    for copies that lost it.
+    Args:
+        body (bytes): File body.
+        content_encoding (str): Content-Encoding of the S3 object, if any.
+    Returns:
+        bytes: The decompressed body.
+    Raises:
+        ValueError: If the body is zstd compressed and the zstandard package is not installed.
+    """
+    if content_encoding == "gzip" or body.startswith(GZIP_MAGIC):
+        return gzip.decompress(body)
+    if content_encoding == "zstd" or body.startswith(ZSTD_MAGIC):
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("zstd compressed snapshots require the zstandard package.")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    return body
+
+def read_snapshot(location):
+    """
+    Read an archived raw snapshot.
+    Args:
+        location (str): s3:// URL or local file path, see list_snapshots.
+    Returns:
+        dict: Raw flight data as returned by the OpenSky API.
+    """
+    if location.startswith("s3://"):
+        bucket, _, key = location[len("s3://"):].partition("/")
+        obj = get_s3_client().get_object(Bucket=bucket, Key=key)
+        body = decode_body(obj["Body"].read(), obj.get("ContentEncoding"))
+    else:
+        with open(location, "rb") as raw_file:
+            body = decode_body(raw_file.read())
+    return json.loads(body)
+
+def replay_snapshot(timestamp, location):
+    """
+    Clean an archived raw snapshot and insert it with the bulk loader, replacing
+    the snapshot if it was already stored.
+    Args:
+        timestamp (str): UTC timestamp of the snapshot.
+        location (str): s3:// URL or local file path of the raw snapshot.
+    Returns:
+        dict: The timestamp, number of records inserted and seconds taken.
+    Raises:
+        ValueError: If no flight is left after cleaning.
+    """
+    start = time.perf_counter()
+    cleaned_data, _ = clean_data(read_snapshot(location), timestamp)
+    if cleaned_data.empty:
+        raise ValueError(f"No data available to load in snapshot {timestamp}.")
+    insert_data(cleaned_data, snapshot_time=timestamp)
+    return {"timestamp": timestamp, "records": len(cleaned_data),
+            "seconds": round(time.perf_counter() - start, 4)}
+
+def _init_worker():
+    """Give each worker process its own S3 client; the database pool is already per process."""
+    reset_s3_client()
+
+def replay(snapshots, workers=None, progress=None):
+    """
+    Replay archived snapshots into the database across a pool of processes, each
+    snapshot cleaned and inserted by one worker. Tables and the daily partitions of
+    every snapshot are created first, so workers never race to create them.
+    Failed snapshots are reported and do not stop the others.
+    Args:
+        snapshots (list): (timestamp, location) pairs, see list_snapshots.
+        workers (int): Worker processes. Defaults to the REPLAY_WORKERS environment
+            variable, or the number of CPUs. With 1 the snapshots are replayed in
+            this process.
+        progress (callable): Called with the result of each snapshot as it finishes.
+    Returns:
+        dict: Snapshots replayed, records inserted, seconds taken, snapshots per
+              second and the failed snapshots with their errors.
+    """
+    workers = workers or int(os.getenv("REPLAY_WORKERS", "0")) or os.cpu_count() or 1
+    start = time.perf_counter()
+    create_table()
+    for day in sorted({timestamp[:10] for timestamp, _ in snapshots}):
+        create_partitions(f"{day}_00-00-00")
+
+    results, failures = [], []
+    def finished(timestamp, result=None, error=None):
+        if error is not None:
+            failures.append({"timestamp": timestamp, "error": f"{type(error).__name__}: {error}"})
+            result = failures[-1]
+        else:
+            results.append(result)
+        if progress:
+            progress(result)
+
+    if workers == 1:
+        for timestamp, location in snapshots:
+            try:
+                finished(timestamp, replay_snapshot(timestamp, location))
+            except Exception as e:
+                finished(timestamp, error=e)
+    else:
+        # Forked workers must not inherit, and close on exit, the connections of this process
+        close_pool()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            futures = {executor.submit(replay_snapshot, timestamp, location): timestamp
+                       for timestamp, location in snapshots}
+            for future in as_completed(futures):
+                try:
+                    finished(futures[future], future.result())
+                except Exception as e:
+                    finished(futures[future], error=e)
+
+    seconds = time.perf_counter() - start
+    return {
+        "snapshots": len(results),
+        "records": sum(result["records"] for result in results),
+        "seconds": round(seconds, 4),
+        "snapshots_per_second": round(len(results) / seconds, 2) if seconds else None,
+        "failures": sorted(failures, key=lambda failure: failure["timestamp"]),
+    }
+
+def print_progress(result):
+    """Print one line per replayed or failed snapshot."""
+    if "error" in result:
+        print(f"{result['timestamp']}  FAILED {result['error']}")
+    else:
+        print(f"{result['timestamp']}  {result['records']:>7} records {result['seconds']:>8.2f} s")
+
+def main():
+    parser = argparse.ArgumentParser(description = "Replay archived raw snapshots from S3 or a local directory into the database.")
+    parser.add_argument("source", help = "s3://bucket/prefix (prefix defaults to data/) or a local directory of {timestamp}/raw_flight_data.json")
+    parser.add_argument("--since", help = "earliest snapshot to replay, as YYYY-MM-DD_HH-MM-SS")
+    parser.add_argument("--until", help = "latest snapshot to replay, as YYYY-MM-DD_HH-MM-SS")
+    parser.add_argument("--workers", type = int, help = "worker processes, by default REPLAY_WORKERS or the number of CPUs")
+    args = parser.parse_args()
+
+    snapshots = list_snapshots(args.source, args.since, args.until)
+    print(f"Replaying {len(snapshots)} snapshots from {args.source}")
+    report = replay(snapshots, args.workers, progress=print_progress)
+    print(f"Replayed {report['snapshots']} snapshots ({report['records']} records) in {report['seconds']:.1f} s, "
+          f"{report['snapshots_per_second']} snapshots/s, {len(report['failures'])} failed")
+    sys.exit(1 if report["failures"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import os
+import queue
+import threading
+import datetime
+import traceback
+import uuid
+from collections import OrderedDict
+from psycopg2 import Error as DatabaseError
+from src.metrics import PIPELINE_RUNS, LAST_SUCCESS
+from src.db_manager import create_table
+from utils.db_utils import connect_to_db
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+# Key of the Postgres advisory lock held by the one process polling OpenSky, see PollerLock
+POLLER_LOCK_KEY = 7_356_210_414
+
+class Job:
+    """
+    One ingestion run and its progress.
+    Args:
+        trigger (str): What requested the run, "api" or "schedule".
+    """
+    def __init__(self, trigger):
+        self.id = uuid.uuid4().hex
+        self.trigger = trigger
+        self.status = "queued"
+        self.created_at = datetime.datetime.now(datetime.timezone.utc)
+        self.started_at = None
+        self.finished_at = None
+        self.stage_timings = {}
+        self.result = None
+        self.error = None
+
+    def to_dict(self):
+        """
+        Job details for API responses.
+        Returns:
+            dict: Status, trigger, timestamps, per-stage timings, the values returned
+                  by the pipeline (records inserted, snapshot time, ...) and error.
+        """
+        def isoformat(value):
+            return value.isoformat() if value else None
+        result = {key: value for key, value in (self.result or {}).items() if key != "stage_timings"}
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "trigger": self.trigger,
+            "created_at": isoformat(self.created_at),
+            "started_at": isoformat(self.started_at),
+            "finished_at": isoformat(self.finished_at),
+            "stage_timings": dict(self.stage_timings),
+            "records_inserted": None,
+            "snapshot_time": None,
+            **result,
+            "error": self.error,
+        }
+
+class IngestScheduler:
+    """
+    Runs ingestion jobs on a background worker thread, one at a time.
+    Jobs are enqueued by the API or, when interval is set, by a poller thread every
+    interval seconds. A request made while a job is still waiting in the queue
+    returns that job instead of queueing another one. Only the most recent
+    max_jobs jobs are kept for status lookups.
+    Args:
+        run (callable): Pipeline function taking a stage_timings dict and returning a result dict.
+        interval (float): Seconds between scheduled runs; 0 or None disables the poller.
+        max_jobs (int): Number of jobs kept for status lookups.
+        setup (callable): Run once by the worker before its first job, e.g. to create the
+            database schema. If it raises, the job fails and the next job runs it again.
+        leader (callable): Asked by the poller every interval whether this process should
+            enqueue the scheduled run, e.g. PollerLock.acquire. Defaults to always.
+    """
+    def __init__(self, run, interval=None, max_jobs=100, setup=None, leader=None):
+        self.run = run
+        self.interval = interval
+        self.max_jobs = max_jobs
+        self.setup = setup
+        self.leader = leader
+        self._set_up = setup is None
+        self._jobs = OrderedDict()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker = None
+        self._poller = None
+
+    def start(self):
+        """
+        Start the worker thread, and the poller thread if an interval is set.
+        Calling start on a running scheduler does nothing.
+        Returns:
+            None
+        """
+        with self._lock:
+            self._stop.clear()
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._work, name="ingest-worker", daemon=True)
+                self._worker.start()
+            if self.interval and (self._poller is None or not self._poller.is_alive()):
+                self._poller = threading.Thread(target=self._poll, name="ingest-poller", daemon=True)
+                self._poller.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop the poller and the worker once the running job, if any, has finished.
+        Jobs still queued are cancelled rather than run.
+        Args:
+            timeout (float): Seconds to wait for each thread.
+        Returns:
+            None
+        """
+        self._stop.set()
+        with self._lock:
+            while True:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is not None:
+                    job.status = "cancelled"
+                    job.finished_at = datetime.datetime.now(datetime.timezone.utc)
+            self._queue.put(None)
+        for thread in (self._poller, self._worker):
+            if thread is not None:
+                thread.join(timeout)
+
+    def enqueue(self, trigger="api"):
+        """
+        Queue an ingestion job, starting the worker if needed.
+        Args:
+            trigger (str): What requested the run.
+        Returns:
+            Job: The new job, or the job already waiting in the queue.
+        """
+        self.start()
+        with self._lock:
+            for job in reversed(self._jobs.values()):
+                if job.status == "queued":
+                    return job
+            job = Job(trigger)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        self._queue.put(job)
+        return job
+
+    def get_job(self, job_id):
+        """
+        Look up a job by id.
+        Args:
+            job_id (str): Job id returned by enqueue.
+        Returns:
+            Job: The job, or None if it is unknown or no longer kept.
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            job.status = "running"
+            job.started_at = datetime.datetime.now(datetime.timezone.utc)
+            try:
+                if not self._set_up:
+                    self.setup()
+                    self._set_up = True
+                job.result = self.run(job.stage_timings)
+                job.status = "succeeded"
+                LAST_SUCCESS.set_to_current_time()
+            except Exception as e:
+                traceback.print_exc()
+                job.error = str(e)
+                job.status = "failed"
+            PIPELINE_RUNS.labels(job.status).inc()
+            job.finished_at = datetime.datetime.now(datetime.timezone.utc)
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            if self.leader is None or self.leader():
+                self.enqueue("schedule")
+
+class PollerLock:
+    """
+    Postgres advisory lock electing the one process whose poller enqueues the
+    scheduled runs, so the API processes sharing a database (uvicorn --workers N)
+    poll OpenSky once per interval between them rather than N times. The lock is
+    held by a dedicated connection and released when it closes, e.g. when the
+    process exits, after which the next process to try takes it over.
+    Args:
+        key (int): Advisory lock key.
+        connect (callable): Factory returning a new psycopg2 connection.
+    """
+    def __init__(self, key=POLLER_LOCK_KEY, connect=connect_to_db):
+        self.key = key
+        self.connect = connect
+        self._conn = None
+        self._held = False
+
+    def acquire(self):
+        """
+        Take the lock if no other process holds it, or check that this process still does.
+        Returns:
+            bool: True if this process holds the lock. False if another process does or
+                  the database is unreachable, in which case the next call tries again.
+        """
+        try:
+            if self._conn is None or self._conn.closed:
+                self._conn = self.connect()
+                self._conn.autocommit = True
+                self._held = False
+            with self._conn.cursor() as cur:
+                if self._held:
+                    # The lock lasts as long as the session, so it is held while the connection is alive
+                    cur.execute("SELECT 1;")
+                else:
+                    cur.execute("SELECT pg_try_advisory_lock(%s);", (self.key,))
+                    self._held = cur.fetchone()[0]
+        except DatabaseError:
+            self.release()
+        return self._held
+
+    def release(self):
+        """
+        Release the lock by closing its connection.
+        Returns:
+            None
+        """
+        if self._conn is not None and not self._conn.closed:
+            self._conn.close()
+        self._conn = None
+        self._held = False
+
+def _run_pipeline(stage_timings):
+    """Run pipeline.run_pipeline, importing the ingestion code (pandas, boto3, requests) with the first job."""
+    from src.pipeline import run_pipeline
+    return run_pipeline(stage_timings)
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """
+    Return the process-wide ingestion scheduler running pipeline.run_pipeline,
+    creating it on first use. Its worker creates the database schema once, before
+    the first job. The polling interval is read from INGEST_INTERVAL_SECONDS (0,
+    the default, disables scheduled runs); of the processes sharing the database,
+    only the one holding the PollerLock enqueues them.
+    Returns:
+        IngestScheduler: The shared scheduler.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = IngestScheduler(
+                _run_pipeline,
+                interval=float(os.getenv("INGEST_INTERVAL_SECONDS", "0")),
+                max_jobs=int(os.getenv("INGEST_MAX_JOBS", "100")),
+                setup=create_table,
+                leader=PollerLock().acquire,
+            )
+        return _scheduler
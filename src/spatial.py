@@ -0,0 +1,322 @@
+import os
+import math
+import threading
+import numpy as np
+from src.cache import get_cache
+from src.db_manager import get_aircraft_in_boxes, SPATIAL_DATAFRAME_COLUMNS
+from src.transform import to_float64
+
+# Mean Earth radius (IUGG)
+EARTH_RADIUS_KM = 6371.0088
+# Farthest any two points on Earth can be
+MAX_DISTANCE_KM = math.pi * EARTH_RADIUS_KM
+# First search radius of nearest, multiplied by 4 until enough aircraft are found
+NEAREST_START_RADIUS_KM = 100.0
+
+def haversine_km(lon1, lat1, lon2, lat2):
+    """
+    Great-circle distance between points given in degrees.
+    Args:
+        lon1, lat1 (float | np.ndarray): First point(s).
+        lon2, lat2 (float | np.ndarray): Second point(s).
+    Returns:
+        float | np.ndarray: Distance in kilometres.
+    """
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def split_bbox(min_lon, min_lat, max_lon, max_lat):
+    """
+    Validate a bounding box and split one crossing the antimeridian (min_lon > max_lon)
+    into a box on each side of it.
+    Args:
+        min_lon, min_lat, max_lon, max_lat (float): Corners in degrees.
+    Returns:
+        list: One or two (min_lon, min_lat, max_lon, max_lat) tuples.
+    Raises:
+        ValueError: If a coordinate is out of range or min_lat is above max_lat.
+    """
+    if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+        raise ValueError("Longitudes must be between -180 and 180 degrees.")
+    if not (-90 <= min_lat <= max_lat <= 90):
+        raise ValueError("Latitudes must be between -90 and 90 degrees with min_lat <= max_lat.")
+    if min_lon > max_lon:
+        return [(min_lon, min_lat, 180.0, max_lat), (-180.0, min_lat, max_lon, max_lat)]
+    return [(min_lon, min_lat, max_lon, max_lat)]
+
+def radius_bboxes(lon, lat, radius_km):
+    """
+    Bounding boxes covering every point within radius_km of a point.
+    Args:
+        lon, lat (float): Centre in degrees.
+        radius_km (float): Radius in kilometres.
+    Returns:
+        list: One or two (min_lon, min_lat, max_lon, max_lat) tuples.
+    Raises:
+        ValueError: If the centre is out of range or the radius is negative.
+    """
+    if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+        raise ValueError("Centre must have a longitude between -180 and 180 and a latitude between -90 and 90.")
+    if radius_km < 0:
+        raise ValueError("Radius must not be negative.")
+    angle = radius_km / EARTH_RADIUS_KM
+    min_lat = lat - math.degrees(angle)
+    max_lat = lat + math.degrees(angle)
+    # Circles reaching a pole or half way round the Earth span every longitude
+    if angle >= math.pi / 2 or min_lat <= -90 or max_lat >= 90:
+        return [(-180.0, max(min_lat, -90.0), 180.0, min(max_lat, 90.0))]
+    lon_span = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(lat))))
+    min_lon, max_lon = lon - lon_span, lon + lon_span
+    if min_lon < -180:
+        return split_bbox(min_lon + 360, min_lat, max_lon, max_lat)
+    if max_lon > 180:
+        return split_bbox(min_lon, min_lat, max_lon - 360, max_lat)
+    return [(min_lon, min_lat, max_lon, max_lat)]
+
+class SpatialIndex:
+    """
+    Grid index over the aircraft positions of one snapshot. Aircraft are sorted by
+    the grid cell holding their position, so the aircraft of a run of cells along
+    a row of the grid are one contiguous slice, found through the cell offsets.
+    A box search reads the slices of the cell rows it overlaps and keeps the
+    aircraft actually inside it.
+    Args:
+        df (pd.DataFrame): Cleaned flight data of the snapshot, as returned by load_data.
+        version (str): Snapshot version the index belongs to, see db_manager.get_snapshot_version.
+        cell_degrees (float): Width and height of a grid cell in degrees.
+    """
+    def __init__(self, df, version, cell_degrees=1.0):
+        self.version = version
+        self.cell_degrees = cell_degrees
+        self.columns = math.ceil(360 / cell_degrees)
+        self.rows = math.ceil(180 / cell_degrees)
+
+        df = to_float64(df)
+        lon = df["longitude"].to_numpy(dtype=np.float64)
+        lat = df["latitude"].to_numpy(dtype=np.float64)
+        cells = self._cell_row(lat) * self.columns + self._cell_column(lon)
+        order = np.argsort(cells, kind="stable")
+        self.lon = lon[order]
+        self.lat = lat[order]
+        # Rank of each aircraft by icao24, to order results with an integer sort
+        icao24 = df["icao24"].to_numpy(dtype=object)[order]
+        self.icao24_rank = np.empty(len(icao24), dtype=np.int64)
+        self.icao24_rank[np.argsort(icao24, kind="stable")] = np.arange(len(icao24))
+        # Returned columns as object arrays of Python values, None for missing values;
+        # result tuples are only built for the aircraft found
+        self.values = []
+        for column in SPATIAL_DATAFRAME_COLUMNS:
+            values = df[column].to_numpy(dtype=object)
+            values[df[column].isna().to_numpy()] = None
+            self.values.append(values[order])
+        # offsets[cell] is the position of the first aircraft in that cell or a later one
+        self.offsets = np.searchsorted(cells[order], np.arange(self.rows * self.columns + 1))
+
+    def _cell_column(self, lon):
+        """Grid column of each longitude."""
+        return np.clip(((np.asarray(lon) + 180) // self.cell_degrees).astype(np.int64), 0, self.columns - 1)
+
+    def _cell_row(self, lat):
+        """Grid row of each latitude."""
+        return np.clip(((np.asarray(lat) + 90) // self.cell_degrees).astype(np.int64), 0, self.rows - 1)
+
+    def search(self, boxes):
+        """
+        Find the aircraft inside any of the boxes.
+        Args:
+            boxes (list): (min_lon, min_lat, max_lon, max_lat) tuples not crossing the antimeridian.
+        Returns:
+            np.ndarray: Positions of the aircraft in the index, ordered by icao24.
+        """
+        found = []
+        for min_lon, min_lat, max_lon, max_lat in boxes:
+            first_column, last_column = self._cell_column([min_lon, max_lon])
+            first_row, last_row = self._cell_row([min_lat, max_lat])
+            row_starts = np.arange(first_row, last_row + 1) * self.columns
+            starts = self.offsets[row_starts + first_column]
+            ends = self.offsets[row_starts + last_column + 1]
+            lengths = ends - starts
+            if not lengths.any():
+                continue
+            # Positions of every slice in one array: start of its slice plus the offset within it
+            candidates = (np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+                          + np.arange(lengths.sum()))
+            inside = ((self.lon[candidates] >= min_lon) & (self.lon[candidates] <= max_lon)
+                      & (self.lat[candidates] >= min_lat) & (self.lat[candidates] <= max_lat))
+            found.append(candidates[inside])
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        positions = np.unique(np.concatenate(found)) if len(found) > 1 else found[0]
+        return positions[np.argsort(self.icao24_rank[positions])]
+
+    def records(self, positions):
+        """
+        Returned columns of the aircraft at some positions of the index.
+        Args:
+            positions (np.ndarray): Positions, e.g. returned by search.
+        Returns:
+            list: Tuples of db_manager.SPATIAL_COLUMNS.
+        """
+        return list(zip(*(values[positions] for values in self.values)))
+
+class SpatialIndexHolder:
+    """
+    Holds the SpatialIndex of the latest snapshot ingested by this process. The index is
+    only used for the snapshot version it was built for; other snapshots are searched
+    in Postgres.
+    """
+    def __init__(self):
+        self._index = None
+        self._lock = threading.Lock()
+
+    def build(self, df, version):
+        """
+        Index a newly ingested snapshot and search it from now on. The cell size is
+        read from the SPATIAL_CELL_DEGREES environment variable (default 1 degree).
+        Args:
+            df (pd.DataFrame): Cleaned flight data of the snapshot.
+            version (str): Snapshot version after the ingest.
+        Returns:
+            SpatialIndex: The new index.
+        """
+        index = SpatialIndex(df, version, float(os.getenv("SPATIAL_CELL_DEGREES", "1")))
+        with self._lock:
+            self._index = index
+        return index
+
+    def get(self, version):
+        """
+        Index of a snapshot version.
+        Args:
+            version (str): Current snapshot version.
+        Returns:
+            SpatialIndex: The index, or None if none was built for this version.
+        """
+        index = self._index
+        if index is None or index.version != version:
+            return None
+        return index
+
+    def clear(self):
+        """
+        Drop the index, so every search goes to Postgres.
+        Returns:
+            None
+        """
+        with self._lock:
+            self._index = None
+
+_holder = SpatialIndexHolder()
+
+def get_spatial_index():
+    """
+    Return the process-wide holder of the in-memory spatial index.
+    Returns:
+        SpatialIndexHolder: The shared holder.
+    """
+    return _holder
+
+def _current_index(snapshot_time):
+    """
+    In-memory index to search for a snapshot.
+    Args:
+        snapshot_time (str | datetime): Requested snapshot, None for the latest one.
+    Returns:
+        SpatialIndex: The index of the latest snapshot, or None to search Postgres.
+    """
+    if snapshot_time is not None:
+        return None
+    return get_spatial_index().get(get_cache().version())
+
+def _search(boxes, snapshot_time=None, limit=None, after=None):
+    """
+    Find the aircraft inside any of the boxes, in the in-memory index when it holds
+    the requested snapshot, otherwise in Postgres.
+    Args:
+        boxes (list): (min_lon, min_lat, max_lon, max_lat) tuples not crossing the antimeridian.
+        snapshot_time (str | datetime): Snapshot to search. Defaults to the latest snapshot.
+        limit (int): Maximum number of aircraft returned. Defaults to all.
+        after (str): Only return aircraft with a greater icao24, to fetch the next page.
+    Returns:
+        list: Tuples of db_manager.SPATIAL_COLUMNS ordered by icao24.
+    """
+    index = _current_index(snapshot_time)
+    if index is not None:
+        positions = index.search(boxes)
+        if after is not None:
+            # icao24 is the first returned column, and positions are ordered by it
+            positions = positions[np.searchsorted(index.values[0][positions], after, side="right"):]
+        return index.records(positions[:limit])
+    return get_aircraft_in_boxes(boxes, snapshot_time, limit, after)
+
+def find_in_bbox(min_lon, min_lat, max_lon, max_lat, snapshot_time=None, limit=None, after=None):
+    """
+    Find the aircraft inside a bounding box. A box with min_lon above max_lon
+    crosses the antimeridian.
+    Args:
+        min_lon, min_lat, max_lon, max_lat (float): Corners in degrees, boundaries included.
+        snapshot_time (str | datetime): Snapshot to search. Defaults to the latest snapshot.
+        limit (int): Maximum number of aircraft returned. Defaults to all.
+        after (str): Only return aircraft with a greater icao24, to fetch the next page.
+    Returns:
+        list: Tuples of db_manager.SPATIAL_COLUMNS ordered by icao24.
+    Raises:
+        ValueError: If the box is invalid.
+    """
+    return _search(split_bbox(min_lon, min_lat, max_lon, max_lat), snapshot_time, limit, after)
+
+def find_within_radius(lon, lat, radius_km, snapshot_time=None, limit=None):
+    """
+    Find the aircraft within a great-circle distance of a point, nearest first.
+    Args:
+        lon, lat (float): Centre in degrees.
+        radius_km (float): Radius in kilometres.
+        snapshot_time (str | datetime): Snapshot to search. Defaults to the latest snapshot.
+        limit (int): Maximum number of aircraft returned. Defaults to all.
+    Returns:
+        list: Tuples of db_manager.SPATIAL_COLUMNS followed by the distance in km,
+              ordered by distance and icao24.
+    Raises:
+        ValueError: If the centre or radius is invalid.
+    """
+    boxes = radius_bboxes(lon, lat, radius_km)
+    index = _current_index(snapshot_time)
+    if index is not None:
+        positions = index.search(boxes)
+        distances = haversine_km(lon, lat, index.lon[positions], index.lat[positions])
+    else:
+        records = get_aircraft_in_boxes(boxes, snapshot_time)
+        # longitude and latitude are the 4th and 5th spatial columns
+        distances = haversine_km(lon, lat, np.array([record[3] for record in records], dtype=np.float64),
+                                 np.array([record[4] for record in records], dtype=np.float64))
+    within = np.flatnonzero(distances <= radius_km)
+    within = within[np.argsort(distances[within], kind="stable")][:limit]
+    if index is not None:
+        records = index.records(positions[within])
+    else:
+        records = [records[position] for position in within]
+    return [record + (round(float(distance), 3),) for record, distance in zip(records, distances[within])]
+
+def find_nearest(lon, lat, k, snapshot_time=None):
+    """
+    Find the k aircraft nearest to a point by searching ever larger radii until
+    k aircraft are within the radius or the whole Earth has been searched.
+    Args:
+        lon, lat (float): Point in degrees.
+        k (int): Number of aircraft.
+        snapshot_time (str | datetime): Snapshot to search. Defaults to the latest snapshot.
+    Returns:
+        list: Tuples of db_manager.SPATIAL_COLUMNS followed by the distance in km, nearest first.
+    Raises:
+        ValueError: If the point is invalid or k is not positive.
+    """
+    if k < 1:
+        raise ValueError("k must be at least 1.")
+    radius_km = NEAREST_START_RADIUS_KM
+    while True:
+        found = find_within_radius(lon, lat, radius_km, snapshot_time)
+        if len(found) >= k or radius_km >= MAX_DISTANCE_KM:
+            return found[:k]
+        radius_km = min(radius_km * 4, MAX_DISTANCE_KM)
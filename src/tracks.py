@@ -0,0 +1,212 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from src.db_manager import to_snapshot_time
+from src.responses import dumps
+
+# Fields of a track point, in the order they are returned
+TRACK_FIELDS = ["time", "longitude", "latitude", "baro_altitude", "ground_speed", "heading"]
+# Stored fields after time, the DataFrame columns they come from and the decimals they are returned with.
+# float32 keeps about 7 significant digits, i.e. about 1 m of position
+VALUE_FIELDS = ["longitude", "latitude", "baro_altitude", "ground_speed", "heading"]
+VALUE_COLUMNS = ["longitude", "latitude", "baro_altitude", "velocity", "true_track"]
+VALUE_SCALES = 10.0 ** np.array([5, 5, 1, 2, 2])
+
+class TrackStore:
+    """
+    Recent positions of every aircraft, keyed by icao24, in fixed-size ring buffers.
+    All buffers live in a few preallocated arrays with one row (slot) per aircraft:
+    point times as uint32 epoch seconds and the other fields as float32, i.e. 24
+    bytes per point. Each aircraft owns a slot while it keeps being seen; aircraft
+    not seen for ttl_seconds give their slot back for reuse. The arrays double in
+    size when every slot is taken.
+    Args:
+        track_length (int): Points kept per aircraft; older points are overwritten.
+        ttl_seconds (int): Seconds after its last point an aircraft is dropped.
+        initial_slots (int): Aircraft the arrays are first sized for.
+    """
+    def __init__(self, track_length=120, ttl_seconds=3600, initial_slots=1024):
+        self.track_length = track_length
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._free = []
+        self._times = np.zeros((0, track_length), dtype=np.uint32)
+        self._values = np.zeros((0, track_length, len(VALUE_FIELDS)), dtype=np.float32)
+        self._heads = np.zeros(0, dtype=np.int32)
+        self._counts = np.zeros(0, dtype=np.int32)
+        self._last_times = np.zeros(0, dtype=np.uint32)
+        self._grow(initial_slots)
+
+    def _grow(self, slots):
+        """Enlarge the arrays to hold at least slots aircraft."""
+        old = len(self._heads)
+        new = max(slots, old * 2)
+        def resize(array):
+            grown = np.zeros((new,) + array.shape[1:], dtype=array.dtype)
+            grown[:old] = array
+            return grown
+        self._times = resize(self._times)
+        self._values = resize(self._values)
+        self._heads = resize(self._heads)
+        self._counts = resize(self._counts)
+        self._last_times = resize(self._last_times)
+        self._free.extend(range(new - 1, old - 1, -1))
+
+    def append(self, df, snapshot_time=None):
+        """
+        Append the position of every aircraft of a snapshot to its track. The point time
+        is time_position, or last_contact when it is missing; a point no newer than the
+        last one of the track is skipped, so an aircraft OpenSky has not heard from since
+        the previous fetch does not repeat its position. Points more than ttl_seconds
+        before the snapshot are ignored, and aircraft not seen for ttl_seconds are dropped.
+        Args:
+            df (pd.DataFrame): Cleaned flight data of the snapshot, as returned by load_data.
+            snapshot_time (str | datetime): Time of the snapshot, see db_manager.to_snapshot_time.
+                Defaults to the latest point time of the snapshot.
+        Returns:
+            dict: Number of points appended and aircraft dropped.
+        """
+        times = df["time_position"].fillna(df["last_contact"])
+        valid = times.notna().to_numpy()
+        times = times[valid].to_numpy(dtype="datetime64[s]").astype(np.int64)
+        if snapshot_time is None:
+            now = int(times.max()) if len(times) else 0
+        else:
+            now = int(pd.Timestamp(to_snapshot_time(snapshot_time)).timestamp())
+        recent = times >= now - self.ttl_seconds
+        times = times[recent].astype(np.uint32)
+        icao24 = df["icao24"].to_numpy(dtype=object)[valid][recent]
+        values = df[VALUE_COLUMNS].to_numpy(dtype=np.float32, na_value=np.nan)[valid][recent]
+
+        with self._lock:
+            slots = np.empty(len(icao24), dtype=np.int64)
+            for position, key in enumerate(icao24):
+                slot = self._slots.get(key)
+                if slot is None:
+                    if not self._free:
+                        self._grow(len(self._heads) + 1)
+                    slot = self._free.pop()
+                    self._slots[key] = slot
+                    self._counts[slot] = 0
+                    self._heads[slot] = 0
+                    self._last_times[slot] = 0
+                slots[position] = slot
+
+            # Only points newer than the track's last one, and one point per aircraft
+            newer = times > self._last_times[slots]
+            slots, times, values = slots[newer], times[newer], values[newer]
+            slots, first = np.unique(slots[::-1], return_index=True)
+            last = len(times) - 1 - first
+            times, values = times[last], values[last]
+
+            heads = self._heads[slots]
+            self._times[slots, heads] = times
+            self._values[slots, heads] = values
+            self._heads[slots] = (heads + 1) % self.track_length
+            self._counts[slots] = np.minimum(self._counts[slots] + 1, self.track_length)
+            self._last_times[slots] = times
+
+            expired = [key for key, slot in self._slots.items()
+                       if now - int(self._last_times[slot]) > self.ttl_seconds]
+            for key in expired:
+                self._free.append(self._slots.pop(key))
+        return {"points": len(slots), "expired": len(expired)}
+
+    def _points(self, slot):
+        """Points of the track in a slot, oldest first, as lists of TRACK_FIELDS."""
+        count = self._counts[slot]
+        order = (self._heads[slot] - count + np.arange(count)) % self.track_length
+        times = self._times[slot, order].astype(np.int64)
+        values = self._values[slot, order].astype(np.float64)
+        values = np.round(values * VALUE_SCALES) / VALUE_SCALES
+        if not np.isnan(values).any():
+            return [[point_time] + row for point_time, row in zip(times.tolist(), values.tolist())]
+        # NaN != NaN: missing values are returned as None
+        return [[point_time] + [None if value != value else value for value in row]
+                for point_time, row in zip(times.tolist(), values.tolist())]
+
+    def track(self, icao24):
+        """
+        Recent track of one aircraft.
+        Args:
+            icao24 (str): ICAO 24-bit address of the aircraft.
+        Returns:
+            list: Points as [time, longitude, latitude, baro_altitude, ground_speed, heading],
+                  oldest first, with time in epoch seconds; None if the aircraft has no track.
+        """
+        with self._lock:
+            slot = self._slots.get(icao24)
+            if slot is None:
+                return None
+            return self._points(slot)
+
+    def iter_ndjson(self, batch_size=1000):
+        """
+        Export every track as JSON Lines, one {"icao24": ..., "points": [...]} object
+        per aircraft. The lock is only held while a batch of tracks is copied, so
+        ingest is not blocked for the whole export.
+        Args:
+            batch_size (int): Tracks copied per batch.
+        Returns:
+            generator: Lines of JSON as bytes, each ending with a newline.
+        """
+        with self._lock:
+            keys = list(self._slots)
+        for start in range(0, len(keys), batch_size):
+            with self._lock:
+                batch = [(key, self._points(self._slots[key]))
+                         for key in keys[start:start + batch_size] if key in self._slots]
+            for key, points in batch:
+                yield dumps({"icao24": key, "points": points}) + b"\n"
+
+    def clear(self):
+        """
+        Drop every track.
+        Returns:
+            None
+        """
+        with self._lock:
+            self._free.extend(self._slots.values())
+            self._slots.clear()
+
+    def stats(self):
+        """
+        Track store statistics for monitoring.
+        Returns:
+            dict: Aircraft tracked, slots allocated, points stored, bytes of the
+                  arrays, and bytes per tracked aircraft.
+        """
+        with self._lock:
+            aircraft = len(self._slots)
+            array_bytes = sum(array.nbytes for array in (self._times, self._values, self._heads,
+                                                          self._counts, self._last_times))
+            return {
+                "aircraft": aircraft,
+                "slots": len(self._heads),
+                "track_length": self.track_length,
+                "points": int(sum(self._counts[slot] for slot in self._slots.values())),
+                "array_bytes": array_bytes,
+                "bytes_per_aircraft": round(array_bytes / aircraft) if aircraft else None,
+            }
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_track_store():
+    """
+    Return the process-wide track store, creating it on first use. Its size is read
+    from TRACK_LENGTH (points per aircraft, default 120) and TRACK_TTL_SECONDS
+    (default 3600).
+    Returns:
+        TrackStore: The shared store.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TrackStore(
+                track_length=int(os.getenv("TRACK_LENGTH", "120")),
+                ttl_seconds=int(os.getenv("TRACK_TTL_SECONDS", "3600")),
+            )
+        return _store
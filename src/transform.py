@@ -1,59 +1,202 @@
+import os
 import pandas as pd
 
-def clean_data(raw_data, timestamp):
+# Columns from OpenSky documentation: https://openskynetwork.github.io/opensky-api/rest.html
+COLUMNS = ["icao24", "callsign", "origin_country", "time_position",
+           "last_contact", "longitude", "latitude", "baro_altitude",
+           "on_ground", "velocity", "true_track", "vertical_rate",
+           "sensors", "geo_altitude", "squawk", "spi", "position_source"]
+
+# Unit conversions applied to the telemetry columns, rounded to 4 decimal places
+UNIT_CONVERSIONS = pd.Series({
+    "velocity": 1.944,          # m/s to knots
+    "vertical_rate": 196.8504,  # m/s to feet/min
+    "baro_altitude": 3.281,     # metres to feet
+    "geo_altitude": 3.281,      # metres to feet
+})
+# Numeric columns, kept as float64 with NaN for missing values
+FLOAT_COLUMNS = ["time_position", "last_contact", "longitude", "latitude", "baro_altitude",
+                 "velocity", "true_track", "vertical_rate", "geo_altitude"]
+
+# "standard" keeps strings as str and numbers as float64, "compact" stores repeated
+# strings as categoricals, telemetry as float32 and flags as nullable booleans
+SCHEMA_MODES = ("standard", "compact")
+CATEGORY_COLUMNS = ["origin_country", "squawk"]
+FLOAT32_COLUMNS = ["longitude", "latitude", "baro_altitude", "velocity", "true_track",
+                   "vertical_rate", "geo_altitude"]
+BOOLEAN_COLUMNS = ["on_ground", "spi"]
+# Decimals of the telemetry kept by clean_data, restored when float32 values are widened
+FLOAT32_DECIMALS = 4
+
+# ICAO taxi speed < 30 knots (15.43m/s); slower aircraft are stationary or taxiing
+MIN_GROUND_SPEED_KNOTS = 16
+
+def _to_float(df):
+    """
+    Convert untyped columns to float64, with NaN for missing values.
+    Values that are not numbers are coerced to NaN, on a slower path.
+    Args:
+        df (pd.DataFrame): Columns of raw values.
+    Returns:
+        pd.DataFrame: float64 columns.
+    """
+    try:
+        return df.astype("float64")
+    except (TypeError, ValueError):
+        return df.apply(pd.to_numeric, errors="coerce").astype("float64")
+
+def get_schema_mode():
+    """
+    Schema of the cleaned DataFrames, read from the DATAFRAME_SCHEMA environment variable.
+    Returns:
+        str: One of SCHEMA_MODES, "standard" by default.
+    Raises:
+        ValueError: If the schema is not one of SCHEMA_MODES.
+    """
+    schema = os.getenv("DATAFRAME_SCHEMA", "standard")
+    if schema not in SCHEMA_MODES:
+        raise ValueError(f"Unknown DataFrame schema '{schema}', expected one of {SCHEMA_MODES}.")
+    return schema
+
+def to_compact(df):
+    """
+    Convert cleaned flight data to the compact schema: CATEGORY_COLUMNS as categoricals,
+    FLOAT32_COLUMNS as float32 and BOOLEAN_COLUMNS as nullable booleans, on a fresh
+    integer index. float32 keeps about 7 significant digits, i.e. under 2 m of position
+    and under 1 cm of altitude.
+    Args:
+        df (pd.DataFrame): Cleaned flight data.
+    Returns:
+        pd.DataFrame: The compact DataFrame.
+    """
+    return df.reset_index(drop=True).astype({
+        **dict.fromkeys(CATEGORY_COLUMNS, "category"),
+        **dict.fromkeys(FLOAT32_COLUMNS, "float32"),
+        **dict.fromkeys(BOOLEAN_COLUMNS, "boolean"),
+    })
+
+def to_float64(df):
+    """
+    Widen the float32 columns of a compact DataFrame to float64, rounded to
+    FLOAT32_DECIMALS, so they are written as the decimals clean_data kept rather
+    than as the binary expansion of the float32 value (1234.5677 and not
+    1234.5677490234375). Other DataFrames are returned unchanged.
+    Args:
+        df (pd.DataFrame): Cleaned flight data.
+    Returns:
+        pd.DataFrame: The DataFrame without float32 columns.
+    """
+    columns = [column for column, dtype in df.dtypes.items() if dtype == "float32"]
+    if not columns:
+        return df
+    return df.astype(dict.fromkeys(columns, "float64")).round(dict.fromkeys(columns, FLOAT32_DECIMALS))
+
+def clean_data(raw_data, timestamp, schema=None):
     """
     Clean and transform the raw flight data from OpenSky API.
+    Rows are filtered before anything is converted: the state rows are loaded as
+    untyped columns, flights on the ground, without a position, below
+    MIN_GROUND_SPEED_KNOTS or without a callsign are dropped, and only then are the
+    remaining rows typed and the telemetry units converted in one vectorised pass.
+    Numeric columns are float64 with NaN for missing values, or with the compact
+    schema float32, see to_compact.
     Args:
         raw_data (dict): Raw flight data from OpenSky API.
         timestamp (str): UTC timestamp of the data retrieval.
+        schema (str): One of SCHEMA_MODES. Defaults to get_schema_mode().
     Returns:
         tuple: A tuple containing the cleaned flight data as a DataFrame 
         and the UTC timestamp.
+    Raises:
+        ValueError: If the schema is not one of SCHEMA_MODES.
     """
-    flight_data = raw_data.get("states", [])
-
-    # Columns from OpenSky documentation: https://openskynetwork.github.io/opensky-api/rest.html
-    columns = ["icao24", "callsign", "origin_country", "time_position", 
-                "last_contact", "longitude", "latitude", "baro_altitude", 
-                "on_ground", "velocity", "true_track", "vertical_rate", 
-                "sensors", "geo_altitude", "squawk", "spi", "position_source"]
-    df = pd.DataFrame(flight_data, columns = columns)
+    schema = get_schema_mode() if schema is None else schema
+    if schema not in SCHEMA_MODES:
+        raise ValueError(f"Unknown DataFrame schema '{schema}', expected one of {SCHEMA_MODES}.")
+    flight_data = raw_data.get("states") or []
+    # Type inference is deferred until the rows to keep are known
+    df = pd.DataFrame(flight_data, columns = COLUMNS, dtype = object)
 
-    # Ensure callsigns are strings and replace missing values with "UNKNOWN" 
-    df["callsign"] = df["callsign"].fillna("").astype(str).str.strip()
-    df["callsign"] = df["callsign"].replace({"nan": "UNKNOWN", "": "UNKNOWN"})
+    # Keep airborne flights with a position (longitude, latitude) moving faster than taxiing speed
+    position = _to_float(df[["longitude", "latitude", "velocity"]])
+    velocity = (position["velocity"] * UNIT_CONVERSIONS["velocity"]).round(4)
+    keep = (df["on_ground"] == False) & position["longitude"].notna() & position["latitude"].notna() \
+        & (velocity > MIN_GROUND_SPEED_KNOTS)
 
-    # Replace missing squawk with None.
-    df["squawk"] = df["squawk"].where(pd.notna(df["squawk"]), None)
+    # Ensure callsigns are strings and remove flights without one (missing or blank)
+    callsign = df["callsign"].fillna("").astype(str).str.strip()
+    keep &= ~callsign.isin(["", "nan", "UNKNOWN"])
+    df = df[keep]
 
-    # Drop rows where essential data is missing (longitude, latitude)
-    df = df.dropna(subset = ["longitude", "latitude"])
-
-    # Convert velocity & altitude fields to numeric
-    df["velocity"] = pd.to_numeric(df["velocity"], errors="coerce").where(pd.notna(df["velocity"]), None)
-    df["baro_altitude"] = pd.to_numeric(df["baro_altitude"], errors="coerce").where(pd.notna(df["baro_altitude"]), None)
-    df["geo_altitude"] = pd.to_numeric(df["geo_altitude"], errors="coerce").where(pd.notna(df["geo_altitude"]), None)
+    # Type the remaining rows and convert velocity to knots, vertical_rate to feet/min
+    # and altitudes to feet in one pass
+    numeric = _to_float(df[FLOAT_COLUMNS])
+    telemetry = UNIT_CONVERSIONS.index
+    numeric[telemetry] = (numeric[telemetry] * UNIT_CONVERSIONS).round(4)
+    others = df[[column for column in COLUMNS if column not in FLOAT_COLUMNS and column != "callsign"]]
+    df = pd.concat([others.infer_objects(), numeric, callsign[keep]], axis = 1)[COLUMNS]
 
     # Convert Unix timestamp to Datetime format
     df["time_position"] = pd.to_datetime(df["time_position"], unit="s")
     df["last_contact"] = pd.to_datetime(df["last_contact"], unit="s")
 
-    # Convert velocity unit from m/s to knots
-    df["velocity"] = (df["velocity"] * 1.944).round(4)
-    # Convert vertical_rate unit from m/s to feet/min
-    df["vertical_rate"] = (df["vertical_rate"] * 196.8504).round(4)
+    if schema == "compact":
+        df = to_compact(df)
+    return (df, timestamp)
 
-    # Convert altitude units from metres to feet
-    df["baro_altitude"] = (df["baro_altitude"] * 3.281).round(4)
-    df["geo_altitude"] = (df["geo_altitude"] * 3.281).round(4)
+def clean_batches(batches, schema=None):
+    """
+    Clean raw flight data arriving in batches of OpenSky state rows, so the raw
+    rows of only one batch are held in memory at a time.
+    Args:
+        batches (iterable): Iterable of lists of raw state rows.
+        schema (str): One of SCHEMA_MODES. Defaults to get_schema_mode().
+    Returns:
+        pd.DataFrame: The cleaned flight data of all batches.
+    """
+    schema = get_schema_mode() if schema is None else schema
+    frames = [clean_data({"states": batch}, None, schema)[0] for batch in batches]
+    if not frames:
+        return clean_data({"states": []}, None, schema)[0]
+    df = pd.concat(frames, ignore_index=True)
+    # Categoricals of batches with different categories are concatenated as strings
+    return to_compact(df) if schema == "compact" else df
 
-    # Filter out flights that are on the ground (we want airborne flights only)
-    df = df[df["on_ground"] == False]
+def clean_flight_stream(stream):
+    """
+    Clean the raw flight data of a fetch.FlightDataStream.
+    Args:
+        stream (FlightDataStream): Stream returned by fetch.stream_flight_data.
+    Returns:
+        tuple: A tuple containing the cleaned flight data as a DataFrame
+        and the UTC timestamp.
+    """
+    df = clean_batches(stream)
+    return (df, stream.timestamp)
 
-    # Remove stationary or taxiing aircraft (ICAO taxi speed < 30 knots (15.43m/s))
-    df = df[df["velocity"] > 16]
+def diff_snapshots(previous, current):
+    """
+    Compare a snapshot with the previous one by icao24. An aircraft has changed when it
+    is new or its time_position or last_contact differs, i.e. OpenSky received a new
+    position or message from it; aircraft of the previous snapshot missing from the
+    new one have disappeared. An aircraft listed twice keeps its latest row.
+    Args:
+        previous (pd.DataFrame): icao24, time_position and last_contact of the
+            aircraft in the previous snapshot.
+        current (pd.DataFrame): Cleaned flight data of the new snapshot.
+    Returns:
+        tuple: A DataFrame with the rows of current for the new and changed aircraft,
+        and a list of the icao24 of the aircraft that disappeared.
+    """
+    current = current.sort_values("last_contact", kind="stable").drop_duplicates("icao24", keep="last")
+    before = previous.drop_duplicates("icao24").set_index("icao24").reindex(current["icao24"])
 
-    # Remove flights with invalid callsigns (just 'UNKNOWN' or empty)
-    df = df[df["callsign"] != "UNKNOWN"]
+    changed = ~current["icao24"].isin(previous["icao24"]).to_numpy()
+    for column in ["time_position", "last_contact"]:
+        new_values = current[column].reset_index(drop=True)
+        old_values = before[column].reset_index(drop=True)
+        same = (new_values == old_values) | (new_values.isna() & old_values.isna())
+        changed |= ~same.to_numpy()
 
-    return (df, timestamp)
\ No newline at end of file
+    removed = previous.loc[~previous["icao24"].isin(current["icao24"]), "icao24"].tolist()
+    return (current[changed].sort_index(), removed)
@@ -0,0 +1,160 @@
+import os
+import gzip
+import time
+import shutil
+import threading
+import boto3
+from boto3.s3.transfer import TransferConfig
+from concurrent.futures import ThreadPoolExecutor
+from src.metrics import S3_UPLOAD_BYTES, S3_UPLOAD_SECONDS, S3_UPLOAD_ERRORS
+
+COMPRESSIONS = ("none", "gzip", "zstd")
+# File extension and Content-Encoding of each compression
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+# Formats compressed internally, uploaded as they are
+PRECOMPRESSED_EXTENSIONS = {".parquet"}
+CONTENT_TYPES = {".json": "application/json", ".jsonl": "application/x-ndjson",
+                 ".csv": "text/csv", ".parquet": "application/vnd.apache.parquet"}
+
+# Files above the threshold are uploaded in parts, several parts at a time
+TRANSFER_CONFIG = TransferConfig(multipart_threshold=8 * 1024 * 1024,
+                                 multipart_chunksize=8 * 1024 * 1024,
+                                 max_concurrency=4)
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_s3_client():
+    """
+    Return the S3 client shared by every upload in the process, creating it on first use.
+    boto3 clients are thread-safe, so one client serves all upload threads.
+    S3_ENDPOINT_URL points the client at a local S3 stand-in (e.g. moto or MinIO).
+    Returns:
+        botocore.client.S3: The shared S3 client.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = boto3.client("s3", endpoint_url=os.getenv("S3_ENDPOINT_URL") or None)
+        return _client
+
+def reset_s3_client():
+    """
+    Drop the shared S3 client so the next upload creates a new one,
+    e.g. after the credentials or endpoint changed.
+    Returns:
+        None
+    """
+    global _client
+    with _client_lock:
+        _client = None
+
+def compress_file(file_path, compression):
+    """
+    Write a compressed copy of a file next to it.
+    Args:
+        file_path (str): File to compress.
+        compression (str): "gzip" or "zstd".
+    Returns:
+        str: Path of the compressed copy.
+    Raises:
+        ValueError: If zstd is requested but the zstandard package is not installed.
+    """
+    compressed_path = file_path + COMPRESSION_SUFFIXES[compression]
+    with open(file_path, "rb") as source:
+        if compression == "gzip":
+            with gzip.open(compressed_path, "wb", compresslevel=6) as target:
+                shutil.copyfileobj(source, target, length=1024 * 1024)
+        else:
+            try:
+                import zstandard
+            except ImportError:
+                raise ValueError("zstd compression requires the zstandard package.")
+            with open(compressed_path, "wb") as target:
+                zstandard.ZstdCompressor(level=3).copy_stream(source, target)
+    return compressed_path
+
+def upload_file(file_path, key, bucket_name, compression="none"):
+    """
+    Upload one file to S3, compressed with the matching Content-Encoding if requested.
+    The object keeps the key it would have uncompressed. Files in formats with their
+    own compression (PRECOMPRESSED_EXTENSIONS) are uploaded as they are.
+    Args:
+        file_path (str): Local file to upload.
+        key (str): S3 object key.
+        bucket_name (str): S3 bucket name.
+        compression (str): One of COMPRESSIONS.
+    Returns:
+        dict: The key, original and uploaded sizes in bytes, Content-Encoding and seconds taken.
+    """
+    start = time.perf_counter()
+    extra_args = {}
+    extension = os.path.splitext(file_path)[1]
+    if extension in PRECOMPRESSED_EXTENSIONS:
+        compression = "none"
+    content_type = CONTENT_TYPES.get(extension)
+    if content_type:
+        extra_args["ContentType"] = content_type
+
+    upload_path = file_path
+    if compression != "none":
+        upload_path = compress_file(file_path, compression)
+        extra_args["ContentEncoding"] = compression
+    try:
+        get_s3_client().upload_file(
+            Filename = upload_path,
+            Bucket = bucket_name,
+            Key = key,
+            ExtraArgs = extra_args,
+            Config = TRANSFER_CONFIG
+        )
+        uploaded_bytes = os.path.getsize(upload_path)
+    finally:
+        if upload_path != file_path:
+            os.remove(upload_path)
+
+    return {
+        "key": key,
+        "bytes": os.path.getsize(file_path),
+        "uploaded_bytes": uploaded_bytes,
+        "content_encoding": extra_args.get("ContentEncoding"),
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+
+def upload_artifacts(artifacts, bucket_name=None, compression=None, max_workers=None):
+    """
+    Upload several files to S3 concurrently with the shared client.
+    Args:
+        artifacts (list): (file path, S3 key) pairs.
+        bucket_name (str): S3 bucket name. Defaults to the S3_DATA_BUCKET environment variable.
+        compression (str): One of COMPRESSIONS. Defaults to the S3_UPLOAD_COMPRESSION
+            environment variable, or "gzip".
+        max_workers (int): Concurrent uploads. Defaults to the S3_UPLOAD_WORKERS
+            environment variable, or 4.
+    Returns:
+        list: One report per artifact, in input order; see upload_file.
+    Raises:
+        ValueError: If the compression is not one of COMPRESSIONS.
+    """
+    bucket_name = bucket_name or os.getenv("S3_DATA_BUCKET", "opensky-dev-data")
+    compression = compression or os.getenv("S3_UPLOAD_COMPRESSION", "gzip")
+    max_workers = max_workers or int(os.getenv("S3_UPLOAD_WORKERS", "4"))
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression '{compression}', expected one of {COMPRESSIONS}.")
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, max(len(artifacts), 1))) as executor:
+        futures = [executor.submit(upload_file, file_path, key, bucket_name, compression)
+                   for file_path, key in artifacts]
+        reports = []
+        for (file_path, _), future in zip(artifacts, futures):
+            try:
+                reports.append(future.result())
+            except Exception as e:
+                S3_UPLOAD_ERRORS.labels(os.path.basename(file_path), type(e).__name__).inc()
+                raise
+
+    for (file_path, _), report in zip(artifacts, reports):
+        file_name = os.path.basename(file_path)
+        S3_UPLOAD_BYTES.labels(file_name).inc(report["uploaded_bytes"])
+        S3_UPLOAD_SECONDS.labels(file_name).observe(report["seconds"])
+    return reports
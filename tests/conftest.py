@@ -0,0 +1,64 @@
+import os
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import boto3
+import pytest
+from moto import mock_aws
+from src.upload import reset_s3_client
+
+S3_TEST_BUCKET = "opensky-test-data"
+
+@pytest.fixture
+def s3(monkeypatch):
+    """Fixture to provide a mocked S3 bucket used as S3_DATA_BUCKET, and a fresh shared client."""
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("S3_DATA_BUCKET", S3_TEST_BUCKET)
+    monkeypatch.delenv("S3_ENDPOINT_URL", raising=False)
+    with mock_aws():
+        reset_s3_client()
+        client = boto3.client("s3")
+        client.create_bucket(Bucket=S3_TEST_BUCKET)
+        yield client
+    reset_s3_client()
+
+with open(os.path.join("data", "raw_flight_data.json"), "rb") as sample_file:
+    SAMPLE_PAYLOAD = sample_file.read()
+
+class MockOpenSkyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+        server.requests.append({"path": url.path, "params": parse_qs(url.query), "headers": dict(self.headers),
+                                "port": self.client_address[1]})
+        status, headers, body = server.responses.pop(0) if server.responses else (200, {}, SAMPLE_PAYLOAD)
+        if status == 200 and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            headers = {**headers, "Content-Encoding": "gzip"}
+        server.bytes_sent += len(body)
+        self.send_response(status)
+        for name, value in {"Content-Type": "application/json", **headers}.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def mock_opensky():
+    """Fixture to serve the bundled raw payload, or queued responses, as a local OpenSky API."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockOpenSkyHandler)
+    server.requests, server.responses, server.bytes_sent = [], [], 0
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/api"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,129 @@
+import os
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+import pytest
+from src.analytics import SnapshotAggregates, AnalyticsEngine, get_engine, get_query_result
+from src.cache import ANALYTICS_QUERIES, get_cache
+from src.db_manager import (create_table, drop_table, insert_data, get_snapshot_version, FLIGHT_COUNTS_SQL,
+                            GROUND_SPEED_RANGE_SQL)
+from utils.db_utils import db_cursor
+
+@pytest.fixture(scope="module")
+def sample_data():
+    """Fixture to read the bundled cleaned flight data sample."""
+    return pd.read_csv(os.path.join("data", "cleaned_flight_data.csv"),
+                       dtype={"icao24": str, "callsign": str, "squawk": str},
+                       parse_dates=["time_position", "last_contact"])
+
+@pytest.fixture
+def ingested(sample_data):
+    """Fixture to ingest the sample as the latest snapshot and build its aggregates."""
+    drop_table()
+    create_table()
+    insert_data(sample_data, snapshot_time="2025-05-18_18-44-48")
+    get_cache().invalidate()
+    get_engine().build(sample_data, get_snapshot_version())
+    yield
+    get_engine().clear()
+
+def linguistic_collation(cur):
+    """
+    Name of a collation ordering "Côte" before "Czech", like the en_US.utf8 default of the
+    postgres image, or None if the server has none (e.g. a build without ICU and locales).
+    """
+    for collation in ("en_US.utf8", "en_US", "en-US-x-icu", "und-x-icu", "unicode"):
+        try:
+            cur.execute(f"""SELECT 'Côte' < 'Czech' COLLATE "{collation}";""")
+            if cur.fetchone()[0]:
+                return collation
+        except Exception:
+            pass
+        cur.connection.rollback()
+    return None
+
+class TestSnapshotAggregates:
+    @pytest.mark.parametrize("name", list(ANALYTICS_QUERIES))
+    def test_aggregates_match_postgres(self, sample_data, ingested, name):
+        assert get_engine().get(name, get_snapshot_version()) == ANALYTICS_QUERIES[name]()
+
+    @pytest.mark.parametrize("name", list(ANALYTICS_QUERIES))
+    def test_aggregates_of_non_ascii_countries_match_postgres(self, sample_data, name):
+        snapshot = sample_data.head(6).assign(
+            origin_country=["Czech Republic", "Côte d'Ivoire", "Canada", "Czech Republic", "Côte d'Ivoire", "Åland"])
+        drop_table()
+        create_table()
+        insert_data(snapshot, snapshot_time="2025-05-18_18-44-48")
+        assert SnapshotAggregates(snapshot, "v1").results[name] == ANALYTICS_QUERIES[name]()
+
+    @pytest.mark.parametrize("template, name", [
+        (FLIGHT_COUNTS_SQL, "flight-counts-by-origin-country"),
+        (GROUND_SPEED_RANGE_SQL, "fastest-and-slowest-ground-speed-by-origin-country"),
+    ])
+    def test_non_ascii_countries_sort_alike_under_a_linguistic_collation(self, template, name):
+        df = pd.DataFrame({
+            "origin_country": ["Czech Republic", "Côte d'Ivoire", "Canada", "Czech Republic", "Côte d'Ivoire"],
+            "velocity": [210.0, 180.0, 240.0, 190.0, 200.0],
+            "squawk": [None] * 5,
+        })
+        with db_cursor() as cur:
+            collation = linguistic_collation(cur)
+            if collation is None:
+                pytest.skip("no linguistic collation is available in this Postgres build")
+            cur.execute(f"""
+                CREATE TEMP TABLE countries (origin_country VARCHAR(50) COLLATE "{collation}",
+                                             ground_speed DOUBLE PRECISION);
+            """)
+            cur.executemany("INSERT INTO countries VALUES (%s, %s);",
+                            df[["origin_country", "velocity"]].itertuples(index=False))
+            cur.execute(template.format(table="countries", condition="TRUE"))
+            expected = cur.fetchall()
+        assert SnapshotAggregates(df, "v1").results[name] == expected
+
+    def test_aggregates_handle_missing_values(self):
+        df = pd.DataFrame({
+            "origin_country": ["France", "France", "Spain", None],
+            "velocity": [100.0, np.nan, np.nan, 50.0],
+            "squawk": ["1000", None, None, None],
+        })
+        results = SnapshotAggregates(df, "v1").results
+        assert results["flight-counts-by-origin-country"] == [("France", 2), ("Spain", 1), (None, 0)]
+        assert results["fastest-and-slowest-ground-speed-by-origin-country"] == [
+            ("France", 100.0, 100.0), ("Spain", None, None), (None, 50.0, 50.0)]
+        assert results["average-ground-speed-of-flights-with-and-without-squawk"] == [
+            ("Squawk Present", Decimal("100.00")), ("Squawk Missing", Decimal("50.00"))]
+
+    def test_average_is_rounded_half_away_from_zero(self):
+        df = pd.DataFrame({"origin_country": ["France"] * 2, "velocity": [0.01, 0.02],
+                           "squawk": ["1000", "2000"]})
+        results = SnapshotAggregates(df, "v1").results
+        assert results["average-ground-speed-of-flights-with-and-without-squawk"] == [
+            ("Squawk Present", Decimal("0.02"))]
+
+class TestAnalyticsEngine:
+    def test_engine_serves_only_the_version_it_was_built_for(self, sample_data):
+        engine = AnalyticsEngine()
+        assert engine.get("flight-counts-by-origin-country", "v1") is None
+        engine.build(sample_data, "v1")
+        assert engine.get("flight-counts-by-origin-country", "v1")
+        assert engine.get("flight-counts-by-origin-country", "v2") is None
+
+    def test_query_result_uses_the_engine_in_memory_mode(self, ingested, monkeypatch):
+        monkeypatch.setenv("ANALYTICS_ENGINE", "memory")
+        misses = get_cache().stats()["misses"]
+        version, result = get_query_result("flight-counts-by-origin-country")
+        assert version == get_snapshot_version()
+        assert result is get_engine().get("flight-counts-by-origin-country", version)
+        assert get_cache().stats()["misses"] == misses
+
+    def test_query_result_falls_back_to_postgres_for_another_snapshot(self, sample_data, ingested, monkeypatch):
+        monkeypatch.setenv("ANALYTICS_ENGINE", "memory")
+        insert_data(sample_data.head(10), snapshot_time="2025-05-18_18-59-48")
+        get_cache().invalidate()
+        _, result = get_query_result("flight-counts-by-origin-country")
+        assert sum(count for _, count in result) == 10
+
+    def test_unknown_engine_is_rejected(self, monkeypatch):
+        monkeypatch.setenv("ANALYTICS_ENGINE", "duckdb")
+        with pytest.raises(ValueError):
+            get_query_result("flight-counts-by-origin-country")
@@ -0,0 +1,69 @@
+import asyncio
+import os
+import pandas as pd
+import pytest
+from asyncpg.exceptions import UndefinedTableError
+from prometheus_client import REGISTRY
+from src import async_db_manager, db_manager
+from src.db_manager import create_table, drop_table, insert_data
+from src.metrics import observe_query
+from utils.async_db_utils import async_db_connection, async_pool_stats, close_async_pool, get_db_driver
+
+def run(function, *args):
+    """Run a coroutine function on a new event loop and close the asyncpg pool it used."""
+    async def main():
+        try:
+            return await function(*args)
+        finally:
+            await close_async_pool()
+    return asyncio.run(main())
+
+@pytest.fixture(scope="module")
+def sample_snapshot():
+    """Fixture to ingest the bundled cleaned flight data sample as the latest snapshot."""
+    drop_table()
+    create_table()
+    insert_data(pd.read_csv(os.path.join("data", "cleaned_flight_data.csv"),
+                            dtype={"icao24": str, "callsign": str, "squawk": str},
+                            parse_dates=["time_position", "last_contact"]),
+                snapshot_time="2025-05-18_18-44-48")
+
+class TestAsyncQueriesMatchSyncQueries:
+    @pytest.mark.parametrize("name", [
+        "get_snapshot_version",
+        "get_latest_snapshot_time",
+        "get_flight_counts_by_origin_country",
+        "get_fastest_and_slowest_ground_speed_by_origin_country",
+        "get_average_ground_speed_of_flights_with_and_without_squawk",
+    ])
+    def test_async_query_returns_the_same_result(self, sample_snapshot, name):
+        assert run(getattr(async_db_manager, name)) == getattr(db_manager, name)()
+
+    def test_analytics_query_of_an_earlier_snapshot(self, sample_snapshot):
+        assert (run(async_db_manager.get_flight_counts_by_origin_country, "2025-05-18_18-44-48")
+                == db_manager.get_flight_counts_by_origin_country("2025-05-18_18-44-48"))
+
+class TestAsyncPool:
+    def test_connection_is_released_after_error(self):
+        async def failing_query():
+            with pytest.raises(Exception):
+                async with async_db_connection() as conn:
+                    await conn.fetch("SELECT * FROM table_that_does_not_exist;")
+            return async_pool_stats()
+        assert run(failing_query)["in_use"] == 0
+
+    def test_query_errors_are_counted_not_printed(self, capsys):
+        @observe_query(driver="asyncpg")
+        async def async_test_failing_query():
+            async with async_db_connection() as conn:
+                await conn.fetch("SELECT * FROM table_that_does_not_exist;")
+        with pytest.raises(UndefinedTableError):
+            run(async_test_failing_query)
+        labels = {"query": "async_test_failing_query", "driver": "asyncpg", "error": "UndefinedTableError"}
+        assert REGISTRY.get_sample_value("opensky_db_query_errors_total", labels) == 1
+        assert capsys.readouterr().out == ""
+
+    def test_db_driver_rejects_unknown_drivers(self, monkeypatch):
+        monkeypatch.setenv("API_DB_DRIVER", "sqlite")
+        with pytest.raises(ValueError):
+            get_db_driver()
@@ -0,0 +1,53 @@
+import json
+import os
+import pytest
+from benchmarks.suite import scale_raw, compare, measure
+
+@pytest.fixture(scope="module")
+def raw_data():
+    """Fixture to read the bundled raw OpenSky payload."""
+    with open(os.path.join("data", "raw_flight_data.json"), encoding="utf-8") as json_file:
+        return json.load(json_file)
+
+def results(*rows):
+    return {"results": [{"stage": stage, "scale": scale, "seconds": seconds, "peak_bytes": peak}
+                        for stage, scale, seconds, peak in rows]}
+
+class TestScaleRaw:
+    def test_scaled_payload_has_distinct_aircraft(self, raw_data):
+        scaled = scale_raw(raw_data, 3)
+        states = scaled["states"]
+        assert len(states) == 3 * len(raw_data["states"])
+        assert len({state[0] for state in states}) == 3 * len({state[0] for state in raw_data["states"]})
+        assert scaled["time"] == raw_data["time"]
+
+    def test_copies_stay_within_valid_coordinates(self, raw_data):
+        states = scale_raw(raw_data, 2)["states"]
+        assert all(-180 <= state[5] <= 180 and -90 <= state[6] <= 90 for state in states if state[5] is not None)
+
+class TestCompare:
+    def test_slower_stage_is_a_regression(self):
+        baseline = results(("clean_data", 1, 1.0, 100), ("insert_data", 1, 2.0, 100))
+        current = results(("clean_data", 1, 1.05, 100), ("insert_data", 1, 2.5, 100))
+        rows, regressions = compare(baseline, current, threshold=0.1)
+        assert [row["stage"] for row in rows] == ["clean_data", "insert_data"]
+        assert [row["stage"] for row in regressions] == ["insert_data"]
+        assert regressions[0]["seconds_change"] == pytest.approx(0.25)
+
+    def test_memory_growth_is_a_regression(self):
+        rows, regressions = compare(results(("load_data", 10, 1.0, 100)), results(("load_data", 10, 0.9, 150)))
+        assert len(regressions) == 1
+        assert rows[0]["peak_bytes_change"] == pytest.approx(0.5)
+
+    def test_stages_missing_from_the_baseline_are_skipped(self):
+        rows, regressions = compare(results(("clean_data", 1, 1.0, 100)), results(("clean_data", 10, 9.0, 900)))
+        assert rows == [] and regressions == []
+
+class TestMeasure:
+    def test_measure_runs_setup_before_every_run(self):
+        calls = []
+        output, result = measure(lambda: calls.append("run") or len(calls), 2, setup=lambda: calls.append("setup"))
+        assert calls == ["setup", "run"] * 3
+        assert output == 6
+        assert result["seconds"] <= result["seconds_median"]
+        assert result["peak_bytes"] >= 0
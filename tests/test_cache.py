@@ -0,0 +1,114 @@
+import os
+import asyncio
+import pandas as pd
+import pytest
+from src.cache import ResultCache, ANALYTICS_QUERIES, get_cache, refresh_cache
+from src.db_manager import create_table, drop_table, insert_data, get_snapshot_version
+
+class Version:
+    def __init__(self):
+        self.value = "v1"
+        self.reads = 0
+
+    def __call__(self):
+        self.reads += 1
+        return self.value
+
+@pytest.fixture
+def version():
+    return Version()
+
+class TestResultCache:
+    def test_repeated_lookups_hit_the_cache(self, version):
+        cache = ResultCache(version)
+        calls = []
+        def compute():
+            calls.append(1)
+            return [("Germany", 3)]
+        assert cache.get("counts", compute) == ("v1", [("Germany", 3)])
+        assert cache.get("counts", compute) == ("v1", [("Germany", 3)])
+        assert len(calls) == 1
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (1, 1, 0.5)
+
+    def test_new_snapshot_version_misses_after_invalidate(self, version):
+        cache = ResultCache(version, version_ttl=60)
+        cache.get("counts", lambda: "old")
+        version.value = "v2"
+        assert cache.get("counts", lambda: "new") == ("v1", "old")
+        cache.invalidate()
+        assert cache.get("counts", lambda: "new") == ("v2", "new")
+
+    def test_version_is_read_again_after_ttl(self, version):
+        cache = ResultCache(version, version_ttl=0)
+        cache.get("counts", lambda: "old")
+        version.value = "v2"
+        assert cache.get("counts", lambda: "new") == ("v2", "new")
+        assert version.reads == 2
+
+    def test_least_recently_used_entry_is_evicted(self, version):
+        cache = ResultCache(version, max_entries=2, version_ttl=60)
+        cache.get("a", lambda: 1)
+        cache.get("b", lambda: 2)
+        cache.get("a", lambda: 1)
+        cache.get("c", lambda: 3)
+        assert cache.get("a", lambda: "recomputed") == ("v1", 1)
+        assert cache.get("b", lambda: "recomputed") == ("v1", "recomputed")
+        assert cache.stats()["evictions"] == 2
+
+    def test_etag_matches_only_the_current_version(self, version):
+        cache = ResultCache(version, version_ttl=0)
+        etag = cache.etag("counts")
+        assert cache.not_modified("counts", etag)
+        assert cache.not_modified("counts", f'W/{etag}, "other"')
+        assert not cache.not_modified("counts", None)
+        assert not cache.not_modified("speeds", etag)
+        version.value = "v2"
+        assert not cache.not_modified("counts", etag)
+
+    def test_warm_computes_every_query(self, version):
+        cache = ResultCache(version)
+        cache.warm({"a": lambda: 1, "b": lambda: 2})
+        assert cache.stats()["entries"] == 2
+        assert cache.get("a", lambda: "recomputed") == ("v1", 1)
+
+    def test_async_lookups_share_entries_with_sync_lookups(self, version):
+        async def version_async():
+            return version()
+        async def compute():
+            return "async"
+        cache = ResultCache(version, version_ttl=0, get_version_async=version_async)
+        cache.get("counts", lambda: "sync")
+        assert asyncio.run(cache.get_async("counts", compute)) == ("v1", "sync")
+        version.value = "v2"
+        assert asyncio.run(cache.get_async("counts", compute)) == ("v2", "async")
+        assert asyncio.run(cache.not_modified_async("counts", cache.etag("counts", "v2")))
+        assert cache.stats()["hits"] == 1
+
+@pytest.fixture
+def sample_data():
+    return pd.read_csv(os.path.join("data", "cleaned_flight_data.csv"),
+                       dtype={"icao24": str, "callsign": str, "squawk": str},
+                       parse_dates=["time_position", "last_contact"])
+
+class TestSnapshotVersion:
+    def test_snapshot_version_changes_on_ingest(self, sample_data):
+        drop_table()
+        create_table()
+        assert get_snapshot_version() == "empty"
+        insert_data(sample_data.head(10), snapshot_time="2025-05-18_18-44-48")
+        first = get_snapshot_version()
+        insert_data(sample_data.head(10), snapshot_time="2025-05-18_18-59-48")
+        assert get_snapshot_version() != first
+
+    def test_refresh_cache_prewarms_every_analytics_query(self, sample_data):
+        drop_table()
+        create_table()
+        insert_data(sample_data, snapshot_time="2025-05-18_18-44-48")
+        refresh_cache()
+        before = get_cache().stats()
+        for name, query in ANALYTICS_QUERIES.items():
+            get_cache().get(name, query)
+        after = get_cache().stats()
+        assert after["hits"] - before["hits"] == len(ANALYTICS_QUERIES)
+        assert after["misses"] == before["misses"]
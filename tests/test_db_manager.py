@@ -1,12 +1,21 @@
+import os
+import json
+import threading
+import datetime
 import pytest
+import pandas as pd
 from decimal import Decimal
 from src.fetch import get_flight_data
-from src.transform import clean_data
+from src.transform import clean_data, diff_snapshots
 from src.load import load_data
-from src.db_manager import (create_table, drop_table, insert_data, get_flight_counts_by_origin_country,
+from src.db_manager import (create_table, drop_table, insert_data, INSERT_METHODS, FLIGHT_COLUMNS,
+                            create_partitions, drop_expired_partitions, get_latest_snapshot_time,
+                            get_current_states, apply_delta, get_rollups, get_rollup_summary,
+                            get_flight_counts_by_origin_country,
                             get_fastest_and_slowest_ground_speed_by_origin_country,
-                            get_average_ground_speed_of_flights_with_and_without_squawk)
+                            get_average_ground_speed_of_flights_with_and_without_squawk, _CsvChunks)
 from utils.db_utils import db_cursor
+from benchmarks.bench_queries import LEGACY_GROUND_SPEED_RANGE_SQL, LEGACY_SQUAWK_GROUND_SPEED_SQL
 
 @pytest.fixture(scope="module")
 def raw_data():
@@ -30,6 +39,13 @@ def database_setup(loaded_data):
     create_table()
     insert_data(loaded_data)
 
+@pytest.fixture(scope="module")
+def sample_data():
+    """Fixture to read the bundled cleaned flight data sample."""
+    return pd.read_csv(os.path.join("data", "cleaned_flight_data.csv"),
+                       dtype={"icao24": str, "callsign": str, "squawk": str},
+                       parse_dates=["time_position", "last_contact"])
+
 class TestCreateTable:
     def test_table_flights_exists(self):
         with db_cursor() as cur:
@@ -56,9 +72,73 @@ class TestCreateTable:
         expected_columns = ["flight_id", "icao24", "callsign", "origin_country", 
                             "time_position", "last_contact", "longitude", "latitude", 
                             "baro_altitude", "ground_speed", "heading", "vertical_rate", 
-                            "geo_altitude", "squawk", "spi"]
+                            "geo_altitude", "squawk", "spi", "snapshot_time"]
         assert columns == expected_columns
 
+    def test_table_flights_is_partitioned_by_snapshot_time(self):
+        with db_cursor() as cur:
+            create_table()
+            cur.execute("""
+                SELECT pg_get_partkeydef('flights'::regclass);
+            """)
+            partition_key = cur.fetchone()[0]
+        assert partition_key == "RANGE (snapshot_time)"
+
+    def test_create_table_migrates_unpartitioned_flights_table(self):
+        drop_table()
+        with db_cursor() as cur:
+            # The flights table of the unpartitioned schema, holding the last fetch
+            cur.execute("""
+                CREATE TABLE flights (flight_id SERIAL PRIMARY KEY, icao24 VARCHAR(10) NOT NULL,
+                    callsign VARCHAR(20), origin_country VARCHAR(50), time_position TIMESTAMP,
+                    last_contact TIMESTAMP, longitude DOUBLE PRECISION NOT NULL,
+                    latitude DOUBLE PRECISION NOT NULL, baro_altitude DOUBLE PRECISION,
+                    ground_speed DOUBLE PRECISION, heading DOUBLE PRECISION, vertical_rate DOUBLE PRECISION,
+                    geo_altitude DOUBLE PRECISION, squawk VARCHAR(10), spi BOOLEAN);
+                INSERT INTO flights (icao24, origin_country, last_contact, longitude, latitude) VALUES
+                    ('4b1814', 'Switzerland', '2025-05-18 18:44:40', 8.5, 47.4),
+                    ('3c6444', 'Germany', '2025-05-18 18:44:48', 11.7, 48.3);
+            """)
+            cur.connection.commit()
+        create_table()
+        with db_cursor() as cur:
+            cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('flights');")
+            relkind = cur.fetchone()[0]
+            cur.execute("SELECT icao24, snapshot_time FROM flights ORDER BY icao24;")
+            rows = cur.fetchall()
+            cur.execute("SELECT to_regclass('flights_unpartitioned');")
+            leftover = cur.fetchone()[0]
+        snapshot_time = datetime.datetime(2025, 5, 18, 18, 44, 48)
+        assert relkind == "p"
+        assert rows == [("3c6444", snapshot_time), ("4b1814", snapshot_time)]
+        assert leftover is None
+        assert get_latest_snapshot_time() == snapshot_time
+        assert sum(row[3] for row in get_rollups("hour", start="2025-05-18_18-00-00")) == 2
+
+    def test_create_table_on_a_current_schema_takes_no_locks(self, sample_data):
+        create_table()
+        insert_data(sample_data.head(5), snapshot_time="2025-05-18_18-44-48")
+        with db_cursor() as writer:
+            # An open write to flights blocks any DDL on it until it commits
+            writer.execute("DELETE FROM flights WHERE icao24 = 'none';")
+            thread = threading.Thread(target=create_table, daemon=True)
+            thread.start()
+            thread.join(timeout=5)
+            blocked = thread.is_alive()
+            writer.connection.rollback()
+        thread.join()
+        assert not blocked
+
+    def test_table_flights_has_analytics_indexes(self):
+        create_table()
+        with db_cursor() as cur:
+            cur.execute("""
+                SELECT indexname FROM pg_indexes WHERE tablename = 'flights' ORDER BY indexname;
+            """)
+            indexes = [row[0] for row in cur.fetchall()]
+        assert indexes == ["flights_last_contact_brin", "flights_pkey", "flights_position_gist",
+                           "flights_snapshot_country_idx", "flights_snapshot_icao24_idx"]
+
 class TestDropTable:
     def test_table_flights_does_not_exist(self):
         with db_cursor() as cur:
@@ -88,6 +168,315 @@ class TestInsertData:
             record_count = cur.fetchone()[0]
         assert record_count == len(loaded_data)
 
+@pytest.mark.parametrize("method", INSERT_METHODS)
+class TestInsertDataMethods:
+    def test_insert_method_inserts_every_row(self, sample_data, method):
+        drop_table()
+        create_table()
+        insert_data(sample_data, method=method)
+        with db_cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM flights;")
+            record_count = cur.fetchone()[0]
+        assert record_count == len(sample_data)
+
+    def test_insert_method_maps_columns_and_nulls(self, sample_data, method):
+        drop_table()
+        create_table()
+        insert_data(sample_data, method=method)
+        first = sample_data.iloc[0]
+        with db_cursor() as cur:
+            cur.execute("""
+                SELECT icao24, time_position, ground_speed, heading, spi
+                FROM flights WHERE icao24 = %s;
+            """, (first["icao24"],))
+            record = cur.fetchone()
+            cur.execute("SELECT COUNT(*) FROM flights WHERE squawk IS NULL;")
+            missing_squawk = cur.fetchone()[0]
+        assert record == (first["icao24"], first["time_position"].to_pydatetime(),
+                          first["velocity"], first["true_track"], bool(first["spi"]))
+        assert missing_squawk == sample_data["squawk"].isna().sum()
+
+    def test_insert_method_stores_compact_data_like_standard_data(self, method):
+        with open(os.path.join("data", "raw_flight_data.json"), encoding="utf-8") as json_file:
+            raw = json.load(json_file)
+        query = f"SELECT {', '.join(FLIGHT_COLUMNS)} FROM flights ORDER BY icao24, time_position;"
+        stored = []
+        for schema in ("standard", "compact"):
+            drop_table()
+            create_table()
+            insert_data(clean_data(raw, None, schema)[0], method=method)
+            with db_cursor() as cur:
+                cur.execute(query)
+                stored.append(pd.DataFrame(cur.fetchall()))
+        pd.testing.assert_frame_equal(stored[1], stored[0], rtol=1e-6)
+
+class TestSnapshots:
+    def test_snapshots_accumulate_instead_of_replacing_data(self, sample_data):
+        drop_table()
+        create_table()
+        insert_data(sample_data, snapshot_time="2025-05-18_18-44-48")
+        insert_data(sample_data, snapshot_time="2025-05-18_18-59-48")
+        with db_cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM flights;")
+            record_count = cur.fetchone()[0]
+        assert record_count == 2 * len(sample_data)
+        assert get_latest_snapshot_time() == datetime.datetime(2025, 5, 18, 18, 59, 48)
+
+    def test_reinserting_a_snapshot_replaces_its_rows(self, sample_data):
+        drop_table()
+        create_table()
+        insert_data(sample_data, snapshot_time="2025-05-18_18-44-48")
+        insert_data(sample_data.head(10), snapshot_time="2025-05-18_18-44-48")
+        with db_cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM flights;")
+            record_count = cur.fetchone()[0]
+        assert record_count == 10
+
+    def test_queries_default_to_the_latest_snapshot(self, sample_data):
+        drop_table()
+        create_table()
+        insert_data(sample_data, snapshot_time="2025-05-18_18-44-48")
+        insert_data(sample_data.head(10), snapshot_time="2025-05-18_18-59-48")
+        latest = sum(count for _, count in get_flight_counts_by_origin_country())
+        earlier = sum(count for _, count in get_flight_counts_by_origin_country("2025-05-18_18-44-48"))
+        assert latest == 10
+        assert earlier == len(sample_data)
+
+    def test_create_partitions_creates_current_and_next_day(self):
+        drop_table()
+        create_table()
+        created = create_partitions("2025-05-18_18-44-48")
+        assert created == ["flights_p20250518", "flights_p20250519"]
+        assert create_partitions("2025-05-18_20-00-00") == []
+
+    def test_drop_expired_partitions_drops_whole_days_past_retention(self, sample_data):
+        drop_table()
+        create_table()
+        insert_data(sample_data.head(10), snapshot_time="2025-05-10_12-00-00")
+        insert_data(sample_data.head(10), snapshot_time="2025-05-18_12-00-00")
+        dropped = drop_expired_partitions(retention_days=7)
+        assert dropped == ["flights_p20250510"]
+        with db_cursor() as cur:
+            cur.execute("SELECT MIN(snapshot_time) FROM flights;")
+            oldest_row = cur.fetchone()[0]
+            cur.execute("SELECT MIN(snapshot_time) FROM snapshots;")
+            oldest_snapshot = cur.fetchone()[0]
+        assert oldest_row == datetime.datetime(2025, 5, 18, 12, 0, 0)
+        assert oldest_snapshot == oldest_row
+
+class TestIncrementalIngest:
+    def ingest(self, df, snapshot_time):
+        changed, removed = diff_snapshots(get_current_states(), df)
+        return apply_delta(changed, removed, snapshot_time=snapshot_time, record_count=len(df))
+
+    def test_first_incremental_snapshot_upserts_every_aircraft(self, sample_data):
+        drop_table()
+        create_table()
+        delta = self.ingest(sample_data, "2025-05-18_18-44-48")
+        assert delta["upserted"] == len(sample_data)
+        assert delta["removed"] == 0
+        assert len(get_current_states()) == len(sample_data)
+        assert get_latest_snapshot_time() == datetime.datetime(2025, 5, 18, 18, 44, 48)
+
+    def test_incremental_snapshot_writes_only_changed_and_removed_aircraft(self, sample_data):
+        drop_table()
+        create_table()
+        self.ingest(sample_data, "2025-05-18_18-44-48")
+        moved = sample_data.iloc[1:].copy()
+        moved.iloc[0, moved.columns.get_loc("last_contact")] += pd.Timedelta(seconds=10)
+        moved.iloc[0, moved.columns.get_loc("latitude")] += 0.1
+
+        delta = self.ingest(moved, "2025-05-18_18-45-48")
+        assert delta == {"snapshot_time": datetime.datetime(2025, 5, 18, 18, 45, 48),
+                         "upserted": 1, "removed": 1}
+        with db_cursor() as cur:
+            cur.execute("SELECT active FROM flight_states WHERE icao24 = %s;",
+                        (sample_data["icao24"].iloc[0],))
+            tombstone = cur.fetchone()[0]
+            cur.execute("SELECT latitude, snapshot_time FROM flight_states WHERE icao24 = %s;",
+                        (moved["icao24"].iloc[0],))
+            latitude, snapshot_time = cur.fetchone()
+        assert tombstone is False
+        assert latitude == moved["latitude"].iloc[0]
+        assert snapshot_time == datetime.datetime(2025, 5, 18, 18, 45, 48)
+
+    def test_reappearing_aircraft_is_reactivated(self, sample_data):
+        drop_table()
+        create_table()
+        self.ingest(sample_data, "2025-05-18_18-44-48")
+        self.ingest(sample_data.iloc[1:], "2025-05-18_18-45-48")
+        delta = self.ingest(sample_data, "2025-05-18_18-46-48")
+        assert delta["upserted"] == 1
+        assert len(get_current_states()) == len(sample_data)
+
+    def test_queries_read_flight_states_in_incremental_mode(self, sample_data, monkeypatch):
+        drop_table()
+        create_table()
+        self.ingest(sample_data, "2025-05-18_18-44-48")
+        self.ingest(sample_data.head(10), "2025-05-18_18-45-48")
+        monkeypatch.setenv("INGEST_MODE", "incremental")
+        assert sum(count for _, count in get_flight_counts_by_origin_country()) == 10
+        assert len(get_average_ground_speed_of_flights_with_and_without_squawk()) > 0
+
+    def test_retention_purges_old_tombstones(self, sample_data):
+        drop_table()
+        create_table()
+        self.ingest(sample_data.head(10), "2025-05-10_12-00-00")
+        self.ingest(sample_data.head(5), "2025-05-10_12-01-00")
+        self.ingest(sample_data.iloc[1:5], "2025-05-18_12-00-00")
+        drop_expired_partitions(retention_days=7)
+        with db_cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM flight_states WHERE NOT active;")
+            tombstones = cur.fetchone()[0]
+        assert tombstones == 1
+
+class TestRollups:
+    def raw_summary(self):
+        with db_cursor() as cur:
+            cur.execute("""
+                SELECT origin_country, COUNT(*), MIN(ground_speed), MAX(ground_speed)
+                FROM flights GROUP BY origin_country ORDER BY origin_country;
+            """)
+            return cur.fetchall()
+
+    def rollup_summary(self, granularity="hour"):
+        return sorted((row[0], row[2], row[5], row[6]) for row in
+                      get_rollup_summary(granularity, start="2025-05-18_00-00-00"))
+
+    def test_rollups_match_the_raw_snapshots(self, sample_data):
+        drop_table()
+        create_table()
+        insert_data(sample_data, snapshot_time="2025-05-18_18-44-48")
+        insert_data(sample_data.head(100), snapshot_time="2025-05-18_18-44-58")
+        insert_data(sample_data.tail(100), snapshot_time="2025-05-18_19-05-00")
+        assert self.rollup_summary("hour") == self.raw_summary()
+        assert self.rollup_summary("minute") == self.raw_summary()
+        buckets = {row[0] for row in get_rollups("minute", start="2025-05-18_00-00-00")}
+        assert buckets == {datetime.datetime(2025, 5, 18, 18, 44), datetime.datetime(2025, 5, 18, 19, 5)}
+
+    def test_rollup_averages_split_by_squawk(self, sample_data):
+        drop_table()
+        create_table()
+        insert_data(sample_data, snapshot_time="2025-05-18_18-44-48")
+        rollups = {row[1]: row for row in get_rollups("hour")}
+        country = sample_data[sample_data["origin_country"] == "United Kingdom"]
+        with_squawk = country[country["squawk"].notna()]["velocity"].mean()
+        without_squawk = country[country["squawk"].isna()]["velocity"].mean()
+        assert rollups["United Kingdom"][2:5] == (1, len(country), Decimal(len(country)).quantize(Decimal("0.01")))
+        assert float(rollups["United Kingdom"][9]) == pytest.approx(with_squawk, abs=0.01)
+        assert float(rollups["United Kingdom"][10]) == pytest.approx(without_squawk, abs=0.01)
+
+    def test_reinserting_a_snapshot_rebuilds_its_rollups(self, sample_data):
+        drop_table()
+        create_table()
+        insert_data(sample_data, snapshot_time="2025-05-18_18-44-48")
+        insert_data(sample_data.head(100), snapshot_time="2025-05-18_18-30-00")
+        insert_data(sample_data.head(10), snapshot_time="2025-05-18_18-44-48")
+        assert self.rollup_summary("hour") == self.raw_summary()
+        assert sum(row[2] for row in get_rollup_summary("hour", start="2025-05-18_18-00-00")) == 110
+
+    def test_incremental_snapshots_are_rolled_up(self, sample_data):
+        drop_table()
+        create_table()
+        changed, removed = diff_snapshots(get_current_states(), sample_data)
+        apply_delta(changed, removed, snapshot_time="2025-05-18_18-44-48", record_count=len(sample_data))
+        changed, removed = diff_snapshots(get_current_states(), sample_data.iloc[1:])
+        apply_delta(changed, removed, snapshot_time="2025-05-18_18-45-48", record_count=len(sample_data) - 1)
+        summary = get_rollup_summary("minute", start="2025-05-18_18-00-00")
+        assert sum(row[2] for row in summary) == 2 * len(sample_data) - 1
+
+    def test_rollup_range_defaults_to_the_latest_window(self, sample_data):
+        drop_table()
+        create_table()
+        insert_data(sample_data.head(10), snapshot_time="2025-05-17_12-00-00")
+        insert_data(sample_data.head(10), snapshot_time="2025-05-18_18-44-48")
+        assert {row[0] for row in get_rollups("hour")} == {datetime.datetime(2025, 5, 18, 18)}
+        assert {row[0] for row in get_rollups("hour", end="2025-05-17_13-00-00")} == \
+            {datetime.datetime(2025, 5, 17, 12)}
+        assert get_rollups("hour", start="2025-05-18_00-00-00", origin_country="Nowhere") == []
+
+    def test_rollups_reject_an_invalid_range(self):
+        with pytest.raises(ValueError):
+            get_rollups("day")
+        with pytest.raises(ValueError):
+            get_rollups("hour", start="2025-05-18_19-00-00", end="2025-05-18_18-00-00")
+
+    def test_retention_keeps_hour_rollups_past_minute_retention(self, sample_data, monkeypatch):
+        monkeypatch.setenv("ROLLUP_MINUTE_RETENTION_DAYS", "3")
+        drop_table()
+        create_table()
+        insert_data(sample_data.head(10), snapshot_time="2025-05-10_12-00-00")
+        insert_data(sample_data.head(10), snapshot_time="2025-05-18_12-00-00")
+        drop_expired_partitions(retention_days=7)
+        assert len(get_rollups("minute", start="2025-05-01_00-00-00")) == \
+            len(get_rollups("minute", start="2025-05-18_00-00-00"))
+        assert {row[0].day for row in get_rollups("hour", start="2025-05-01_00-00-00")} == {10, 18}
+
+    def hour_totals(self, hour):
+        rows = get_rollups("hour", start=hour, end=hour.replace("-00-00", "-59-59"))
+        return max(row[2] for row in rows), sum(row[3] for row in rows)
+
+    def test_replaying_an_expired_snapshot_does_not_count_it_twice(self, sample_data):
+        drop_table()
+        create_table()
+        insert_data(sample_data.head(5), snapshot_time="2025-01-01_10-00-00")
+        insert_data(sample_data.head(5), snapshot_time="2025-01-20_10-00-00")
+        drop_expired_partitions(retention_days=7)
+        insert_data(sample_data.head(5), snapshot_time="2025-01-01_10-00-00")
+        assert self.hour_totals("2025-01-01_10-00-00") == (1, 5)
+
+    def test_hour_partly_dropped_by_retention_keeps_its_totals(self, sample_data):
+        drop_table()
+        create_table()
+        insert_data(sample_data.head(5), snapshot_time="2025-01-01_10-00-00")
+        insert_data(sample_data.head(5), snapshot_time="2025-01-01_10-30-00")
+        insert_data(sample_data.head(5), snapshot_time="2025-01-20_10-00-00")
+        drop_expired_partitions(retention_days=7)
+        # The 10:30 snapshot is gone from flights, so the hour cannot be rebuilt from it
+        insert_data(sample_data.head(3), snapshot_time="2025-01-01_10-00-00")
+        assert self.hour_totals("2025-01-01_10-00-00") == (2, 10)
+
+class TestAnalyticsQueriesMatchLegacySql:
+    def legacy(self, sql_template):
+        with db_cursor() as cur:
+            cur.execute(sql_template.format(
+                table="flights", condition="snapshot_time = (SELECT MAX(snapshot_time) FROM snapshots)"))
+            return cur.fetchall()
+
+    def test_ground_speed_range_matches_window_query(self, sample_data):
+        drop_table()
+        create_table()
+        insert_data(sample_data)
+        assert (get_fastest_and_slowest_ground_speed_by_origin_country()
+                == self.legacy(LEGACY_GROUND_SPEED_RANGE_SQL))
+
+    def test_squawk_ground_speed_matches_union_query(self, sample_data):
+        drop_table()
+        create_table()
+        insert_data(sample_data)
+        result = get_average_ground_speed_of_flights_with_and_without_squawk()
+        assert [row[0] for row in result] == ["Squawk Present", "Squawk Missing"]
+        assert sorted(result) == sorted(self.legacy(LEGACY_SQUAWK_GROUND_SPEED_SQL))
+
+    def test_squawk_ground_speed_omits_missing_group(self, sample_data):
+        drop_table()
+        create_table()
+        insert_data(sample_data[sample_data["squawk"].notna()])
+        result = get_average_ground_speed_of_flights_with_and_without_squawk()
+        assert result == self.legacy(LEGACY_SQUAWK_GROUND_SPEED_SQL)
+        assert [row[0] for row in result] == ["Squawk Present"]
+
+class TestInsertDataInvalidMethod:
+    def test_insert_data_rejects_unknown_method(self, sample_data):
+        with pytest.raises(ValueError):
+            insert_data(sample_data, method="bulk")
+
+class TestCopyChunks:
+    def test_chunks_read_as_the_whole_csv(self, sample_data):
+        chunks = _CsvChunks(sample_data, chunk_rows=1000)
+        assert chunks.read(8192) + chunks.read() == sample_data.to_csv(index=False, header=False).encode()
+        assert chunks.read() == b""
+
 class TestGetFlightCountsByOriginCountry:
     def test_query_returns_a_non_empty_result(self, database_setup):
         length = len(get_flight_counts_by_origin_country())
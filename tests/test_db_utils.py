@@ -0,0 +1,82 @@
+import pytest
+from utils.db_utils import ConnectionPool, PoolTimeout, db_cursor, get_pool, pool_stats
+
+@pytest.fixture
+def pool():
+    """Fixture to create a small standalone connection pool."""
+    pool = ConnectionPool(min_size=1, max_size=2, timeout=0.2, check_idle=0)
+    yield pool
+    pool.close()
+
+class TestConnectionPool:
+    def test_pool_reuses_connections(self, pool):
+        conn = pool.getconn()
+        pool.putconn(conn)
+        assert pool.getconn() is conn
+
+    def test_pool_opens_min_size_connections_on_creation(self, pool):
+        stats = pool.stats()
+        assert stats["size"] == 1
+        assert stats["idle"] == 1
+        assert stats["in_use"] == 0
+
+    def test_pool_tracks_connections_in_use(self, pool):
+        conn = pool.getconn()
+        assert pool.stats()["in_use"] == 1
+        pool.putconn(conn)
+        assert pool.stats()["in_use"] == 0
+
+    def test_pool_raises_timeout_when_exhausted(self, pool):
+        conns = [pool.getconn(), pool.getconn()]
+        with pytest.raises(PoolTimeout):
+            pool.getconn()
+        stats = pool.stats()
+        assert stats["timeouts"] == 1
+        assert stats["size"] == 2
+        for conn in conns:
+            pool.putconn(conn)
+
+    def test_pool_replaces_closed_connections_on_checkout(self, pool):
+        conn = pool.getconn()
+        pool.putconn(conn)
+        conn.close()
+        replacement = pool.getconn()
+        assert replacement is not conn
+        assert not replacement.closed
+        assert pool.stats()["connections_discarded"] == 1
+
+    def test_pool_rolls_back_open_transactions_on_return(self, pool):
+        conn = pool.getconn()
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1;")
+        pool.putconn(conn)
+        assert conn.info.transaction_status == 0
+
+    def test_pool_rejects_invalid_sizes(self):
+        with pytest.raises(ValueError):
+            ConnectionPool(min_size=3, max_size=2)
+
+class TestDbCursor:
+    def test_db_cursor_reuses_the_same_backend_connection(self):
+        with db_cursor() as cur:
+            cur.execute("SELECT pg_backend_pid();")
+            first_pid = cur.fetchone()[0]
+        with db_cursor() as cur:
+            cur.execute("SELECT pg_backend_pid();")
+            second_pid = cur.fetchone()[0]
+        assert first_pid == second_pid
+
+    def test_db_cursor_returns_connection_after_error(self):
+        with pytest.raises(Exception):
+            with db_cursor() as cur:
+                cur.execute("SELECT * FROM table_that_does_not_exist;")
+        assert get_pool().stats()["in_use"] == 0
+        with db_cursor() as cur:
+            cur.execute("SELECT 1;")
+            assert cur.fetchone()[0] == 1
+
+    def test_pool_stats_reports_checkouts(self):
+        before = pool_stats()["checkouts"]
+        with db_cursor() as cur:
+            cur.execute("SELECT 1;")
+        assert pool_stats()["checkouts"] == before + 1
@@ -0,0 +1,75 @@
+import os
+import pandas as pd
+import pytest
+from src.dedup import StateDeduplicator, get_deduplicator
+
+@pytest.fixture(scope="module")
+def sample_data():
+    """Fixture to read the bundled cleaned flight data sample."""
+    return pd.read_csv(os.path.join("data", "cleaned_flight_data.csv"),
+                       dtype={"icao24": str, "callsign": str, "squawk": str},
+                       parse_dates=["time_position", "last_contact"])
+
+def updated(df, count, seconds=10):
+    """The snapshot with the position of its first count aircraft reported seconds later."""
+    later = df.copy()
+    later.iloc[:count, later.columns.get_loc("time_position")] += pd.Timedelta(seconds=seconds)
+    return later
+
+class TestStateDeduplicator:
+    def test_first_snapshot_is_kept_whole(self, sample_data):
+        deduplicator = StateDeduplicator(ttl_seconds=600)
+        kept, report = deduplicator.filter(sample_data, "2025-05-18_18-44-48")
+        assert len(kept) == len(sample_data)
+        assert report["rows_dropped"] == 0
+        assert report["keys"] == sample_data["time_position"].notna().sum()
+
+    def test_repeated_states_are_dropped(self, sample_data):
+        deduplicator = StateDeduplicator(ttl_seconds=600)
+        deduplicator.filter(sample_data, "2025-05-18_18-44-48")
+        kept, report = deduplicator.filter(updated(sample_data, 100), "2025-05-18_18-45-48")
+        assert kept["icao24"].tolist() == sample_data["icao24"].head(100).tolist()
+        assert report["rows_dropped"] == len(sample_data) - 100
+        dropped_csv = sample_data.iloc[100:].to_csv(index=False, header=False)
+        assert report["bytes_saved"] == pytest.approx(len(dropped_csv.encode()), rel=0.02)
+
+    def test_states_without_time_position_are_kept(self, sample_data):
+        deduplicator = StateDeduplicator(ttl_seconds=600)
+        df = sample_data.head(10).copy()
+        df.loc[df.index[:3], "time_position"] = pd.NaT
+        deduplicator.filter(df, "2025-05-18_18-44-48")
+        kept, report = deduplicator.filter(df, "2025-05-18_18-45-48")
+        assert len(kept) == 3
+        assert report["rows_dropped"] == 7
+
+    def test_keys_expire_after_the_ttl(self, sample_data):
+        deduplicator = StateDeduplicator(ttl_seconds=600)
+        df = sample_data.head(50)
+        deduplicator.filter(df, "2025-05-18_18-44-48")
+        kept, _ = deduplicator.filter(df, "2025-05-18_18-54-48")
+        assert kept.empty
+        # Seen again at 18:54:48, so still remembered ten minutes after the first sighting
+        kept, _ = deduplicator.filter(df, "2025-05-18_19-04-00")
+        assert kept.empty
+        kept, report = deduplicator.filter(df, "2025-05-18_19-15-00")
+        assert len(kept) == 50
+        assert report["keys"] == 50
+
+    def test_stats_report_totals_and_memory(self, sample_data):
+        deduplicator = StateDeduplicator(ttl_seconds=600)
+        deduplicator.filter(sample_data, "2025-05-18_18-44-48")
+        deduplicator.filter(sample_data, "2025-05-18_18-45-48")
+        stats = deduplicator.stats()
+        assert stats["runs"] == 2
+        assert stats["rows_dropped"] == len(sample_data)
+        assert stats["array_bytes"] == 16 * stats["keys"]
+
+class TestGetDeduplicator:
+    def test_deduplication_is_off_by_default(self, monkeypatch):
+        monkeypatch.delenv("DEDUP_TTL_SECONDS", raising=False)
+        assert get_deduplicator() is None
+
+    def test_deduplicator_is_shared(self, monkeypatch):
+        monkeypatch.setenv("DEDUP_TTL_SECONDS", "300")
+        assert get_deduplicator() is get_deduplicator()
+        assert get_deduplicator().ttl_seconds == 300
@@ -1,6 +1,7 @@
 import os
+import json
 import pytest
-from src.fetch import get_flight_data
+from src.fetch import get_flight_data, StatesParser
 
 @pytest.fixture(scope="module")
 def flight_data():
@@ -43,4 +44,45 @@ class TestGetFlightDataFile:
         assert os.path.exists(raw_flight_data_csv_file_path)
 
     def test_raw_flight_data_csv_file_is_not_empty(self):
-        assert os.path.getsize(raw_flight_data_csv_file_path) > 0
\ No newline at end of file
+        assert os.path.getsize(raw_flight_data_csv_file_path) > 0
+
+@pytest.fixture(scope="module")
+def sample_payload():
+    """Fixture to read the bundled raw OpenSky payload as bytes."""
+    with open(raw_flight_data_json_file_path, "rb") as json_file:
+        return json_file.read()
+
+def parse_in_chunks(payload, chunk_size):
+    parser = StatesParser()
+    rows = []
+    for start in range(0, len(payload), chunk_size):
+        rows.extend(parser.feed(payload[start:start + chunk_size]))
+    parser.close()
+    return parser, rows
+
+class TestStatesParser:
+    @pytest.mark.parametrize("chunk_size", [1, 13, 4096, 64 * 1024])
+    def test_parser_returns_the_same_states_as_json_load(self, sample_payload, chunk_size):
+        expected = json.loads(sample_payload)
+        parser, rows = parse_in_chunks(sample_payload, chunk_size)
+        assert rows == expected["states"]
+        assert parser.time == expected["time"]
+
+    def test_parser_reads_time_after_states(self):
+        payload = b'{"states": [["abc123", "TEST1 ", "France"]], "time": 1747593888}'
+        parser, rows = parse_in_chunks(payload, 5)
+        assert rows == [["abc123", "TEST1 ", "France"]]
+        assert parser.time == 1747593888
+
+    def test_parser_handles_null_states(self):
+        parser, rows = parse_in_chunks(b'{"time": 1747593888, "states": null}', 3)
+        assert rows == []
+        assert parser.time == 1747593888
+
+    def test_parser_raises_on_truncated_payload(self, sample_payload):
+        with pytest.raises(ValueError):
+            parse_in_chunks(sample_payload[:len(sample_payload) // 2], 4096)
+
+    def test_parser_raises_on_non_object_payload(self):
+        with pytest.raises(ValueError):
+            parse_in_chunks(b'[1, 2, 3]', 4)
@@ -1,9 +1,11 @@
 import os
+import json
 import pandas as pd
 import pytest
 from src.fetch import get_flight_data
-from src.transform import clean_data
+from src.transform import clean_data, to_compact
 from src.load import load_data
+from tests.conftest import S3_TEST_BUCKET
 
 @pytest.fixture(scope="module")
 def raw_data():
@@ -51,4 +53,65 @@ class TestLoadDataDataFrame:
         assert list(loaded_data.columns) == expected_columns
 
     def test_loaded_data_dataframe_contains_flight_data(self, loaded_data):
-        assert loaded_data.shape[0] > 0
\ No newline at end of file
+        assert loaded_data.shape[0] > 0
+
+@pytest.fixture(scope="module")
+def sample_cleaned_data():
+    """Fixture to clean the bundled raw OpenSky payload."""
+    with open(os.path.join("data", "raw_flight_data.json"), encoding="utf-8") as json_file:
+        return clean_data(json.load(json_file), "2025-05-18_18-44-48")
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Fixture to run load_data in an empty directory so the bundled data files are untouched."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+class TestLoadDataOutputFormats:
+    def test_load_data_writes_only_the_requested_formats(self, s3, workdir, sample_cleaned_data):
+        load_data(*sample_cleaned_data, formats=["parquet"])
+        assert os.listdir(workdir / "data") == ["cleaned_flight_data.parquet"]
+        keys = [item["Key"] for item in s3.list_objects_v2(Bucket=S3_TEST_BUCKET)["Contents"]]
+        assert keys == ["data/2025-05-18_18-44-48/cleaned_flight_data.parquet"]
+
+    def test_load_data_reads_formats_from_environment(self, s3, workdir, sample_cleaned_data, monkeypatch):
+        monkeypatch.setenv("LOAD_OUTPUT_FORMATS", "csv, parquet")
+        load_data(*sample_cleaned_data)
+        assert sorted(os.listdir(workdir / "data")) == ["cleaned_flight_data.csv", "cleaned_flight_data.parquet"]
+
+    def test_load_data_rejects_unknown_or_missing_formats(self, s3, workdir, sample_cleaned_data):
+        with pytest.raises(ValueError):
+            load_data(*sample_cleaned_data, formats=["xlsx"])
+        with pytest.raises(ValueError):
+            load_data(*sample_cleaned_data, formats=[])
+
+class TestLoadDataParquet:
+    def test_parquet_round_trips_the_loaded_dataframe(self, s3, workdir, sample_cleaned_data):
+        loaded = load_data(*sample_cleaned_data, formats=["parquet"])
+        result = pd.read_parquet(workdir / "data" / "cleaned_flight_data.parquet")
+        assert list(result.columns) == list(loaded.columns)
+        assert len(result) == len(loaded)
+        assert result["velocity"].tolist() == loaded["velocity"].tolist()
+
+    def test_parquet_dictionary_encodes_repeated_strings_and_types_timestamps(self, s3, workdir, sample_cleaned_data):
+        pq = pytest.importorskip("pyarrow.parquet")
+        load_data(*sample_cleaned_data, formats=["parquet"])
+        metadata = pq.ParquetFile(workdir / "data" / "cleaned_flight_data.parquet").metadata
+        schema = metadata.schema.to_arrow_schema()
+        columns = {metadata.schema.column(i).name: metadata.row_group(0).column(i) for i in range(metadata.num_columns)}
+        assert "RLE_DICTIONARY" in columns["origin_country"].encodings
+        assert "RLE_DICTIONARY" in columns["callsign"].encodings
+        assert str(schema.field("time_position").type) == "timestamp[ms]"
+        assert str(schema.field("last_contact").type) == "timestamp[ms]"
+
+class TestLoadDataCompactSchema:
+    def test_compact_data_is_written_like_standard_data(self, s3, workdir, sample_cleaned_data):
+        _, timestamp = sample_cleaned_data
+        written = []
+        for df in (sample_cleaned_data[0], to_compact(sample_cleaned_data[0])):
+            loaded = load_data(df, timestamp, formats=["csv", "jsonl"])
+            files = [workdir / "data" / name for name in ("cleaned_flight_data.csv", "cleaned_flight_data.jsonl")]
+            written.append((pd.read_csv(files[0], dtype={"squawk": str}), pd.read_json(files[1], lines=True)))
+        assert loaded["velocity"].dtype == "float32"
+        for standard, compact in zip(*written):
+            pd.testing.assert_frame_equal(compact, standard, rtol=1e-6)
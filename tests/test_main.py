@@ -1,11 +1,40 @@
+import os
+import sys
+import json
+import time
+import subprocess
 import pytest
+import pandas as pd
 from fastapi.testclient import TestClient
 from src.main import app
+from src.cache import get_cache, refresh_cache
+from src.db_manager import create_table, drop_table, insert_data
+from src.tracks import get_track_store
+from benchmarks.bench_startup import profile_import, loaded_ingest_modules, get_import_time_budget_ms
 
 @pytest.fixture
 def client():
     return TestClient(app)
 
+class TestColdStart:
+    def test_api_imports_without_ingestion_dependencies(self):
+        assert loaded_ingest_modules(profile_import("src.main")["modules"]) == []
+
+    def test_api_starts_without_ingestion_dependencies(self):
+        # A fresh interpreter, as this one already imported pandas through the tests
+        code = ("import json, sys; from fastapi.testclient import TestClient; from src.main import app\n"
+                "with TestClient(app) as client: client.get('/healthcheck')\n"
+                "print(json.dumps(sorted(sys.modules)))")
+        env = {**os.environ, "INGEST_INTERVAL_SECONDS": "0"}
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, env=env)
+        modules = json.loads(output.stdout.splitlines()[-1])
+        assert loaded_ingest_modules(modules) == []
+        assert "src.pipeline" not in modules
+
+    def test_api_import_time_is_within_budget(self):
+        import_ms = min(profile_import("src.main")["cumulative_us"]["src.main"] / 1000 for _ in range(3))
+        assert import_ms <= get_import_time_budget_ms()
+
 class TestRootEndpoint:
     def test_root_endpoint_returns_welcome_message(self, client):
         endpoint = "/"
@@ -20,13 +49,223 @@ class TestHealthcheckEndpoint:
         assert response.status_code == 200
         assert response.json() == {"status": "OK"}
 
+class TestDbPoolStatsEndpoint:
+    def test_db_pool_stats_endpoint_returns_pool_statistics(self, client):
+        endpoint = "/db-pool-stats"
+        response = client.get(endpoint)
+        assert response.status_code == 200
+        body = response.json()
+        assert body["status"] == "success"
+        assert {"size", "in_use", "idle", "waits", "checkout_time_avg"} <= body["data"].keys()
+
+class TestMetricsEndpoint:
+    def test_metrics_endpoint_returns_prometheus_text(self, client):
+        create_table()
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'opensky_db_query_seconds_count{driver="psycopg2",query="create_table"}' in response.text
+        assert "opensky_result_cache_hits_total" in response.text
+        assert "opensky_tracks_aircraft" in response.text
+
+class TestCacheStatsEndpoint:
+    def test_cache_stats_endpoint_returns_cache_statistics(self, client):
+        response = client.get("/cache-stats")
+        assert response.status_code == 200
+        body = response.json()
+        assert body["status"] == "success"
+        assert {"hits", "misses", "evictions", "entries", "hit_ratio"} <= body["data"].keys()
+
+def read_sample():
+    return pd.read_csv(os.path.join("data", "cleaned_flight_data.csv"),
+                       dtype={"icao24": str, "callsign": str, "squawk": str},
+                       parse_dates=["time_position", "last_contact"])
+
+@pytest.fixture
+def sample_snapshot():
+    """Fixture to ingest the bundled cleaned flight data sample as the latest snapshot."""
+    drop_table()
+    create_table()
+    insert_data(read_sample(),
+                snapshot_time="2025-05-18_18-44-48")
+    refresh_cache()
+
+class TestAnalyticsEndpointCaching:
+    endpoint = "/flight-counts-by-origin-country"
+
+    def test_analytics_endpoint_returns_an_etag(self, client, sample_snapshot):
+        response = client.get(self.endpoint)
+        assert response.status_code == 200
+        assert response.headers["ETag"].startswith('"')
+        assert response.json()["status"] == "success"
+
+    def test_matching_if_none_match_returns_304(self, client, sample_snapshot):
+        etag = client.get(self.endpoint).headers["ETag"]
+        response = client.get(self.endpoint, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+
+    def test_etag_changes_with_a_new_snapshot(self, client, sample_snapshot):
+        etag = client.get(self.endpoint).headers["ETag"]
+        insert_data(read_sample().head(10), snapshot_time="2025-05-18_18-59-48")
+        refresh_cache()
+        response = client.get(self.endpoint, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert sum(count for _, count in response.json()["data"]) == 10
+
+class TestAsyncDatabaseDriver:
+    @pytest.mark.parametrize("endpoint", [
+        "/flight-counts-by-origin-country",
+        "/fastest-and-slowest-ground-speed-by-origin-country",
+        "/average-ground-speed-of-flights-with-and-without-squawk",
+    ])
+    def test_asyncpg_driver_returns_the_same_data(self, client, sample_snapshot, monkeypatch, endpoint):
+        expected = client.get(endpoint)
+        monkeypatch.setenv("API_DB_DRIVER", "asyncpg")
+        refresh_cache()
+        response = client.get(endpoint)
+        assert response.status_code == 200
+        assert response.json() == expected.json()
+        assert response.headers["ETag"] == expected.headers["ETag"]
+
+    def test_asyncpg_driver_answers_304(self, client, sample_snapshot, monkeypatch):
+        monkeypatch.setenv("API_DB_DRIVER", "asyncpg")
+        monkeypatch.setattr(get_cache(), "version_ttl", 0)
+        etag = client.get("/flight-counts-by-origin-country").headers["ETag"]
+        response = client.get("/flight-counts-by-origin-country", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+
+class TestSpatialEndpoints:
+    def test_bbox_endpoint_returns_aircraft_inside_the_box(self, client, sample_snapshot):
+        response = client.get("/aircraft/bbox", params={"min_lon": -10, "min_lat": 35,
+                                                         "max_lon": 30, "max_lat": 60, "limit": 50})
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert 0 < len(data) <= 50
+        assert all(-10 <= row[3] <= 30 and 35 <= row[4] <= 60 for row in data)
+
+    def test_bbox_endpoint_rejects_inverted_latitudes(self, client):
+        response = client.get("/aircraft/bbox", params={"min_lon": -10, "min_lat": 60,
+                                                         "max_lon": 30, "max_lat": 35})
+        assert response.status_code == 400
+
+    def test_nearest_endpoint_returns_k_aircraft_nearest_first(self, client, sample_snapshot):
+        response = client.get("/aircraft/nearest", params={"lon": 8.68, "lat": 50.11, "k": 3})
+        assert response.status_code == 200
+        distances = [row[-1] for row in response.json()["data"]]
+        assert len(distances) == 3
+        assert distances == sorted(distances)
+
+    def test_radius_endpoint_validates_coordinates(self, client):
+        response = client.get("/aircraft/radius", params={"lon": 200, "lat": 0, "radius_km": 10})
+        assert response.status_code == 422
+
+class TestFlightsEndpoints:
+    def test_flights_pages_cover_the_snapshot_once(self, client, sample_snapshot):
+        icao24s, after = [], None
+        while True:
+            params = {"limit": 2000} if after is None else {"limit": 2000, "after": after}
+            body = client.get("/flights", params=params).json()
+            assert body["snapshot_time"] == "2025-05-18_18-44-48"
+            icao24s += [row[0] for row in body["data"]]
+            after = body["next_after"]
+            if after is None:
+                break
+        assert icao24s == sorted(read_sample()["icao24"])
+
+    def test_flights_rejects_an_invalid_snapshot_time(self, client):
+        assert client.get("/flights", params={"snapshot_time": "yesterday"}).status_code == 400
+
+    def test_flights_export_streams_one_flight_per_line(self, client, sample_snapshot):
+        response = client.get("/flights/export")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert len(lines) == len(read_sample())
+        assert lines[0]["icao24"] == min(read_sample()["icao24"])
+
+    def test_large_responses_are_gzip_compressed(self, client, sample_snapshot):
+        response = client.get("/flights", params={"limit": 1000}, headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert len(response.json()["data"]) == 1000
+
+    def test_bbox_endpoint_returns_the_next_page_cursor(self, client, sample_snapshot):
+        params = {"min_lon": -10, "min_lat": 35, "max_lon": 30, "max_lat": 60, "limit": 20}
+        first = client.get("/aircraft/bbox", params=params).json()
+        second = client.get("/aircraft/bbox", params={**params, "after": first["next_after"]}).json()
+        both = client.get("/aircraft/bbox", params={**params, "limit": 40}).json()
+        assert first["next_after"] == first["data"][-1][0]
+        assert first["data"] + second["data"] == both["data"]
+
+class TestRollupsEndpoints:
+    def test_rollups_endpoint_returns_hourly_rows_per_country(self, client, sample_snapshot):
+        body = client.get("/rollups/hour").json()
+        assert body["fields"][:4] == ["bucket", "origin_country", "snapshots", "flights"]
+        assert {row[0] for row in body["data"]} == {"2025-05-18T18:00:00"}
+        assert sum(row[3] for row in body["data"]) == len(read_sample())
+
+    def test_rollup_summary_sums_the_range(self, client, sample_snapshot):
+        body = client.get("/rollups/minute/summary", params={"start": "2025-05-18_00-00-00",
+                                                              "end": "2025-05-19_00-00-00"}).json()
+        counts = read_sample()["origin_country"].value_counts()
+        assert body["data"][0][:3] == [counts.index[0], 1, int(counts.iloc[0])]
+
+    def test_rollups_reject_an_unknown_granularity(self, client):
+        assert client.get("/rollups/day").status_code == 400
+        assert client.get("/rollups/hour", params={"start": "yesterday"}).status_code == 400
+
+@pytest.fixture
+def sample_tracks():
+    """Fixture to append two snapshots of the sample, ten seconds apart, to the track store."""
+    df = read_sample()
+    store = get_track_store()
+    store.append(df)
+    later = df.copy()
+    later["time_position"] += pd.Timedelta(seconds=10)
+    later["longitude"] += 0.1
+    store.append(later)
+    yield df
+    store.clear()
+
+class TestTrackEndpoints:
+    def test_track_endpoint_returns_points_oldest_first(self, client, sample_tracks):
+        icao24 = sample_tracks["icao24"].iloc[0]
+        response = client.get(f"/tracks/{icao24}")
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert data["fields"][0] == "time"
+        assert len(data["points"]) == 2
+        assert data["points"][0][0] + 10 == data["points"][1][0]
+
+    def test_track_endpoint_returns_404_for_unknown_aircraft(self, client):
+        response = client.get("/tracks/000000")
+        assert response.status_code == 404
+
+    def test_tracks_export_streams_one_aircraft_per_line(self, client, sample_tracks):
+        response = client.get("/tracks")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = response.text.splitlines()
+        assert len(lines) == get_track_store().stats()["aircraft"]
+
 class TestFetchFlightsEndpoint:
     def test_fetch_flights_endpoint_returns_number_of_records_inserted(self, client):
         endpoint = "/fetch-flights"
         response = client.get(endpoint)
-        assert response.status_code == 200
-        assert response.json()["status"] == "success"
-        assert response.json()["records_inserted"] > 0
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        deadline = time.monotonic() + 120
+        while time.monotonic() < deadline:
+            job = client.get(f"/jobs/{job_id}").json()["data"]
+            if job["status"] in ("succeeded", "failed"):
+                break
+            time.sleep(0.5)
+        assert job["status"] == "succeeded", job["error"]
+        assert job["records_inserted"] > 0
+        assert {"fetch", "clean", "load", "insert"} <= job["stage_timings"].keys()
 
     @pytest.mark.skip(reason="Cannot reliably simulate fetch-flights error without mocking")
     def test_fetch_flights_endpoint_returns_error_on_failure(self, client):
@@ -35,6 +274,12 @@ class TestFetchFlightsEndpoint:
         assert response.status_code == 500
         assert "detail" in response.json()
 
+class TestJobsEndpoint:
+    def test_jobs_endpoint_returns_404_for_unknown_job(self, client):
+        response = client.get("/jobs/unknown")
+        assert response.status_code == 404
+        assert "detail" in response.json()
+
 class TestFlightCountsByOriginCountryEndpoint:
     def test_flight_counts_by_origin_country_endpoint_returns_counts(self, client):
         endpoint = "/flight-counts-by-origin-country"
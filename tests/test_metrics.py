@@ -0,0 +1,64 @@
+import asyncio
+import pytest
+from prometheus_client import REGISTRY
+from src.metrics import observe_stage, observe_query
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+class TestObserveStage:
+    def test_records_the_duration_of_a_stage(self):
+        before = sample("opensky_pipeline_stage_seconds_count", stage="test_stage")
+        with observe_stage("test_stage"):
+            pass
+        assert sample("opensky_pipeline_stage_seconds_count", stage="test_stage") == before + 1
+
+    def test_counts_errors_by_type_and_reraises(self):
+        before = sample("opensky_pipeline_stage_errors_total", stage="test_failing_stage", error="KeyError")
+        with pytest.raises(KeyError):
+            with observe_stage("test_failing_stage"):
+                raise KeyError("missing")
+        assert sample("opensky_pipeline_stage_errors_total",
+                      stage="test_failing_stage", error="KeyError") == before + 1
+        assert sample("opensky_pipeline_stage_seconds_count", stage="test_failing_stage") >= 1
+
+class TestObserveQuery:
+    def test_records_duration_and_rows_of_a_query(self):
+        @observe_query()
+        def metrics_test_query(count):
+            return list(range(count))
+
+        assert metrics_test_query(3) == [0, 1, 2]
+        metrics_test_query(2)
+        labels = {"query": "metrics_test_query", "driver": "psycopg2"}
+        assert sample("opensky_db_query_seconds_count", **labels) == 2
+        assert sample("opensky_db_query_rows_total", **labels) == 5
+
+    def test_counts_rows_with_a_custom_function(self):
+        @observe_query(rows=lambda result, rows: len(rows))
+        def metrics_test_insert(rows):
+            return "2025-05-18"
+
+        metrics_test_insert(["a", "b"])
+        assert sample("opensky_db_query_rows_total", query="metrics_test_insert", driver="psycopg2") == 2
+
+    def test_counts_errors_by_type_and_reraises(self):
+        @observe_query(rows=None)
+        def metrics_test_failing_query():
+            raise ValueError("bad query")
+
+        with pytest.raises(ValueError):
+            metrics_test_failing_query()
+        labels = {"query": "metrics_test_failing_query", "driver": "psycopg2"}
+        assert sample("opensky_db_query_errors_total", error="ValueError", **labels) == 1
+        assert sample("opensky_db_query_seconds_count", **labels) == 1
+
+    def test_awaits_coroutine_functions(self):
+        @observe_query(driver="asyncpg")
+        async def metrics_test_async_query():
+            return [("a",)]
+
+        assert asyncio.run(metrics_test_async_query()) == [("a",)]
+        labels = {"query": "metrics_test_async_query", "driver": "asyncpg"}
+        assert sample("opensky_db_query_seconds_count", **labels) == 1
+        assert sample("opensky_db_query_rows_total", **labels) == 1
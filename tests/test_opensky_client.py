@@ -0,0 +1,107 @@
+import os
+import json
+import email.utils
+import datetime
+import pytest
+import requests
+from src.opensky_client import (OpenSkyClient, parse_retry_after, states_params, get_states_filters,
+                                reset_opensky_client)
+from src.fetch import get_flight_data
+from tests.conftest import SAMPLE_PAYLOAD
+
+@pytest.fixture
+def waits():
+    return []
+
+@pytest.fixture
+def client(mock_opensky, waits):
+    client = OpenSkyClient(base_url=mock_opensky.url, max_retries=3, backoff=0.5, sleep=waits.append)
+    yield client
+    client.close()
+
+class TestOpenSkyClient:
+    def test_get_states_decodes_a_compressed_response(self, client, mock_opensky):
+        response = client.get_states()
+        assert response.json() == json.loads(SAMPLE_PAYLOAD)
+        assert "gzip" in mock_opensky.requests[0]["headers"]["Accept-Encoding"]
+        assert mock_opensky.bytes_sent < len(SAMPLE_PAYLOAD) / 3
+
+    def test_session_reuses_one_connection(self, client, mock_opensky):
+        for _ in range(3):
+            client.get_states()
+        assert len({request["port"] for request in mock_opensky.requests}) == 1
+
+    def test_filters_are_sent_as_query_parameters(self, client, mock_opensky):
+        client.get_states(bbox=(5.0, 45.0, 15.0, 55.0), icao24=["3C6444", "4b1817"], time=1747593888)
+        request = mock_opensky.requests[0]
+        assert request["path"] == "/api/states/all"
+        assert request["params"] == {"lamin": ["45.0"], "lomin": ["5.0"], "lamax": ["55.0"], "lomax": ["15.0"],
+                                     "icao24": ["3c6444", "4b1817"], "time": ["1747593888"]}
+
+    def test_rate_limit_waits_as_long_as_the_header_asks(self, client, mock_opensky, waits):
+        mock_opensky.responses.append((429, {"X-Rate-Limit-Retry-After-Seconds": "7"}, b"Too many requests"))
+        assert client.get_states().status_code == 200
+        assert waits == [7.0]
+        assert len(mock_opensky.requests) == 2
+
+    def test_server_errors_back_off_exponentially_with_jitter(self, client, mock_opensky, waits):
+        mock_opensky.responses.extend([(503, {}, b""), (502, {}, b""), (500, {}, b"")])
+        assert client.get_states().status_code == 200
+        assert len(waits) == 3
+        assert all(0 <= wait <= 0.5 * 2 ** attempt for attempt, wait in enumerate(waits))
+
+    def test_gives_up_after_max_retries(self, client, mock_opensky, waits):
+        mock_opensky.responses.extend([(503, {}, b"")] * 4)
+        with pytest.raises(requests.HTTPError):
+            client.get_states()
+        assert len(mock_opensky.requests) == 4
+        assert len(waits) == 3
+
+    def test_rate_limit_resetting_too_late_fails_at_once(self, client, mock_opensky, waits):
+        mock_opensky.responses.append((429, {"X-Rate-Limit-Retry-After-Seconds": "3600"}, b""))
+        with pytest.raises(requests.HTTPError):
+            client.get_states()
+        assert waits == []
+
+    def test_client_errors_are_not_retried(self, client, mock_opensky, waits):
+        mock_opensky.responses.append((400, {}, b"Bad request"))
+        with pytest.raises(requests.HTTPError):
+            client.get_states()
+        assert len(mock_opensky.requests) == 1
+
+    def test_connection_errors_are_retried(self, waits):
+        client = OpenSkyClient(base_url="http://127.0.0.1:9/api", max_retries=2, sleep=waits.append)
+        with pytest.raises(requests.ConnectionError):
+            client.get_states()
+        assert len(waits) == 2
+
+class TestParameters:
+    def test_retry_after_accepts_seconds_and_http_dates(self):
+        assert parse_retry_after({"Retry-After": "12"}) == 12.0
+        later = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=30)
+        assert 25 < parse_retry_after({"Retry-After": email.utils.format_datetime(later, usegmt=True)}) <= 30
+        assert parse_retry_after({}) is None
+
+    def test_bbox_crossing_the_antimeridian_is_rejected(self):
+        with pytest.raises(ValueError):
+            states_params(bbox=(170.0, -10.0, -170.0, 10.0))
+
+    def test_filters_are_read_from_environment(self, monkeypatch):
+        monkeypatch.setenv("OPENSKY_BBOX", "-10,35,30,60")
+        monkeypatch.setenv("OPENSKY_ICAO24", "3c6444, 4b1817")
+        assert get_states_filters() == {"bbox": (-10.0, 35.0, 30.0, 60.0), "icao24": ["3c6444", "4b1817"]}
+
+class TestFetchWithLocalServer:
+    def test_get_flight_data_fetches_from_opensky_api_url(self, mock_opensky, s3, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setenv("OPENSKY_API_URL", mock_opensky.url)
+        monkeypatch.setenv("OPENSKY_BBOX", "-10,35,30,60")
+        reset_opensky_client()
+        try:
+            raw_data, timestamp = get_flight_data()
+        finally:
+            reset_opensky_client()
+        assert raw_data == json.loads(SAMPLE_PAYLOAD)
+        assert mock_opensky.requests[0]["params"]["lamin"] == ["35.0"]
+        with open(os.path.join("data", "raw_flight_data.json")) as raw_file:
+            assert json.load(raw_file) == raw_data
@@ -0,0 +1,113 @@
+import time
+import threading
+import pytest
+from src.pipeline import PipelineGraph, run_pipeline
+from src.opensky_client import reset_opensky_client
+from src.db_manager import create_table, drop_table, to_snapshot_time
+from src.dedup import get_deduplicator
+from utils.db_utils import db_cursor
+from tests.conftest import S3_TEST_BUCKET
+
+class TestPipelineGraph:
+    def test_stages_receive_the_results_of_their_dependencies(self):
+        graph = PipelineGraph()
+        graph.add("fetch", lambda: 2)
+        graph.add("clean", lambda fetched: fetched * 10, after=["fetch"])
+        graph.add("load", lambda fetched, cleaned: fetched + cleaned, after=["fetch", "clean"])
+        assert graph.run() == {"fetch": 2, "clean": 20, "load": 22}
+
+    def test_independent_branches_run_concurrently(self):
+        started = threading.Barrier(2, timeout=5)
+        graph = PipelineGraph(max_workers=2)
+        graph.add("fetch", lambda: None)
+        # Each branch waits for the other to start, which only returns if both run at once
+        graph.add("archive", lambda _: started.wait(), after=["fetch"], critical=False)
+        graph.add("insert", lambda _: started.wait(), after=["fetch"])
+        graph.run()
+        assert graph.errors == {}
+
+    def test_every_stage_is_timed(self):
+        timings = {}
+        graph = PipelineGraph(timings)
+        graph.add("fetch", lambda: time.sleep(0.05))
+        graph.add("archive", lambda _: None, after=["fetch"], critical=False)
+        graph.run()
+        assert timings.keys() == {"fetch", "archive"}
+        assert timings["fetch"] >= 0.05
+
+    def test_non_critical_failure_skips_only_its_dependents(self):
+        def upload(_):
+            raise ConnectionError("S3 is down")
+        graph = PipelineGraph()
+        graph.add("fetch", lambda: 1)
+        graph.add("archive", upload, after=["fetch"], critical=False)
+        graph.add("report", lambda _: "sent", after=["archive"], critical=False)
+        graph.add("insert", lambda fetched: fetched + 1, after=["fetch"])
+        results = graph.run()
+        assert results == {"fetch": 1, "insert": 2}
+        assert graph.errors == {"archive": "ConnectionError: S3 is down", "report": "skipped: archive failed"}
+
+    def test_critical_failure_is_raised_and_stops_later_stages(self):
+        ran = []
+        def insert(_):
+            raise RuntimeError("database unavailable")
+        graph = PipelineGraph()
+        graph.add("fetch", lambda: 1)
+        graph.add("insert", insert, after=["fetch"])
+        graph.add("cache", lambda _: ran.append("cache"), after=["insert"])
+        with pytest.raises(RuntimeError, match="database unavailable"):
+            graph.run()
+        assert ran == []
+
+    def test_invalid_graphs_are_rejected(self):
+        graph = PipelineGraph()
+        graph.add("fetch", lambda: 1)
+        graph.add("archive", lambda _: None, after=["fetch"], critical=False)
+        with pytest.raises(ValueError):
+            graph.add("fetch", lambda: 2)
+        with pytest.raises(ValueError):
+            graph.add("clean", lambda _: None, after=["download"])
+        with pytest.raises(ValueError):
+            graph.add("insert", lambda _: None, after=["archive"])
+
+@pytest.fixture
+def local_opensky(mock_opensky, tmp_path, monkeypatch):
+    """Fixture to run the pipeline against the mock OpenSky API in an empty directory."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OPENSKY_API_URL", mock_opensky.url)
+    monkeypatch.delenv("DEDUP_TTL_SECONDS", raising=False)
+    monkeypatch.delenv("INGEST_MODE", raising=False)
+    reset_opensky_client()
+    drop_table()
+    create_table()
+    yield mock_opensky
+    reset_opensky_client()
+
+class TestRunPipeline:
+    def test_pipeline_archives_raw_and_cleaned_files(self, local_opensky, s3):
+        result = run_pipeline()
+        keys = sorted(item["Key"] for item in s3.list_objects_v2(Bucket=S3_TEST_BUCKET)["Contents"])
+        assert "stage_errors" not in result
+        assert keys == sorted(f"data/{result['snapshot_time']}/{name}" for name in (
+            "raw_flight_data.json", "raw_flight_data.csv", "cleaned_flight_data.csv", "cleaned_flight_data.jsonl"))
+        assert {"fetch", "archive_raw", "clean", "load", "archive_cleaned", "insert"} <= result["stage_timings"].keys()
+
+    def test_failed_uploads_do_not_fail_the_database_load(self, local_opensky, s3, monkeypatch):
+        monkeypatch.setenv("S3_DATA_BUCKET", "missing-bucket")
+        result = run_pipeline()
+        assert set(result["stage_errors"]) == {"archive_raw", "archive_cleaned"}
+        with db_cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM flights;")
+            assert cur.fetchone()[0] == result["records_inserted"] > 0
+
+    def test_deduplication_leaves_the_stored_snapshot_whole(self, local_opensky, s3, monkeypatch):
+        monkeypatch.setenv("DEDUP_TTL_SECONDS", "900")
+        get_deduplicator().clear()
+        run_pipeline()
+        # The mock serves the same states again, so every one of them is a repeat
+        result = run_pipeline()
+        assert result["records_deduplicated"] == result["records_inserted"] > 0
+        with db_cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM flights WHERE snapshot_time = %s;",
+                        (to_snapshot_time(result["snapshot_time"]),))
+            assert cur.fetchone()[0] == result["records_inserted"]
@@ -0,0 +1,95 @@
+import gzip
+import json
+import os
+import shutil
+import pytest
+from src.replay import list_snapshots, decode_body, read_snapshot, replay
+from src.transform import clean_data
+from src.db_manager import drop_table
+from src.upload import upload_artifacts
+from utils.db_utils import db_cursor
+from tests.conftest import S3_TEST_BUCKET as BUCKET
+
+RAW_SAMPLE = os.path.join("data", "raw_flight_data.json")
+TIMESTAMPS = ["2025-05-17_23-59-50", "2025-05-18_00-00-10", "2025-05-18_18-44-48"]
+
+@pytest.fixture(scope="module")
+def raw_sample():
+    """Fixture to read the bundled raw flight data sample."""
+    with open(RAW_SAMPLE, encoding="utf-8") as json_file:
+        return json.load(json_file)
+
+@pytest.fixture
+def archive(tmp_path):
+    """Fixture to lay out an archive directory of raw snapshots, the last one gzip compressed."""
+    for timestamp in TIMESTAMPS[:-1]:
+        os.makedirs(tmp_path / timestamp)
+        shutil.copy(RAW_SAMPLE, tmp_path / timestamp / "raw_flight_data.json")
+    os.makedirs(tmp_path / TIMESTAMPS[-1])
+    with open(RAW_SAMPLE, "rb") as source, gzip.open(tmp_path / TIMESTAMPS[-1] / "raw_flight_data.json.gz", "wb") as target:
+        shutil.copyfileobj(source, target)
+    os.makedirs(tmp_path / "not-a-snapshot")
+    return tmp_path
+
+def stored_snapshots():
+    with db_cursor() as cur:
+        cur.execute("SELECT to_char(snapshot_time, 'YYYY-MM-DD_HH24-MI-SS'), record_count FROM snapshots ORDER BY 1;")
+        return cur.fetchall()
+
+class TestListSnapshots:
+    def test_lists_local_snapshots_oldest_first(self, archive):
+        snapshots = list_snapshots(str(archive))
+        assert [timestamp for timestamp, _ in snapshots] == TIMESTAMPS
+        assert snapshots[-1][1].endswith("raw_flight_data.json.gz")
+
+    def test_filters_by_time_range(self, archive):
+        snapshots = list_snapshots(str(archive), since="2025-05-18_00-00-00", until="2025-05-18_12-00-00")
+        assert [timestamp for timestamp, _ in snapshots] == ["2025-05-18_00-00-10"]
+
+    def test_lists_s3_snapshots_uploaded_by_fetch(self, s3):
+        upload_artifacts([(RAW_SAMPLE, f"data/{TIMESTAMPS[0]}/raw_flight_data.json"),
+                          (RAW_SAMPLE, f"data/{TIMESTAMPS[0]}/cleaned_flight_data.json")],
+                         bucket_name=BUCKET, compression="none")
+        assert list_snapshots(f"s3://{BUCKET}") == [
+            (TIMESTAMPS[0], f"s3://{BUCKET}/data/{TIMESTAMPS[0]}/raw_flight_data.json")]
+
+    def test_missing_directory_raises(self, tmp_path):
+        with pytest.raises(ValueError):
+            list_snapshots(str(tmp_path / "missing"))
+
+class TestReadSnapshot:
+    def test_decode_body_recognises_gzip_without_content_encoding(self):
+        assert decode_body(gzip.compress(b'{"states": []}')) == b'{"states": []}'
+        assert decode_body(b'{"states": []}') == b'{"states": []}'
+
+    def test_reads_gzip_encoded_s3_object(self, s3, raw_sample):
+        upload_artifacts([(RAW_SAMPLE, "data/2025-05-18_18-44-48/raw_flight_data.json")],
+                         bucket_name=BUCKET, compression="gzip")
+        assert read_snapshot(f"s3://{BUCKET}/data/2025-05-18_18-44-48/raw_flight_data.json") == raw_sample
+
+class TestReplay:
+    def test_replays_local_snapshots_across_processes(self, archive, raw_sample):
+        drop_table()
+        report = replay(list_snapshots(str(archive)), workers=2)
+        records = len(clean_data(raw_sample, TIMESTAMPS[0])[0])
+        assert report["snapshots"] == 3
+        assert report["records"] == 3 * records
+        assert report["failures"] == []
+        assert stored_snapshots() == [(timestamp, records) for timestamp in TIMESTAMPS]
+
+    def test_replays_s3_snapshots_in_process(self, s3, raw_sample):
+        upload_artifacts([(RAW_SAMPLE, f"data/{TIMESTAMPS[-1]}/raw_flight_data.json")], bucket_name=BUCKET)
+        drop_table()
+        report = replay(list_snapshots(f"s3://{BUCKET}"), workers=1)
+        assert report["snapshots"] == 1
+        assert stored_snapshots() == [(TIMESTAMPS[-1], len(clean_data(raw_sample, TIMESTAMPS[-1])[0]))]
+
+    def test_reports_failed_snapshots_and_replays_the_others(self, archive):
+        with open(archive / TIMESTAMPS[0] / "raw_flight_data.json", "w") as broken:
+            broken.write("{not json")
+        drop_table()
+        progress = []
+        report = replay(list_snapshots(str(archive)), workers=1, progress=progress.append)
+        assert report["snapshots"] == 2
+        assert [failure["timestamp"] for failure in report["failures"]] == [TIMESTAMPS[0]]
+        assert len(progress) == 3
@@ -0,0 +1,27 @@
+import json
+import datetime
+from decimal import Decimal
+import numpy as np
+from src.responses import dumps, iter_ndjson, ORJSONResponse
+
+class TestDumps:
+    def test_serialises_postgres_and_numpy_values(self):
+        content = {"data": [("GB", Decimal("412.50"), datetime.datetime(2025, 5, 18, 18, 44, 48)),
+                            (np.float32(1.5), np.int64(3), None)]}
+        assert json.loads(dumps(content)) == {"data": [["GB", 412.5, "2025-05-18T18:44:48"], [1.5, 3, None]]}
+
+    def test_nan_becomes_null(self):
+        assert dumps([float("nan")]) == b"[null]"
+
+    def test_response_renders_with_orjson(self):
+        assert ORJSONResponse({"value": Decimal("1.25")}).body == b'{"value":1.25}'
+
+class TestIterNdjson:
+    def test_chunks_hold_whole_lines(self):
+        chunks = list(iter_ndjson(({"n": n} for n in range(5)), batch_size=2))
+        assert len(chunks) == 3
+        assert all(chunk.endswith(b"\n") for chunk in chunks)
+        assert [json.loads(line) for line in b"".join(chunks).splitlines()] == [{"n": n} for n in range(5)]
+
+    def test_no_records_no_chunks(self):
+        assert list(iter_ndjson([])) == []
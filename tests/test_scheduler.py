@@ -0,0 +1,148 @@
+import threading
+import time
+import pytest
+from psycopg2 import OperationalError
+from src.scheduler import IngestScheduler, PollerLock
+
+def wait_for(job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while job.status in ("queued", "running") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job
+
+@pytest.fixture
+def scheduler():
+    schedulers = []
+    def make(run, **kwargs):
+        scheduler = IngestScheduler(run, **kwargs)
+        schedulers.append(scheduler)
+        return scheduler
+    yield make
+    for scheduler in schedulers:
+        scheduler.stop(timeout=5)
+
+def successful_run(stage_timings):
+    stage_timings["fetch"] = 0.1
+    stage_timings["insert"] = 0.2
+    return {"records_inserted": 42, "snapshot_time": "2025-05-18_12-00-00", "stage_timings": stage_timings}
+
+class TestIngestScheduler:
+    def test_enqueue_returns_before_the_job_finishes(self, scheduler):
+        release = threading.Event()
+        def slow_run(stage_timings):
+            release.wait(5)
+            return successful_run(stage_timings)
+        ingest = scheduler(slow_run)
+
+        job = ingest.enqueue()
+        assert job.status in ("queued", "running")
+        release.set()
+        assert wait_for(job).status == "succeeded"
+
+    def test_job_records_result_and_stage_timings(self, scheduler):
+        ingest = scheduler(successful_run)
+        job = wait_for(ingest.enqueue())
+        data = job.to_dict()
+        assert data["status"] == "succeeded"
+        assert data["records_inserted"] == 42
+        assert data["snapshot_time"] == "2025-05-18_12-00-00"
+        assert data["stage_timings"] == {"fetch": 0.1, "insert": 0.2}
+        assert data["started_at"] and data["finished_at"]
+        assert ingest.get_job(job.id) is job
+
+    def test_failed_job_records_error_and_worker_keeps_running(self, scheduler):
+        def failing_run(stage_timings):
+            stage_timings["fetch"] = 0.1
+            raise ValueError("OpenSky unavailable")
+        ingest = scheduler(failing_run)
+        job = wait_for(ingest.enqueue())
+        assert job.status == "failed"
+        assert job.error == "OpenSky unavailable"
+        assert job.stage_timings == {"fetch": 0.1}
+
+        ingest.run = successful_run
+        assert wait_for(ingest.enqueue()).status == "succeeded"
+
+    def test_requests_while_a_job_is_queued_share_that_job(self, scheduler):
+        release = threading.Event()
+        def slow_run(stage_timings):
+            release.wait(5)
+            return successful_run(stage_timings)
+        ingest = scheduler(slow_run)
+
+        running = ingest.enqueue()
+        while running.status == "queued":
+            time.sleep(0.01)
+        queued = ingest.enqueue()
+        assert queued is not running
+        assert ingest.enqueue() is queued
+        release.set()
+        assert wait_for(queued).status == "succeeded"
+
+    def test_stop_cancels_queued_jobs_and_waits_for_the_running_one(self, scheduler):
+        release = threading.Event()
+        def slow_run(stage_timings):
+            release.wait(5)
+            return successful_run(stage_timings)
+        ingest = scheduler(slow_run)
+
+        running = ingest.enqueue()
+        while running.status == "queued":
+            time.sleep(0.01)
+        queued = ingest.enqueue()
+        threading.Timer(0.1, release.set).start()
+        ingest.stop(timeout=5)
+        assert running.status == "succeeded"
+        assert queued.status == "cancelled"
+        assert queued.started_at is None
+
+    def test_job_history_is_bounded(self, scheduler):
+        ingest = scheduler(successful_run, max_jobs=3)
+        jobs = [wait_for(ingest.enqueue()) for _ in range(5)]
+        assert ingest.get_job(jobs[0].id) is None
+        assert ingest.get_job(jobs[1].id) is None
+        assert all(ingest.get_job(job.id) is job for job in jobs[2:])
+
+    def test_setup_runs_once_before_the_first_job(self, scheduler):
+        calls = []
+        def setup():
+            calls.append("setup")
+            if len(calls) == 1:
+                raise ConnectionError("database unavailable")
+        ingest = scheduler(successful_run, setup=setup)
+        assert wait_for(ingest.enqueue()).status == "failed"
+        assert wait_for(ingest.enqueue()).status == "succeeded"
+        assert wait_for(ingest.enqueue()).status == "succeeded"
+        assert calls == ["setup", "setup"]
+
+    def test_poller_enqueues_jobs_on_the_interval(self, scheduler):
+        ingest = scheduler(successful_run, interval=0.05)
+        ingest.start()
+        time.sleep(0.5)
+        triggers = [job.trigger for job in ingest._jobs.values()]
+        assert len(triggers) >= 2
+        assert set(triggers) == {"schedule"}
+
+    def test_poller_only_enqueues_jobs_while_leading(self, scheduler):
+        ingest = scheduler(successful_run, interval=0.05, leader=lambda: False)
+        ingest.start()
+        time.sleep(0.3)
+        assert ingest._jobs == {}
+
+class TestPollerLock:
+    def test_one_process_holds_the_lock_until_it_releases_it(self):
+        first, second = PollerLock(key=42), PollerLock(key=42)
+        try:
+            assert first.acquire()
+            assert first.acquire()
+            assert not second.acquire()
+            first.release()
+            assert second.acquire()
+        finally:
+            first.release()
+            second.release()
+
+    def test_unreachable_database_does_not_lead(self):
+        def connect():
+            raise OperationalError("connection refused")
+        assert not PollerLock(connect=connect).acquire()
@@ -0,0 +1,125 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from src.cache import get_cache
+from src.db_manager import create_table, drop_table, insert_data, get_snapshot_version
+from src.spatial import (SpatialIndex, get_spatial_index, haversine_km, split_bbox, radius_bboxes,
+                         find_in_bbox, find_within_radius, find_nearest)
+
+EUROPE = (-10.0, 35.0, 30.0, 60.0)
+FRANKFURT = (8.68, 50.11)
+
+@pytest.fixture(scope="module")
+def sample_data():
+    """Fixture to read the bundled cleaned flight data sample."""
+    return pd.read_csv(os.path.join("data", "cleaned_flight_data.csv"),
+                       dtype={"icao24": str, "callsign": str, "squawk": str},
+                       parse_dates=["time_position", "last_contact"])
+
+@pytest.fixture(scope="module")
+def ingested(sample_data):
+    """Fixture to ingest the sample as the latest snapshot."""
+    drop_table()
+    create_table()
+    insert_data(sample_data, snapshot_time="2025-05-18_18-44-48")
+    get_cache().invalidate()
+
+@pytest.fixture
+def memory_index(sample_data, ingested):
+    """Fixture to index the ingested snapshot in memory."""
+    get_spatial_index().build(sample_data, get_snapshot_version())
+    yield
+    get_spatial_index().clear()
+
+def brute_force_bbox(df, min_lon, min_lat, max_lon, max_lat):
+    inside = df["latitude"].between(min_lat, max_lat)
+    if min_lon <= max_lon:
+        inside &= df["longitude"].between(min_lon, max_lon)
+    else:
+        inside &= (df["longitude"] >= min_lon) | (df["longitude"] <= max_lon)
+    return sorted(df.loc[inside, "icao24"])
+
+class TestGeometry:
+    def test_haversine_km_between_known_cities(self):
+        # London to Paris is about 344 km
+        assert haversine_km(-0.1278, 51.5074, 2.3522, 48.8566) == pytest.approx(343.5, abs=1)
+
+    def test_split_bbox_across_antimeridian(self):
+        assert split_bbox(170, -10, -170, 10) == [(170, -10, 180.0, 10), (-180.0, -10, -170, 10)]
+
+    def test_split_bbox_rejects_invalid_latitudes(self):
+        with pytest.raises(ValueError):
+            split_bbox(0, 10, 1, 5)
+
+    def test_radius_bboxes_cover_the_circle(self):
+        lon, lat, radius = 179.5, 60.0, 300.0
+        boxes = radius_bboxes(lon, lat, radius)
+        assert len(boxes) == 2
+        rng = np.random.default_rng(0)
+        points = np.column_stack([rng.uniform(-180, 180, 20000), rng.uniform(50, 70, 20000)])
+        near = points[haversine_km(lon, lat, points[:, 0], points[:, 1]) <= radius]
+        covered = np.zeros(len(near), dtype=bool)
+        for min_lon, min_lat, max_lon, max_lat in boxes:
+            covered |= ((near[:, 0] >= min_lon) & (near[:, 0] <= max_lon)
+                        & (near[:, 1] >= min_lat) & (near[:, 1] <= max_lat))
+        assert covered.all()
+
+    def test_radius_bboxes_span_every_longitude_near_a_pole(self):
+        assert radius_bboxes(0, 89, 500) == [(-180.0, pytest.approx(84.5, abs=0.1), 180.0, 90.0)]
+
+class TestSpatialIndex:
+    @pytest.mark.parametrize("box", [EUROPE, (170.0, -50.0, -170.0, 50.0), (-180.0, -90.0, 180.0, 90.0),
+                                     (0.5, 0.5, 0.6, 0.6)])
+    def test_search_matches_brute_force(self, sample_data, box):
+        index = SpatialIndex(sample_data, "v1", cell_degrees=2.5)
+        positions = index.search(split_bbox(*box))
+        assert [record[0] for record in index.records(positions)] == brute_force_bbox(sample_data, *box)
+
+class TestSpatialQueries:
+    def test_memory_and_postgres_bbox_results_match(self, sample_data, ingested):
+        from_postgres = find_in_bbox(*EUROPE)
+        get_spatial_index().build(sample_data, get_snapshot_version())
+        try:
+            from_memory = find_in_bbox(*EUROPE)
+        finally:
+            get_spatial_index().clear()
+        assert len(from_memory) > 0
+        assert from_memory == from_postgres
+        assert [row[0] for row in from_memory] == brute_force_bbox(sample_data, *EUROPE)
+
+    def test_bbox_limit_keeps_the_first_aircraft_by_icao24(self, ingested, memory_index):
+        assert find_in_bbox(*EUROPE, limit=5) == find_in_bbox(*EUROPE)[:5]
+
+    @pytest.mark.parametrize("use_memory_index", [True, False])
+    def test_bbox_after_returns_the_next_page(self, sample_data, ingested, use_memory_index):
+        if use_memory_index:
+            get_spatial_index().build(sample_data, get_snapshot_version())
+        try:
+            first_page = find_in_bbox(*EUROPE, limit=5)
+            next_page = find_in_bbox(*EUROPE, limit=5, after=first_page[-1][0])
+            everything = find_in_bbox(*EUROPE)
+        finally:
+            get_spatial_index().clear()
+        assert first_page + next_page == everything[:10]
+
+    @pytest.mark.parametrize("use_memory_index", [True, False])
+    def test_radius_matches_brute_force(self, sample_data, ingested, use_memory_index):
+        if use_memory_index:
+            get_spatial_index().build(sample_data, get_snapshot_version())
+        try:
+            result = find_within_radius(*FRANKFURT, 250)
+        finally:
+            get_spatial_index().clear()
+        distances = haversine_km(*FRANKFURT, sample_data["longitude"], sample_data["latitude"])
+        assert sorted(row[0] for row in result) == sorted(sample_data.loc[distances <= 250, "icao24"])
+        assert [row[-1] for row in result] == sorted(row[-1] for row in result)
+
+    def test_nearest_returns_the_k_closest_aircraft(self, sample_data, ingested, memory_index):
+        result = find_nearest(-30.0, -40.0, 5)
+        distances = haversine_km(-30.0, -40.0, sample_data["longitude"], sample_data["latitude"])
+        assert [row[-1] for row in result] == [round(distance, 3) for distance in sorted(distances)[:5]]
+
+    def test_historical_snapshot_is_searched_in_postgres(self, sample_data, ingested, memory_index):
+        assert find_in_bbox(*EUROPE, snapshot_time="2025-05-18_18-44-48") == find_in_bbox(*EUROPE)
+        assert find_in_bbox(*EUROPE, snapshot_time="2025-05-17_00-00-00") == []
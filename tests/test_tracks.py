@@ -0,0 +1,95 @@
+import json
+import os
+import pandas as pd
+import pytest
+from src.tracks import TrackStore, TRACK_FIELDS
+
+@pytest.fixture(scope="module")
+def sample_data():
+    """Fixture to read the bundled cleaned flight data sample."""
+    return pd.read_csv(os.path.join("data", "cleaned_flight_data.csv"),
+                       dtype={"icao24": str, "callsign": str, "squawk": str},
+                       parse_dates=["time_position", "last_contact"])
+
+def moved(df, seconds):
+    """The snapshot seconds later, with every aircraft moved east by seconds / 100 degrees."""
+    later = df.copy()
+    later["time_position"] += pd.Timedelta(seconds=seconds)
+    later["last_contact"] += pd.Timedelta(seconds=seconds)
+    later["longitude"] += seconds / 100
+    return later
+
+class TestTrackStore:
+    def test_track_returns_points_oldest_first(self, sample_data):
+        store = TrackStore(track_length=8)
+        for seconds in (0, 10, 20):
+            store.append(moved(sample_data, seconds))
+        row = sample_data.iloc[0]
+        points = store.track(row["icao24"])
+        assert len(points) == 3
+        assert len(points[0]) == len(TRACK_FIELDS)
+        assert [point[0] for point in points] == [int(row["time_position"].timestamp()) + s for s in (0, 10, 20)]
+        assert [point[1] for point in points] == pytest.approx([row["longitude"] + s / 100 for s in (0, 10, 20)])
+        assert points[-1][2:] == pytest.approx([row["latitude"], row["baro_altitude"],
+                                                row["velocity"], row["true_track"]], abs=0.05)
+
+    def test_ring_buffer_keeps_the_latest_points(self, sample_data):
+        store = TrackStore(track_length=4)
+        for seconds in range(0, 100, 10):
+            store.append(moved(sample_data, seconds))
+        row = sample_data.iloc[0]
+        times = [point[0] for point in store.track(row["icao24"])]
+        assert times == [int(row["time_position"].timestamp()) + s for s in (60, 70, 80, 90)]
+
+    def test_unchanged_positions_are_not_repeated(self, sample_data):
+        store = TrackStore()
+        store.append(sample_data)
+        assert store.append(sample_data)["points"] == 0
+        assert len(store.track(sample_data["icao24"].iloc[0])) == 1
+
+    def test_missing_values_are_returned_as_none(self, sample_data):
+        store = TrackStore()
+        store.append(sample_data)
+        icao24 = sample_data.loc[sample_data["baro_altitude"].isna(), "icao24"].iloc[0]
+        assert store.track(icao24)[0][3] is None
+
+    def test_unknown_aircraft_has_no_track(self, sample_data):
+        store = TrackStore()
+        store.append(sample_data)
+        assert store.track("000000") is None
+
+    def test_aircraft_not_seen_within_ttl_are_dropped_and_slots_reused(self, sample_data):
+        store = TrackStore(ttl_seconds=60, initial_slots=len(sample_data))
+        store.append(sample_data)
+        slots = store.stats()["slots"]
+        later = sample_data.head(100).copy()
+        later["icao24"] = later["icao24"] + "-new"
+        later["time_position"] = sample_data["time_position"].max() + pd.Timedelta(seconds=120)
+        result = store.append(later)
+        assert store.stats()["aircraft"] == 100
+        assert result["expired"] > 0
+        assert store.track(sample_data["icao24"].iloc[0]) is None
+        assert store.stats()["slots"] == slots
+
+    def test_store_grows_past_its_initial_slots(self, sample_data):
+        store = TrackStore(ttl_seconds=10**9, initial_slots=16)
+        store.append(sample_data)
+        stats = store.stats()
+        assert stats["aircraft"] == sample_data["icao24"].nunique()
+        assert stats["slots"] >= stats["aircraft"]
+
+    def test_iter_ndjson_exports_every_track(self, sample_data):
+        store = TrackStore()
+        store.append(sample_data)
+        store.append(moved(sample_data, 10))
+        lines = [json.loads(line) for line in store.iter_ndjson(batch_size=1000)]
+        assert len(lines) == store.stats()["aircraft"]
+        assert {line["icao24"]: line["points"] for line in lines}[lines[0]["icao24"]] == store.track(lines[0]["icao24"])
+
+    def test_stats_report_memory_per_aircraft(self, sample_data):
+        store = TrackStore(track_length=120, initial_slots=len(sample_data))
+        store.append(sample_data)
+        stats = store.stats()
+        # 120 points of a uint32 time and five float32 values, plus the slot bookkeeping
+        assert stats["bytes_per_aircraft"] >= 120 * 24
+        assert stats["bytes_per_aircraft"] < 120 * 24 * 1.2
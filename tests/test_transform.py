@@ -1,7 +1,9 @@
+import os
+import json
 import pandas as pd
 import pytest
 from src.fetch import get_flight_data
-from src.transform  import clean_data
+from src.transform  import clean_data, clean_batches, diff_snapshots, to_float64
 
 @pytest.fixture(scope="module")
 def raw_data():
@@ -24,4 +26,109 @@ class TestCleanData:
 
     def test_clean_data_dataframe_is_not_empty(self, cleaned_data):
         assert not cleaned_data[0].empty
-        assert len(cleaned_data[0]) > 0
\ No newline at end of file
+        assert len(cleaned_data[0]) > 0
+
+@pytest.fixture(scope="module")
+def sample_raw_data():
+    """Fixture to read the bundled raw OpenSky payload."""
+    with open(os.path.join("data", "raw_flight_data.json"), encoding="utf-8") as json_file:
+        return json.load(json_file)
+
+class TestCleanBatches:
+    def test_clean_batches_matches_clean_data(self, sample_raw_data):
+        states = sample_raw_data["states"]
+        batches = [states[start:start + 1000] for start in range(0, len(states), 1000)]
+        expected = clean_data(sample_raw_data, None)[0].reset_index(drop=True)
+        pd.testing.assert_frame_equal(clean_batches(batches), expected)
+
+    def test_clean_batches_returns_empty_dataframe_without_batches(self):
+        result = clean_batches([])
+        assert isinstance(result, pd.DataFrame)
+        assert result.empty
+
+class TestCleanDataSample:
+    def test_clean_data_reproduces_the_bundled_cleaned_sample(self, sample_raw_data):
+        columns = ["icao24", "callsign", "origin_country", "time_position",
+                   "last_contact", "longitude", "latitude", "baro_altitude",
+                   "velocity", "true_track", "vertical_rate", "geo_altitude",
+                   "squawk", "spi"]
+        df, _ = clean_data(sample_raw_data, None)
+        with open(os.path.join("data", "cleaned_flight_data.csv"), encoding="utf-8") as csv_file:
+            assert df[columns].to_csv(index=False) == csv_file.read()
+
+    def test_clean_data_keeps_numeric_columns_as_float64(self, sample_raw_data):
+        df, _ = clean_data(sample_raw_data, None)
+        for column in ["longitude", "latitude", "baro_altitude", "velocity",
+                       "true_track", "vertical_rate", "geo_altitude"]:
+            assert df[column].dtype == "float64"
+        assert df["baro_altitude"].isna().any()
+
+    def test_clean_data_filters_ground_slow_and_unknown_callsign_flights(self):
+        states = [
+            ["a00001", "OK1 ", "France", 1, 1, 2.0, 48.0, 1000, False, 200, 90, 0, None, 1000, None, False, 0],
+            ["a00002", "GND1", "France", 1, 1, 2.0, 48.0, None, True, 200, 90, 0, None, None, None, False, 0],
+            ["a00003", "SLOW", "France", 1, 1, 2.0, 48.0, 1000, False, 5, 90, 0, None, 1000, None, False, 0],
+            ["a00004", "    ", "France", 1, 1, 2.0, 48.0, 1000, False, 200, 90, 0, None, 1000, None, False, 0],
+            ["a00005", "NOPOS", "France", 1, 1, None, None, 1000, False, 200, 90, 0, None, 1000, None, False, 0],
+        ]
+        df, _ = clean_data({"states": states}, None)
+        assert df["icao24"].tolist() == ["a00001"]
+        assert df["callsign"].tolist() == ["OK1"]
+        assert df["velocity"].tolist() == [388.8]
+
+    def test_clean_data_handles_missing_states(self):
+        df, _ = clean_data({"time": 1747593888, "states": None}, None)
+        assert df.empty
+
+class TestCompactSchema:
+    def test_compact_schema_uses_categorical_float32_and_boolean_columns(self, sample_raw_data):
+        df, _ = clean_data(sample_raw_data, None, "compact")
+        assert df["origin_country"].dtype == "category"
+        assert df["squawk"].dtype == "category"
+        assert df["velocity"].dtype == "float32"
+        assert df["geo_altitude"].dtype == "float32"
+        assert df["spi"].dtype == "boolean"
+        assert df.memory_usage(deep=True).sum() < clean_data(sample_raw_data, None)[0].memory_usage(deep=True).sum()
+
+    def test_compact_schema_keeps_the_values_of_the_standard_schema(self, sample_raw_data):
+        standard, _ = clean_data(sample_raw_data, None)
+        compact, _ = clean_data(sample_raw_data, None, "compact")
+        pd.testing.assert_frame_equal(to_float64(compact), standard.reset_index(drop=True), check_dtype=False,
+                                      check_categorical=False, rtol=1e-6)
+
+    def test_compact_clean_batches_matches_clean_data(self, sample_raw_data):
+        states = sample_raw_data["states"]
+        batches = [states[start:start + 1000] for start in range(0, len(states), 1000)]
+        pd.testing.assert_frame_equal(clean_batches(batches, "compact"),
+                                      clean_data(sample_raw_data, None, "compact")[0])
+
+    def test_schema_is_read_from_environment(self, sample_raw_data, monkeypatch):
+        monkeypatch.setenv("DATAFRAME_SCHEMA", "compact")
+        assert clean_data(sample_raw_data, None)[0]["velocity"].dtype == "float32"
+        monkeypatch.setenv("DATAFRAME_SCHEMA", "tiny")
+        with pytest.raises(ValueError):
+            clean_data(sample_raw_data, None)
+
+class TestDiffSnapshots:
+    def test_diff_snapshots_finds_new_changed_and_removed_aircraft(self, sample_raw_data):
+        current, _ = clean_data(sample_raw_data, None)
+        previous = current[["icao24", "time_position", "last_contact"]].iloc[1:].copy()
+        previous.iloc[0, previous.columns.get_loc("last_contact")] -= pd.Timedelta(seconds=5)
+        previous = pd.concat([previous, pd.DataFrame({"icao24": ["gone01"],
+                                                      "time_position": [pd.NaT],
+                                                      "last_contact": [pd.NaT]})])
+
+        changed, removed = diff_snapshots(previous, current)
+        assert changed["icao24"].tolist() == current["icao24"].iloc[:2].tolist()
+        assert removed == ["gone01"]
+
+    def test_diff_snapshots_ignores_unchanged_aircraft_with_missing_position_time(self, sample_raw_data):
+        current, _ = clean_data(sample_raw_data, None)
+        current = current.head(5).copy()
+        current["time_position"] = pd.NaT
+        previous = current[["icao24", "time_position", "last_contact"]].astype(
+            {"time_position": "datetime64[us]", "last_contact": "datetime64[us]"})
+
+        changed, removed = diff_snapshots(previous, current)
+        assert changed.empty
+        assert removed == []
@@ -0,0 +1,57 @@
+import os
+import gzip
+import pytest
+from src.upload import upload_artifacts, get_s3_client
+from tests.conftest import S3_TEST_BUCKET as BUCKET
+
+@pytest.fixture
+def artifacts(tmp_path):
+    """Fixture to write two small files to upload."""
+    csv_path = tmp_path / "flights.csv"
+    json_path = tmp_path / "flights.json"
+    csv_path.write_text("icao24,callsign\n39de4b,TVF54UR\n" * 100)
+    json_path.write_text('{"time": 1747593888, "states": []}')
+    return [(str(csv_path), "data/test/flights.csv"), (str(json_path), "data/test/flights.json")]
+
+class TestUploadArtifacts:
+    def test_upload_artifacts_uploads_every_file(self, s3, artifacts):
+        upload_artifacts(artifacts, bucket_name=BUCKET, compression="none")
+        keys = sorted(item["Key"] for item in s3.list_objects_v2(Bucket=BUCKET)["Contents"])
+        assert keys == ["data/test/flights.csv", "data/test/flights.json"]
+
+    def test_upload_artifacts_reports_bytes_and_seconds_per_artifact(self, s3, artifacts):
+        reports = upload_artifacts(artifacts, bucket_name=BUCKET, compression="none")
+        assert [report["key"] for report in reports] == [key for _, key in artifacts]
+        for report, (file_path, _) in zip(reports, artifacts):
+            assert report["bytes"] == os.path.getsize(file_path)
+            assert report["uploaded_bytes"] == report["bytes"]
+            assert report["seconds"] >= 0
+
+    def test_upload_artifacts_gzip_sets_content_encoding(self, s3, artifacts):
+        reports = upload_artifacts(artifacts, bucket_name=BUCKET, compression="gzip")
+        obj = s3.get_object(Bucket=BUCKET, Key="data/test/flights.csv")
+        assert obj["ContentEncoding"] == "gzip"
+        assert obj["ContentType"] == "text/csv"
+        with open(artifacts[0][0], "rb") as source:
+            assert gzip.decompress(obj["Body"].read()) == source.read()
+        assert reports[0]["uploaded_bytes"] < reports[0]["bytes"]
+
+    def test_upload_artifacts_zstd_sets_content_encoding(self, s3, artifacts):
+        zstandard = pytest.importorskip("zstandard")
+        upload_artifacts(artifacts, bucket_name=BUCKET, compression="zstd")
+        obj = s3.get_object(Bucket=BUCKET, Key="data/test/flights.json")
+        assert obj["ContentEncoding"] == "zstd"
+        with open(artifacts[1][0], "rb") as source:
+            assert zstandard.ZstdDecompressor().decompressobj().decompress(obj["Body"].read()) == source.read()
+
+    def test_upload_artifacts_removes_compressed_copies(self, s3, artifacts):
+        upload_artifacts(artifacts, bucket_name=BUCKET, compression="gzip")
+        assert not any(os.path.exists(file_path + ".gz") for file_path, _ in artifacts)
+
+    def test_upload_artifacts_rejects_unknown_compression(self, s3, artifacts):
+        with pytest.raises(ValueError):
+            upload_artifacts(artifacts, bucket_name=BUCKET, compression="brotli")
+
+class TestGetS3Client:
+    def test_get_s3_client_returns_a_shared_client(self, s3):
+        assert get_s3_client() is get_s3_client()
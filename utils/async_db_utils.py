@@ -0,0 +1,115 @@
+import os
+import asyncio
+from dotenv import load_dotenv
+from contextlib import asynccontextmanager
+
+load_dotenv()
+
+DB_DRIVERS = ("psycopg2", "asyncpg")
+
+def get_db_driver():
+    """
+    Driver the API handlers query the database with, read from the API_DB_DRIVER
+    environment variable. With asyncpg the analytics handlers await queries on an
+    asyncpg pool; with psycopg2 they run the blocking queries in the threadpool.
+    Returns:
+        str: One of DB_DRIVERS, "psycopg2" by default.
+    Raises:
+        ValueError: If the driver is not one of DB_DRIVERS.
+    """
+    driver = os.getenv("API_DB_DRIVER", "psycopg2")
+    if driver not in DB_DRIVERS:
+        raise ValueError(f"Unknown database driver '{driver}', expected one of {DB_DRIVERS}.")
+    return driver
+
+async def create_async_pool():
+    """
+    Create an asyncpg connection pool using the same environment variables as
+    db_utils.connect_to_db, sized by PG_POOL_MIN_SIZE and PG_POOL_MAX_SIZE.
+    Returns:
+        asyncpg.Pool: The connection pool.
+    """
+    # Imported with the first pool, so the API starts without asyncpg when API_DB_DRIVER=psycopg2
+    import asyncpg
+
+    return await asyncpg.create_pool(
+        database=os.getenv("PG_DATABASE"),
+        user=os.getenv("PG_USER"),
+        password=os.getenv("PG_PASSWORD") or None,
+        host=os.getenv("PG_HOST"),
+        port=int(os.getenv("PG_PORT")),
+        min_size=int(os.getenv("PG_POOL_MIN_SIZE", "1")),
+        max_size=int(os.getenv("PG_POOL_MAX_SIZE", "10")),
+    )
+
+_pool = None
+_pool_loop = None
+_pool_lock = None
+
+async def get_async_pool():
+    """
+    Return the asyncpg pool of the running event loop, creating it on first use.
+    An asyncpg pool only works on the event loop it was created on, so another
+    loop (e.g. a test client started per request) gets its own pool and the
+    previous one is terminated.
+    Returns:
+        asyncpg.Pool: The shared connection pool.
+    """
+    global _pool, _pool_loop, _pool_lock
+    loop = asyncio.get_running_loop()
+    if _pool_loop is not loop:
+        # A pool whose loop has already closed cannot be terminated; its sockets close when it is collected
+        if _pool is not None and not _pool_loop.is_closed():
+            _pool.terminate()
+        _pool, _pool_loop, _pool_lock = None, loop, asyncio.Lock()
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await create_async_pool()
+    return _pool
+
+async def close_async_pool():
+    """
+    Close the asyncpg pool, if one has been created.
+    Returns:
+        None
+    """
+    global _pool, _pool_loop
+    pool, loop = _pool, _pool_loop
+    _pool, _pool_loop = None, None
+    if pool is None:
+        return
+    if loop is asyncio.get_running_loop():
+        await pool.close()
+    elif not loop.is_closed():
+        pool.terminate()
+
+def async_pool_stats():
+    """
+    Statistics of the asyncpg pool for monitoring.
+    Returns:
+        dict: Pool sizes and in-use count, or None if no pool has been created.
+    """
+    pool = _pool
+    if pool is None:
+        return None
+    size, idle = pool.get_size(), pool.get_idle_size()
+    return {
+        "min_size": pool.get_min_size(),
+        "max_size": pool.get_max_size(),
+        "size": size,
+        "idle": idle,
+        "in_use": size - idle,
+    }
+
+@asynccontextmanager
+async def async_db_connection():
+    """
+    Async context manager for database connection.
+    This function acquires a connection from the asyncpg pool, waiting at most
+    PG_POOL_TIMEOUT seconds, and yields it. The connection is released back to
+    the pool after use, also when the query fails; the queries of async_db_manager
+    count their errors in opensky_db_query_errors_total.
+    """
+    pool = await get_async_pool()
+    async with pool.acquire(timeout=float(os.getenv("PG_POOL_TIMEOUT", "30"))) as conn:
+        yield conn
@@ -1,5 +1,7 @@
 import os
-from psycopg2 import connect
+import threading
+import time
+from psycopg2 import connect, extensions, OperationalError, InterfaceError
 from dotenv import load_dotenv
 from contextlib import contextmanager
 
@@ -19,21 +21,254 @@ def connect_to_db():
         port=int(os.getenv("PG_PORT"))
     )
 
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available within the checkout timeout."""
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections.
+    Connections are opened lazily up to max_size, reused across checkouts and
+    checked on checkout: closed connections are discarded, and connections idle
+    for longer than check_idle seconds are pinged with SELECT 1 before use.
+    Callers that find the pool exhausted wait up to timeout seconds.
+    Args:
+        min_size (int): Connections opened when the pool is created.
+        max_size (int): Upper bound on open connections.
+        timeout (float): Seconds to wait for a free connection before PoolTimeout.
+        check_idle (float): Idle seconds after which a connection is pinged on checkout.
+        connect (callable): Factory returning a new psycopg2 connection.
+    """
+    def __init__(self, min_size=1, max_size=10, timeout=30.0, check_idle=5.0, connect=connect_to_db):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min_size={min_size}, max_size={max_size}.")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self._connect = connect
+        self._idle = []  # (connection, returned_at) pairs, most recently returned last
+        self._size = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+            "checkout_time": 0.0,
+            "checkout_time_max": 0.0,
+            "connections_created": 0,
+            "connections_discarded": 0,
+        }
+        for _ in range(min_size):
+            self._idle.append((self._new_connection(), time.monotonic()))
+            self._size += 1
+
+    def _new_connection(self):
+        conn = self._connect()
+        with self._condition:
+            self._stats["connections_created"] += 1
+        return conn
+
+    def _close_connection(self, conn):
+        with self._condition:
+            self._stats["connections_discarded"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if idle_for < self.check_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except (OperationalError, InterfaceError):
+            return False
+
+    def getconn(self):
+        """
+        Check out a healthy connection, opening a new one if the pool has room.
+        Returns:
+            connection: A psycopg2 connection object.
+        Raises:
+            PoolTimeout: If no connection is available within the timeout.
+        """
+        start = time.monotonic()
+        waited = False
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed.")
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn, returned_at = None, None
+                    break
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s.")
+                waited = True
+                self._condition.wait(remaining)
+
+        # The slot is held from here on: open or replace its connection outside the lock
+        try:
+            if conn is None:
+                conn = self._new_connection()
+            elif not self._is_healthy(conn, time.monotonic() - returned_at):
+                self._close_connection(conn)
+                conn = self._new_connection()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+        elapsed = time.monotonic() - start
+        with self._condition:
+            self._stats["checkouts"] += 1
+            self._stats["checkout_time"] += elapsed
+            self._stats["checkout_time_max"] = max(self._stats["checkout_time_max"], elapsed)
+            if waited:
+                self._stats["waits"] += 1
+                self._stats["wait_time"] += elapsed
+        return conn
+
+    def putconn(self, conn):
+        """
+        Return a connection to the pool, rolling back any open transaction.
+        Broken connections are closed instead of being reused.
+        Args:
+            conn: A connection previously returned by getconn.
+        Returns:
+            None
+        """
+        healthy = not conn.closed
+        if healthy and conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except (OperationalError, InterfaceError):
+                healthy = False
+        if not healthy or self._closed:
+            self._close_connection(conn)
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            return
+        with self._condition:
+            self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+    def stats(self):
+        """
+        Snapshot of pool usage for monitoring.
+        Returns:
+            dict: Pool sizes, in-use count and cumulative checkout/wait statistics.
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update({
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+            })
+        checkouts = stats["checkouts"]
+        stats["checkout_time_avg"] = stats["checkout_time"] / checkouts if checkouts else 0.0
+        return stats
+
+    def close(self):
+        """
+        Close all idle connections and refuse further checkouts.
+        Returns:
+            None
+        """
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for conn, _ in idle:
+            self._close_connection(conn)
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """
+    Return the process-wide connection pool, creating it on first use.
+    Sizes are read from PG_POOL_MIN_SIZE, PG_POOL_MAX_SIZE, PG_POOL_TIMEOUT and
+    PG_POOL_CHECK_IDLE. A forked child process gets its own pool rather than
+    sharing the parent's sockets.
+    Returns:
+        ConnectionPool: The shared connection pool.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ConnectionPool(
+                min_size=int(os.getenv("PG_POOL_MIN_SIZE", "1")),
+                max_size=int(os.getenv("PG_POOL_MAX_SIZE", "10")),
+                timeout=float(os.getenv("PG_POOL_TIMEOUT", "30")),
+                check_idle=float(os.getenv("PG_POOL_CHECK_IDLE", "5")),
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+def close_pool():
+    """
+    Close the process-wide connection pool, if one has been created.
+    Returns:
+        None
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+
+def pool_stats(create=True):
+    """
+    Statistics of the process-wide connection pool.
+    Args:
+        create (bool): Create the pool if it does not exist yet. Without, a process
+            that has not queried the database yet opens no connection.
+    Returns:
+        dict: See ConnectionPool.stats, or None if there is no pool and create is False.
+    """
+    if not create:
+        with _pool_lock:
+            pool = _pool if _pool_pid == os.getpid() else None
+        return pool.stats() if pool is not None else None
+    return get_pool().stats()
+
 @contextmanager
 def db_cursor():
     """
     Context manager for database cursor.
-    This function creates a connection to the database and yields a cursor.
-    It also handles exceptions and ensures that the connection is closed after use.
+    This function checks out a pooled connection to the database and yields a cursor.
+    It also handles exceptions and ensures that the connection is returned to the pool after use.
     """
-    conn = connect_to_db()
+    pool = get_pool()
+    conn = pool.getconn()
     cur = conn.cursor()
     try:
         yield cur
     except Exception as e:
         print(f"Database error: {e}")
-        conn.rollback()
+        if not conn.closed:
+            conn.rollback()
         raise
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        pool.putconn(conn)